@@ -1,3 +1,16 @@
-from .parse import MarkdownCrawler
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .parse import MarkdownCrawler
 
 __all__ = ["MarkdownCrawler"]
+
+
+def __getattr__(name: str) -> Any:
+    # Submodules are imported on first access, so ``import aidkits.json_splitter``
+    # and the CLI do not pay for the crawler and its dependencies
+    if name == "MarkdownCrawler":
+        from .parse import MarkdownCrawler
+
+        return MarkdownCrawler
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
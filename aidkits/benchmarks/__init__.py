@@ -0,0 +1,3 @@
+from .corpus import CorpusSpec, CorpusStats, generate_corpus
+
+__all__ = ["CorpusSpec", "CorpusStats", "generate_corpus"]
@@ -0,0 +1,140 @@
+import random
+from pathlib import Path
+from typing import List, Union
+
+from pydantic import BaseModel
+
+_WORDS = (
+    "the a index query vector search document chunk library model encoder cluster shard "
+    "replica token prompt answer retrieve config install deploy upgrade option default value "
+    "request response error timeout retry batch stream cache header section example usage"
+).split()
+
+_LANGUAGES = ["python", "bash", "json", "yaml", ""]
+
+
+class CorpusSpec(BaseModel):
+    """Shape of a synthetic markdown tree.
+
+    Attributes:
+        seed: The random seed, the same spec always generates the same corpus
+        files: The number of markdown files
+        directory_depth: The maximum nesting of directories
+        file_size: The mean size of a file in characters
+        size_spread: Sizes are drawn log-uniformly from
+            ``file_size / size_spread`` to ``file_size * size_spread``
+        header_density: Headers per 1000 characters
+        code_fence_ratio: The share of sections holding a fenced code block
+        inline_code_ratio: The share of paragraphs with inline code spans
+        pathological_ratio: The share of paragraphs with unbalanced or nested
+            backticks, the worst case of the code block scan
+    """
+
+    seed: int = 0
+    files: int = 100
+    directory_depth: int = 3
+    file_size: int = 4000
+    size_spread: float = 4.0
+    header_density: float = 2.0
+    code_fence_ratio: float = 0.3
+    inline_code_ratio: float = 0.3
+    pathological_ratio: float = 0.02
+
+
+class CorpusStats(BaseModel):
+    files: int
+    characters: int
+    headers: int
+    code_fences: int
+
+
+def _sentence(rng: random.Random, inline_code: bool, pathological: bool) -> str:
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(6, 18))]
+    if inline_code:
+        position = rng.randrange(len(words))
+        words[position] = f"`{words[position]}()`"
+    if pathological:
+        # Unbalanced and run-on backticks make the non-greedy pattern scan far ahead
+        words.insert(
+            rng.randrange(len(words)), rng.choice(["`", "``", "```x`", "` `` `"])
+        )
+    return " ".join(words).capitalize() + "."
+
+
+def _code_block(rng: random.Random) -> str:
+    lines = [
+        f"{rng.choice(_WORDS)}_{index} = {rng.choice(_WORDS)}({rng.randint(0, 99)})"
+        for index in range(rng.randint(2, 12))
+    ]
+    # Headers inside code blocks must not split the document
+    if rng.random() < 0.3:
+        lines.insert(0, "# not a header")
+    return f"```{rng.choice(_LANGUAGES)}\n" + "\n".join(lines) + "\n```"
+
+
+def markdown_document(rng: random.Random, spec: CorpusSpec) -> str:
+    """Generate one markdown document for the spec."""
+    low, high = spec.file_size / spec.size_spread, spec.file_size * spec.size_spread
+    target = int(low * (high / low) ** rng.random())
+    section_size = 1000 / spec.header_density if spec.header_density > 0 else target
+
+    parts: List[str] = []
+    size = 0
+    while size < target:
+        if parts or spec.header_density > 0:
+            level = 1 if not parts else rng.randint(2, 4)
+            parts.append(
+                "#" * level
+                + " "
+                + " ".join(rng.choice(_WORDS) for _ in range(rng.randint(1, 5))).title()
+            )
+        section = 0
+        while section < section_size and size + section < target:
+            paragraph = " ".join(
+                _sentence(
+                    rng,
+                    rng.random() < spec.inline_code_ratio,
+                    rng.random() < spec.pathological_ratio,
+                )
+                for _ in range(rng.randint(1, 5))
+            )
+            parts.append(paragraph)
+            section += len(paragraph)
+        if rng.random() < spec.code_fence_ratio:
+            block = _code_block(rng)
+            parts.append(block)
+            section += len(block)
+        size += section
+    return "\n\n".join(parts) + "\n"
+
+
+def generate_corpus(directory: Union[str, Path], spec: CorpusSpec) -> CorpusStats:
+    """Write a seeded synthetic markdown tree.
+
+    Args:
+        directory: The root of the tree, created if needed
+        spec: The shape of the corpus
+
+    Returns:
+        Counts describing the generated corpus
+    """
+    rng = random.Random(spec.seed)
+    root = Path(directory)
+    characters = headers = code_fences = 0
+    for index in range(spec.files):
+        depth = rng.randint(0, spec.directory_depth)
+        folder = root.joinpath(
+            *(f"{rng.choice(_WORDS)}_{rng.randint(0, 3)}" for _ in range(depth))
+        )
+        folder.mkdir(parents=True, exist_ok=True)
+        text = markdown_document(rng, spec)
+        (folder / f"doc_{index:05d}.md").write_text(text, encoding="utf-8")
+        characters += len(text)
+        headers += sum(1 for line in text.splitlines() if line.startswith("#"))
+        code_fences += text.count("```") // 2
+    return CorpusStats(
+        files=spec.files,
+        characters=characters,
+        headers=headers,
+        code_fences=code_fences,
+    )
@@ -0,0 +1,392 @@
+import fnmatch
+import json
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from opensearchpy.exceptions import NotFoundError
+
+_RANGE = {
+    "gt": lambda value, bound: value > bound,
+    "gte": lambda value, bound: value >= bound,
+    "lt": lambda value, bound: value < bound,
+    "lte": lambda value, bound: value <= bound,
+}
+
+
+def _matches(query: Dict[str, Any], source: Dict[str, Any]) -> bool:
+    """Evaluate the query clauses the retrievers send against one document."""
+    ((kind, clause),) = query.items()
+    if kind == "match_all":
+        return True
+    if kind == "script_score":
+        return _matches(clause["query"], source)
+    if kind == "term":
+        ((field, value),) = clause.items()
+        value = value.get("value") if isinstance(value, dict) else value
+        return source.get(field) == value
+    if kind == "terms":
+        ((field, values),) = clause.items()
+        return source.get(field) in values
+    if kind == "wildcard":
+        ((field, pattern),) = clause.items()
+        pattern = pattern.get("value") if isinstance(pattern, dict) else pattern
+        return isinstance(source.get(field), str) and fnmatch.fnmatchcase(
+            source[field], pattern
+        )
+    if kind == "range":
+        ((field, bounds),) = clause.items()
+        value = source.get(field)
+        return value is not None and all(
+            _RANGE[operator](value, bound) for operator, bound in bounds.items()
+        )
+    if kind == "bool":
+        required = list(clause.get("filter", [])) + list(clause.get("must", []))
+        if not all(_matches(sub, source) for sub in required):
+            return False
+        if any(_matches(sub, source) for sub in clause.get("must_not", [])):
+            return False
+        should = clause.get("should", [])
+        minimum = clause.get("minimum_should_match", 0 if required else 1)
+        return not should or sum(_matches(sub, source) for sub in should) >= minimum
+    raise ValueError(f"Unsupported query: {kind}")
+
+
+def _project(source: Dict[str, Any], source_filter: Any) -> Optional[Dict[str, Any]]:
+    if source_filter is False:
+        return None
+    if source_filter is None or source_filter is True:
+        return dict(source)
+    if isinstance(source_filter, dict):
+        excludes = set(source_filter.get("excludes", []))
+        return {
+            field: value for field, value in source.items() if field not in excludes
+        }
+    return {field: source[field] for field in source_filter if field in source}
+
+
+class _Index:
+    def __init__(self, body: Optional[Dict[str, Any]] = None) -> None:
+        self.body = body or {}
+        self.settings: Dict[str, Any] = dict(self.body.get("settings", {}))
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self._matrix: Optional[Tuple[List[str], np.ndarray]] = None
+
+    def put(self, doc_id: str, source: Dict[str, Any]) -> bool:
+        created = doc_id not in self.documents
+        self.documents[doc_id] = source
+        self._matrix = None
+        return created
+
+    def delete(self, doc_id: str) -> bool:
+        self._matrix = None
+        return self.documents.pop(doc_id, None) is not None
+
+    def matrix(self) -> Tuple[List[str], np.ndarray]:
+        """Return the IDs and the row-normalized vectors of all documents."""
+        if self._matrix is None:
+            ids = list(self.documents)
+            vectors = np.asarray(
+                [self.documents[doc_id]["vector"] for doc_id in ids], dtype=np.float32
+            )
+            if len(ids):
+                norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+                vectors = vectors / np.where(norms == 0, 1.0, norms)
+            self._matrix = (ids, vectors)
+        return self._matrix
+
+
+class _Indices:
+    def __init__(self, client: "FakeOpenSearch") -> None:
+        self._client = client
+
+    def exists(self, index: str, **kwargs: Any) -> bool:
+        return bool(self._client.resolve(index, ignore_unavailable=True))
+
+    def create(
+        self, index: str, body: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> Dict[str, Any]:
+        self._client.wait()
+        self._client.indices_by_name[index] = _Index(body)
+        return {"acknowledged": True, "index": index}
+
+    def delete(self, index: str, **kwargs: Any) -> Dict[str, Any]:
+        for name in self._client.resolve(index):
+            del self._client.indices_by_name[name]
+            for indices in self._client.aliases.values():
+                indices.discard(name)
+        return {"acknowledged": True}
+
+    def exists_alias(self, name: str, **kwargs: Any) -> bool:
+        return bool(self._client.aliases.get(name))
+
+    def get_alias(
+        self, index: Optional[str] = None, name: Optional[str] = None, **kwargs: Any
+    ) -> Dict[str, Any]:
+        names = (
+            self._client.resolve(index) if index else list(self._client.indices_by_name)
+        )
+        result = {}
+        for index_name in names:
+            aliases = {
+                alias: {}
+                for alias, indices in self._client.aliases.items()
+                if index_name in indices and (name is None or alias == name)
+            }
+            if aliases or name is None:
+                result[index_name] = {"aliases": aliases}
+        return result
+
+    def update_aliases(self, body: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:
+        for action in body["actions"]:
+            ((kind, spec),) = action.items()
+            if kind == "add":
+                self._client.aliases.setdefault(spec["alias"], set()).add(spec["index"])
+            elif kind == "remove":
+                self._client.aliases.get(spec["alias"], set()).discard(spec["index"])
+        return {"acknowledged": True}
+
+    def get_settings(self, index: str, **kwargs: Any) -> Dict[str, Any]:
+        return {
+            name: {
+                "settings": {"index": dict(self._client.indices_by_name[name].settings)}
+            }
+            for name in self._client.resolve(index)
+        }
+
+    def put_settings(
+        self, body: Dict[str, Any], index: str, **kwargs: Any
+    ) -> Dict[str, Any]:
+        for name in self._client.resolve(index):
+            self._client.indices_by_name[name].settings.update(body.get("index", body))
+        return {"acknowledged": True}
+
+    def refresh(self, index: Optional[str] = None, **kwargs: Any) -> Dict[str, Any]:
+        return {"_shards": {"failed": 0}}
+
+    def forcemerge(self, index: Optional[str] = None, **kwargs: Any) -> Dict[str, Any]:
+        return {"_shards": {"failed": 0}}
+
+
+class FakeOpenSearch:
+    """An in-process stand-in for the ``OpenSearch`` client, for benchmarks and tests.
+
+    Implements the calls the retrievers and the bulk indexer make: index and
+    alias management, NDJSON ``bulk``, ``search`` and ``msearch`` with the
+    ``script_score`` cosine and ``knn`` queries and term, terms, range,
+    wildcard and bool clauses, scrolling for ``helpers.scan`` and
+    ``delete_by_query``. Vector scoring is exact and vectorized with NumPy.
+
+    Like a cluster with ``action.auto_create_index`` disabled, bulk writes to
+    a missing index fail instead of creating it, and writes through an alias
+    need it to point at exactly one index.
+
+    Args:
+        latency: Seconds every request sleeps, to model the network round trip
+    """
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.indices_by_name: Dict[str, _Index] = {}
+        self.aliases: Dict[str, set] = {}
+        self.indices = _Indices(self)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def resolve(self, index: str, ignore_unavailable: bool = False) -> List[str]:
+        """Expand comma-separated names, aliases and wildcard patterns into index names."""
+        names: List[str] = []
+        for part in index.split(","):
+            if "*" in part or "?" in part:
+                names.extend(
+                    sorted(
+                        name
+                        for name in self.indices_by_name
+                        if fnmatch.fnmatchcase(name, part)
+                    )
+                )
+            elif part in self.indices_by_name:
+                names.append(part)
+            elif self.aliases.get(part):
+                names.extend(sorted(self.aliases[part]))
+            elif not ignore_unavailable:
+                raise NotFoundError(404, "index_not_found_exception", {"index": part})
+        return list(dict.fromkeys(names))
+
+    def bulk(self, body: Any, **kwargs: Any) -> Dict[str, Any]:
+        self.wait()
+        if isinstance(body, bytes):
+            body = body.decode("utf-8")
+        lines = iter(line for line in body.splitlines() if line.strip())
+        items = []
+        errors = False
+        for line in lines:
+            ((op_type, meta),) = json.loads(line).items()
+            targets = self.resolve(meta["_index"], ignore_unavailable=True)
+            if len(targets) != 1:
+                if op_type != "delete":
+                    next(lines)
+                error = (
+                    {"type": "index_not_found_exception", "index": meta["_index"]}
+                    if not targets
+                    else {
+                        "type": "illegal_argument_exception",
+                        "reason": f"{meta['_index']} has no write index",
+                    }
+                )
+                items.append(
+                    {
+                        op_type: {
+                            "_id": meta["_id"],
+                            "status": 404 if not targets else 400,
+                            "error": error,
+                        }
+                    }
+                )
+                errors = True
+                continue
+            index = self.indices_by_name[targets[0]]
+            if op_type == "delete":
+                found = index.delete(meta["_id"])
+                items.append(
+                    {op_type: {"_id": meta["_id"], "status": 200 if found else 404}}
+                )
+                continue
+            created = index.put(meta["_id"], json.loads(next(lines)))
+            items.append(
+                {op_type: {"_id": meta["_id"], "status": 201 if created else 200}}
+            )
+        return {"errors": errors, "items": items}
+
+    def _hits(
+        self, index: str, body: Dict[str, Any], ignore_unavailable: bool = False
+    ) -> List[Dict[str, Any]]:
+        query = body.get("query", {"match_all": {}})
+        size = body.get("size", 10)
+        source_filter = body.get("_source")
+        query_vector, candidates = None, query
+        if "script_score" in query:
+            query_vector = query["script_score"]["script"]["params"]["query_vector"]
+            candidates = query["script_score"]["query"]
+        elif "knn" in query:
+            # The graph search is modelled as exact search over the filtered documents
+            ((_, knn),) = query["knn"].items()
+            query_vector = knn["vector"]
+            candidates = knn.get("filter", {"match_all": {}})
+
+        scored: List[Tuple[float, str, str]] = []
+        for name in self.resolve(index, ignore_unavailable):
+            target = self.indices_by_name[name]
+            ids, vectors = (
+                target.matrix()
+                if query_vector is not None
+                else (list(target.documents), None)
+            )
+            if not ids:
+                continue
+            if "match_all" in candidates:
+                rows = np.arange(len(ids))
+            else:
+                rows = np.flatnonzero(
+                    [_matches(candidates, target.documents[doc_id]) for doc_id in ids]
+                )
+            if query_vector is not None:
+                vector = np.asarray(query_vector, dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                scores = vectors[rows] @ (vector / norm if norm else vector) + 1.0
+            else:
+                scores = np.ones(len(rows), dtype=np.float32)
+            if len(rows) > size:
+                top = np.argpartition(-scores, size - 1)[:size]
+                rows, scores = rows[top], scores[top]
+            scored.extend(
+                (float(score), name, ids[row]) for row, score in zip(rows, scores)
+            )
+
+        scored.sort(key=lambda hit: -hit[0])
+        hits = []
+        for score, name, doc_id in scored[:size]:
+            hit: Dict[str, Any] = {"_index": name, "_id": doc_id, "_score": score}
+            source = _project(
+                self.indices_by_name[name].documents[doc_id], source_filter
+            )
+            if source is not None:
+                hit["_source"] = source
+            hits.append(hit)
+        return hits
+
+    def search(
+        self,
+        index: str = "_all",
+        body: Optional[Dict[str, Any]] = None,
+        scroll: Optional[str] = None,
+        size: Optional[int] = None,
+        ignore_unavailable: bool = False,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        self.wait()
+        body = dict(body or {})
+        if scroll is not None:
+            # Return everything in the first page; scroll() then ends the scan
+            body["size"] = sum(
+                len(target.documents) for target in self.indices_by_name.values()
+            )
+        elif size is not None:
+            body["size"] = size
+        hits = self._hits("*" if index == "_all" else index, body, ignore_unavailable)
+        response: Dict[str, Any] = {"hits": {"hits": hits}} if hits else {}
+        if scroll is not None:
+            response.update(
+                {
+                    "_scroll_id": "scan",
+                    "_shards": {"successful": 1, "skipped": 0, "total": 1},
+                }
+            )
+        return response
+
+    def msearch(self, body: List[Dict[str, Any]], **kwargs: Any) -> Dict[str, Any]:
+        self.wait()
+        responses = []
+        for header, search in zip(body[::2], body[1::2]):
+            try:
+                hits = self._hits(header["index"], search)
+                responses.append({"hits": {"hits": hits}} if hits else {})
+            except NotFoundError as e:
+                responses.append({"error": {"type": e.error}, "status": 404})
+        return {"responses": responses}
+
+    def scroll(
+        self, body: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> Dict[str, Any]:
+        return {"_scroll_id": None, "hits": {"hits": []}}
+
+    def clear_scroll(
+        self, body: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> Dict[str, Any]:
+        return {"succeeded": True}
+
+    def delete_by_query(
+        self, index: str, body: Dict[str, Any], **kwargs: Any
+    ) -> Dict[str, Any]:
+        self.wait()
+        deleted = 0
+        for name in self.resolve(index):
+            target = self.indices_by_name[name]
+            for doc_id in [
+                doc_id
+                for doc_id, source in target.documents.items()
+                if _matches(body["query"], source)
+            ]:
+                deleted += target.delete(doc_id)
+        return {"deleted": deleted}
+
+    def iter_documents(self, index: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        for name in self.resolve(index):
+            yield from self.indices_by_name[name].documents.items()
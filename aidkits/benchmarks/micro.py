@@ -0,0 +1,307 @@
+import argparse
+import gc
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from pydantic import BaseModel, Field
+
+from aidkits.benchmarks.corpus import CorpusSpec, generate_corpus
+from aidkits.json_splitter import JsonSplitter
+from aidkits.models import LibrarySource
+from aidkits.parse import MarkdownCrawler
+
+
+class BenchmarkResult(BaseModel):
+    """The best of several timed runs of one component.
+
+    Attributes:
+        name: The benchmarked component
+        seconds: The fastest run
+        items: The units processed per run, in ``unit``
+        unit: What ``items`` counts, e.g. ``chars`` or ``chunks``
+        throughput: ``items`` per second of the fastest run
+        peak_memory: The peak of memory allocated by Python during a run, in bytes
+    """
+
+    name: str
+    seconds: float
+    items: int
+    unit: str
+    throughput: float
+    peak_memory: int
+
+
+class BenchmarkRun(BaseModel):
+    created_at: str = Field(
+        default_factory=lambda: datetime.now(timezone.utc).isoformat()
+    )
+    commit: Optional[str] = None
+    python: str = Field(default_factory=platform.python_version)
+    spec: CorpusSpec
+    results: List[BenchmarkResult]
+
+
+def measure(
+    name: str, function: Callable[[], Any], items: int, unit: str, repeats: int = 3
+) -> BenchmarkResult:
+    """Time ``function`` ``repeats`` times and measure its peak memory in one extra run."""
+    timings = []
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    # tracemalloc slows Python down, so memory is measured in a separate run
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    seconds = min(timings)
+    return BenchmarkResult(
+        name=name,
+        seconds=seconds,
+        items=items,
+        unit=unit,
+        throughput=items / seconds if seconds else float("inf"),
+        peak_memory=peak,
+    )
+
+
+def run_benchmarks(
+    spec: CorpusSpec, repeats: int = 3, workdir: Optional[Union[str, Path]] = None
+) -> BenchmarkRun:
+    """Generate a corpus for the spec and benchmark the ingestion components on it.
+
+    Args:
+        spec: The corpus to generate
+        repeats: Timed runs per component, the fastest is reported
+        workdir: Where to write the corpus, a temporary directory by default
+
+    Returns:
+        The results of every component
+    """
+    with tempfile.TemporaryDirectory(dir=workdir) as directory:
+        root = Path(directory)
+        corpus = root / "corpus"
+        stats = generate_corpus(corpus, spec)
+        texts = [
+            path.read_text(encoding="utf-8") for path in sorted(corpus.rglob("*.md"))
+        ]
+        crawler = MarkdownCrawler(str(corpus), str(root / "output.json"), "")
+
+        results = [
+            measure(
+                "split_markdown_by_headers",
+                lambda: [crawler.split_markdown_by_headers(text) for text in texts],
+                stats.characters,
+                "chars",
+                repeats,
+            ),
+            measure(
+                "collect_markdown_files",
+                lambda: crawler.collect_markdown_files(str(corpus)),
+                stats.characters,
+                "chars",
+                repeats,
+            ),
+        ]
+
+        libraries = crawler.collect_markdown_files(str(corpus))
+        chunks = sum(len(library.chunks) for library in libraries)
+        serialized = [library.model_dump_json() for library in libraries]
+        results.append(
+            measure(
+                "LibrarySource.model_dump_json",
+                lambda: [library.model_dump_json() for library in libraries],
+                chunks,
+                "chunks",
+                repeats,
+            )
+        )
+        results.append(
+            measure(
+                "LibrarySource.model_validate_json",
+                lambda: [
+                    LibrarySource.model_validate_json(data) for data in serialized
+                ],
+                chunks,
+                "chunks",
+                repeats,
+            )
+        )
+
+        rows = [
+            dict(chunk.model_dump(), library=library.title)
+            for library in libraries
+            for chunk in library.chunks
+        ]
+        splitter = JsonSplitter(output_dir=str(root / "split"))
+        results.append(
+            measure(
+                "JsonSplitter.split_json_data",
+                lambda: splitter.split_json_data(rows, group_by_field="library"),
+                len(rows),
+                "rows",
+                repeats,
+            )
+        )
+
+    return BenchmarkRun(commit=_git_commit(), spec=spec, results=results)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return (
+            subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+            or None
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_run(run: BenchmarkRun, path: Union[str, Path]) -> None:
+    """Append a run to a JSONL history file."""
+    with open(path, "a", encoding="utf-8") as file:
+        file.write(run.model_dump_json())
+        file.write("\n")
+
+
+def load_runs(path: Union[str, Path]) -> List[BenchmarkRun]:
+    with open(path, encoding="utf-8") as file:
+        return [BenchmarkRun.model_validate_json(line) for line in file if line.strip()]
+
+
+def compare_runs(
+    baseline: BenchmarkRun, current: BenchmarkRun
+) -> Dict[str, Dict[str, float]]:
+    """Return the throughput and peak memory ratios, current over baseline, per component.
+
+    A throughput ratio below 1 or a memory ratio above 1 is a regression.
+    Runs are only comparable when they used the same corpus spec.
+    """
+    previous = {result.name: result for result in baseline.results}
+    ratios = {}
+    for result in current.results:
+        before = previous.get(result.name)
+        if before is None:
+            continue
+        ratios[result.name] = {
+            "throughput": result.throughput / before.throughput
+            if before.throughput
+            else float("inf"),
+            "peak_memory": result.peak_memory / before.peak_memory
+            if before.peak_memory
+            else float("inf"),
+        }
+    return ratios
+
+
+def format_run(run: BenchmarkRun, baseline: Optional[BenchmarkRun] = None) -> str:
+    ratios = compare_runs(baseline, run) if baseline is not None else {}
+    lines = [
+        f"{'component':<36} {'throughput':>18} {'peak memory':>12} {'vs baseline':>22}"
+    ]
+    for result in run.results:
+        line = (
+            f"{result.name:<36} {result.throughput:>12,.0f} {result.unit:<5}"
+            f" {result.peak_memory / 2**20:>9.1f} MiB"
+        )
+        if result.name in ratios:
+            ratio = ratios[result.name]
+            line += (
+                f" {ratio['throughput']:>8.2f}x speed {ratio['peak_memory']:>5.2f}x mem"
+            )
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmarks of markdown crawling and serialization."
+    )
+    parser.add_argument(
+        "--files",
+        type=int,
+        default=200,
+        help="Number of markdown files (default: 200).",
+    )
+    parser.add_argument(
+        "--file-size",
+        type=int,
+        default=4000,
+        help="Mean file size in characters (default: 4000).",
+    )
+    parser.add_argument(
+        "--header-density", type=float, default=2.0, help="Headers per 1000 characters."
+    )
+    parser.add_argument(
+        "--code-fence-ratio",
+        type=float,
+        default=0.3,
+        help="Share of sections with code blocks.",
+    )
+    parser.add_argument(
+        "--pathological-ratio",
+        type=float,
+        default=0.02,
+        help="Share of paragraphs with stray backticks.",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed (default: 0).")
+    parser.add_argument(
+        "--repeats", type=int, default=3, help="Timed runs per component (default: 3)."
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Append the run to this JSONL history file.",
+    )
+    parser.add_argument(
+        "--compare",
+        type=str,
+        default=None,
+        help="Compare with the last run in this JSONL file.",
+    )
+    args = parser.parse_args()
+
+    spec = CorpusSpec(
+        seed=args.seed,
+        files=args.files,
+        file_size=args.file_size,
+        header_density=args.header_density,
+        code_fence_ratio=args.code_fence_ratio,
+        pathological_ratio=args.pathological_ratio,
+    )
+    baseline = None
+    if args.compare:
+        runs = [run for run in load_runs(args.compare) if run.spec == spec]
+        if runs:
+            baseline = runs[-1]
+        else:
+            print(f"No run with the same corpus spec in {args.compare}")
+
+    run = run_benchmarks(spec, args.repeats)
+    print(format_run(run, baseline))
+    if args.output:
+        save_run(run, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,493 @@
+import argparse
+import json
+import random
+import re
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from pydantic import BaseModel
+
+from aidkits.benchmarks.corpus import _WORDS
+from aidkits.benchmarks.fake_opensearch import FakeOpenSearch
+from aidkits.models import CodeChunk, LibrarySource
+from aidkits.storage.bulk import BulkIndexer
+from aidkits.storage.opensearch_retriever import OpenSearchRetriever
+from aidkits.storage.quantization import VectorOptions
+
+STRATEGIES = ("search", "search_trusted", "search_batch")
+
+_TOKEN = re.compile(r"\w+")
+
+
+class HashingEncoder:
+    """A deterministic bag-of-words encoder that needs no model download.
+
+    Every word is hashed into one of ``dimension`` signed buckets, so texts
+    sharing words get similar vectors. It is far from a sentence embedding, but
+    it is fast and stable, which is what a latency and recall harness needs.
+
+    Args:
+        dimension: The size of the embeddings
+    """
+
+    def __init__(self, dimension: int = 256) -> None:
+        self.dimension = dimension
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in _TOKEN.findall(text.lower()):
+            digest = zlib.crc32(word.encode("utf-8"))
+            vector[digest % self.dimension] += 1.0 if digest & 1 << 31 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(
+        self,
+        sentences: Union[str, Sequence[str]],
+        batch_size: int = 32,
+        prompt_name: Optional[str] = None,
+        show_progress_bar: bool = False,
+        **kwargs: Any,
+    ) -> np.ndarray:
+        if isinstance(sentences, str):
+            return self._embed(sentences)
+        if not len(sentences):
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return np.stack([self._embed(sentence) for sentence in sentences])
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+
+class LabeledQuery(BaseModel):
+    """A question and the chunks that answer it.
+
+    Attributes:
+        question: The question
+        relevant: Keys of the relevant chunks, see :func:`chunk_key`
+    """
+
+    question: str
+    relevant: List[str]
+
+
+class RetrievalResult(BaseModel):
+    """Latency, throughput and recall of one strategy at one index size and ``top_k``.
+
+    Attributes:
+        documents: The number of indexed chunks
+        top_k: The number of results per question
+        strategy: ``search``, ``search_trusted`` or ``search_batch``
+        queries: The number of questions
+        concurrency: The threads sending requests while measuring ``qps``
+        p50_ms: Median latency of a request, one question or one batch
+        p95_ms: 95th percentile of the request latency
+        p99_ms: 99th percentile of the request latency
+        qps: Questions answered per second under ``concurrency``
+        recall_at_k: The share of the exact brute-force top ``top_k`` that
+            was returned
+        label_hit_rate: The share of questions with at least one labeled
+            relevant chunk in the results, among the questions whose relevant
+            chunks are indexed
+    """
+
+    documents: int
+    top_k: int
+    strategy: str
+    queries: int
+    concurrency: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    qps: float
+    recall_at_k: float
+    label_hit_rate: float
+
+
+def chunk_key(chunk: Union[CodeChunk, Dict[str, Any]]) -> str:
+    """Identify a chunk by its file and position."""
+    if isinstance(chunk, dict):
+        return f"{chunk['title']}#{chunk['chunk_num']}"
+    return f"{chunk.title}#{chunk.chunk_num}"
+
+
+def synthetic_corpus(
+    documents: int,
+    queries: int,
+    seed: int = 0,
+    chunks_per_file: int = 8,
+    rare_words: int = 6,
+) -> Tuple[List[CodeChunk], List[LabeledQuery]]:
+    """Generate chunks and questions labeled with the chunk they were drawn from.
+
+    Every chunk mixes common documentation words with a few words of a large
+    vocabulary, and every question samples the rare words of one chunk, so the
+    labels are answerable by any reasonable encoder.
+
+    Args:
+        documents: The number of chunks
+        queries: The number of questions
+        seed: The random seed, the same arguments always give the same corpus
+        chunks_per_file: Chunks sharing one title
+        rare_words: Rare words per chunk
+
+    Returns:
+        The chunks and the labeled questions
+    """
+    rng = random.Random(seed)
+    vocabulary = max(1000, documents * 2)
+    chunks = []
+    for position in range(documents):
+        number = position % chunks_per_file
+        amount = min(chunks_per_file, documents - position + number)
+        words = [rng.choice(_WORDS) for _ in range(rng.randint(20, 60))]
+        words += [f"term{rng.randrange(vocabulary)}" for _ in range(rare_words)]
+        rng.shuffle(words)
+        content = " ".join(words)
+        chunks.append(
+            CodeChunk(
+                title=f"docs/file{position // chunks_per_file}.md",
+                content=content,
+                length=len(content),
+                chunk_num=number + 1,
+                chunk_amount=amount,
+            )
+        )
+
+    labeled = []
+    for _ in range(queries):
+        chunk = rng.choice(chunks)
+        rare = [word for word in chunk.content.split() if word.startswith("term")]
+        words = rng.sample(rare, min(4, len(rare))) + rng.sample(_WORDS, 1)
+        rng.shuffle(words)
+        labeled.append(
+            LabeledQuery(question=" ".join(words), relevant=[chunk_key(chunk)])
+        )
+    return chunks, labeled
+
+
+def load_corpus(path: Union[str, Path]) -> List[CodeChunk]:
+    """Read the chunks of a crawler output file, a list of libraries."""
+    with open(path, encoding="utf-8") as file:
+        data = json.load(file)
+    libraries = data if isinstance(data, list) else [data]
+    return [
+        chunk
+        for library in libraries
+        for chunk in LibrarySource.model_validate(library).chunks
+    ]
+
+
+def load_queries(path: Union[str, Path]) -> List[LabeledQuery]:
+    """Read labeled questions from a JSONL file of ``{"question": ..., "relevant": [...]}``."""
+    with open(path, encoding="utf-8") as file:
+        return [LabeledQuery.model_validate_json(line) for line in file if line.strip()]
+
+
+def exact_top_k(
+    encoder: HashingEncoder,
+    chunks: Sequence[CodeChunk],
+    questions: Sequence[str],
+    top_k: int,
+) -> List[List[str]]:
+    """Return the keys of the exact top ``top_k`` chunks per question by brute-force cosine similarity."""
+    documents = np.asarray(
+        encoder.encode([chunk.markdown for chunk in chunks]), dtype=np.float32
+    )
+    queries = np.asarray(encoder.encode(list(questions)), dtype=np.float32)
+    documents /= np.maximum(np.linalg.norm(documents, axis=1, keepdims=True), 1e-12)
+    queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    scores = queries @ documents.T
+    top_k = min(top_k, len(chunks))
+    best = np.argsort(-scores, axis=1, kind="stable")[:, :top_k]
+    return [[chunk_key(chunks[row]) for row in rows] for rows in best]
+
+
+def _percentile(latencies: Sequence[float], q: float) -> float:
+    return float(np.percentile(latencies, q) * 1000) if len(latencies) else 0.0
+
+
+def _strategy(
+    retriever: OpenSearchRetriever,
+    strategy: str,
+    collection_name: str,
+    top_k: int,
+) -> Callable[[List[str]], List[List[str]]]:
+    """Return a function answering a group of questions with one request per question or per group."""
+    fields = ["title", "chunk_num"]
+    if strategy == "search_batch":
+
+        def run(questions: List[str]) -> List[List[str]]:
+            results = retriever.search_batch(
+                questions, collection_name, top_k=top_k, fields=fields, trusted=True
+            )
+            return [[chunk_key(chunk) for chunk in chunks] for chunks in results]
+
+        return run
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy: {strategy}")
+    trusted = strategy == "search_trusted"
+
+    def run(questions: List[str]) -> List[List[str]]:
+        return [
+            [
+                chunk_key(chunk)
+                for chunk in retriever.search(
+                    question,
+                    collection_name,
+                    top_k=top_k,
+                    fields=None if not trusted else fields,
+                    trusted=trusted,
+                )
+            ]
+            for question in questions
+        ]
+
+    return run
+
+
+def benchmark_retrieval(
+    retriever: OpenSearchRetriever,
+    encoder: HashingEncoder,
+    chunks: Sequence[CodeChunk],
+    queries: Sequence[LabeledQuery],
+    sizes: Sequence[int],
+    top_ks: Sequence[int] = (5,),
+    strategies: Sequence[str] = STRATEGIES,
+    concurrency: int = 4,
+    batch_size: int = 16,
+    collection_prefix: str = "aidkits-bench",
+) -> List[RetrievalResult]:
+    """Index growing prefixes of the corpus and measure every strategy and ``top_k`` on each.
+
+    Every size gets its own collection, deleted when its measurements are done.
+
+    Args:
+        retriever: The retriever under test, on a real cluster or a ``FakeOpenSearch``
+        encoder: The encoder of the retriever, also used for the exact ground truth
+        chunks: The corpus
+        queries: The labeled questions
+        sizes: The index sizes, each a number of leading chunks of the corpus
+        top_ks: The ``top_k`` values
+        strategies: Any of :data:`STRATEGIES`
+        concurrency: The threads sending requests while measuring throughput
+        batch_size: Questions per ``search_batch`` request
+        collection_prefix: The prefix of the benchmark collections
+
+    Returns:
+        One result per size, ``top_k`` and strategy
+    """
+    questions = [query.question for query in queries]
+    results = []
+    for size in sizes:
+        indexed = list(chunks[:size])
+        indexed_keys = {chunk_key(chunk) for chunk in indexed}
+        collection_name = f"{collection_prefix}-{size}"
+        retriever.create_collection(collection_name)
+        try:
+            retriever.upload_library(
+                LibrarySource(title=collection_name, chunks=indexed),
+                collection_name=collection_name,
+            )
+            # Measure a fully searchable index, not whatever the last refresh interval made visible
+            retriever.refresh_collection(collection_name)
+            for top_k in top_ks:
+                truth = exact_top_k(encoder, indexed, questions, top_k)
+                for strategy in strategies:
+                    run = _strategy(retriever, strategy, collection_name, top_k)
+                    group = batch_size if strategy == "search_batch" else 1
+                    groups = [
+                        questions[start : start + group]
+                        for start in range(0, len(questions), group)
+                    ]
+
+                    # Latency: requests one after another
+                    latencies = []
+                    returned: List[List[str]] = []
+                    for questions_group in groups:
+                        start = time.perf_counter()
+                        returned.extend(run(questions_group))
+                        latencies.append(time.perf_counter() - start)
+
+                    # Throughput: the same requests from ``concurrency`` threads
+                    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                        start = time.perf_counter()
+                        list(executor.map(run, groups))
+                        elapsed = time.perf_counter() - start
+
+                    found = sum(
+                        len(set(keys) & set(expected))
+                        for keys, expected in zip(returned, truth)
+                    )
+                    expected_total = sum(len(expected) for expected in truth)
+                    # Labels only count for questions whose relevant chunks are in this index
+                    labeled = [
+                        (keys, set(query.relevant))
+                        for keys, query in zip(returned, queries)
+                        if set(query.relevant) & indexed_keys
+                    ]
+                    hits = sum(bool(set(keys) & relevant) for keys, relevant in labeled)
+                    results.append(
+                        RetrievalResult(
+                            documents=len(indexed),
+                            top_k=top_k,
+                            strategy=strategy,
+                            queries=len(questions),
+                            concurrency=concurrency,
+                            p50_ms=_percentile(latencies, 50),
+                            p95_ms=_percentile(latencies, 95),
+                            p99_ms=_percentile(latencies, 99),
+                            qps=len(questions) / elapsed if elapsed else float("inf"),
+                            recall_at_k=found / expected_total
+                            if expected_total
+                            else 1.0,
+                            label_hit_rate=hits / len(labeled) if labeled else 0.0,
+                        )
+                    )
+        finally:
+            retriever.delete_collection(collection_name)
+    return results
+
+
+def format_results(results: Iterable[RetrievalResult]) -> str:
+    lines = [
+        f"{'docs':>8} {'top_k':>5} {'strategy':<15} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+        f" {'qps':>9} {'recall':>7} {'labels':>7}"
+    ]
+    for result in results:
+        lines.append(
+            f"{result.documents:>8} {result.top_k:>5} {result.strategy:<15} {result.p50_ms:>8.2f}"
+            f" {result.p95_ms:>8.2f} {result.p99_ms:>8.2f} {result.qps:>9,.0f}"
+            f" {result.recall_at_k:>7.3f} {result.label_hit_rate:>7.3f}"
+        )
+    return "\n".join(lines)
+
+
+def _integers(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Latency, throughput and recall@k of OpenSearchRetriever."
+    )
+    parser.add_argument(
+        "--sizes",
+        type=_integers,
+        default=[1000, 10000],
+        help="Index sizes (default: 1000,10000).",
+    )
+    parser.add_argument(
+        "--top-k", type=_integers, default=[5, 20], help="top_k values (default: 5,20)."
+    )
+    parser.add_argument(
+        "--strategies",
+        type=lambda value: value.split(","),
+        default=list(STRATEGIES),
+        help=f"Comma-separated strategies (default: {','.join(STRATEGIES)}).",
+    )
+    parser.add_argument(
+        "--queries", type=int, default=200, help="Synthetic questions (default: 200)."
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Threads for the throughput run (default: 4).",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=16,
+        help="Questions per search_batch (default: 16).",
+    )
+    parser.add_argument(
+        "--dimension", type=int, default=256, help="Embedding dimension (default: 256)."
+    )
+    parser.add_argument(
+        "--data-type",
+        choices=["float", "float16", "byte"],
+        default="float",
+        help="Stored vector type, recall shows the quantization loss (default: float).",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed (default: 0).")
+    parser.add_argument(
+        "--corpus",
+        type=str,
+        default=None,
+        help="Crawler output JSON instead of a synthetic corpus.",
+    )
+    parser.add_argument(
+        "--labels",
+        type=str,
+        default=None,
+        help="JSONL of labeled questions for --corpus.",
+    )
+    parser.add_argument(
+        "--host",
+        type=str,
+        default=None,
+        help="OpenSearch URL; without it an in-process stand-in is used.",
+    )
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=0.0,
+        help="Simulated round trip of the in-process stand-in (default: 0).",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Append the results to this JSONL file.",
+    )
+    args = parser.parse_args()
+
+    if args.corpus:
+        chunks = load_corpus(args.corpus)
+        queries = load_queries(args.labels) if args.labels else []
+        if not queries:
+            parser.error("--corpus requires --labels")
+    else:
+        chunks, queries = synthetic_corpus(max(args.sizes), args.queries, args.seed)
+
+    if args.host:
+        from opensearchpy import OpenSearch
+
+        client = OpenSearch(hosts=[args.host])
+    else:
+        client = FakeOpenSearch(latency=args.latency_ms / 1000)
+
+    encoder = HashingEncoder(args.dimension)
+    vector_options = (
+        VectorOptions(data_type=args.data_type) if args.data_type != "float" else None
+    )
+    retriever = OpenSearchRetriever(
+        client, encoder, BulkIndexer(client), vector_options=vector_options
+    )
+    results = benchmark_retrieval(
+        retriever,
+        encoder,
+        chunks,
+        queries,
+        args.sizes,
+        args.top_k,
+        args.strategies,
+        args.concurrency,
+        args.batch_size,
+    )
+    print(format_results(results))
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as file:
+            for result in results:
+                file.write(result.model_dump_json())
+                file.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
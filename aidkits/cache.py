@@ -0,0 +1,275 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+from pydantic import BaseModel
+
+from aidkits.models import CodeChunk
+from aidkits.storage.ids import chunk_document
+
+
+class CacheEntry(BaseModel):
+    question: str
+    answer: str
+    embedding: Optional[List[float]] = None
+    created_at: float
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a question for exact cache hits: case, whitespace and trailing punctuation."""
+    return re.sub(r"\s+", " ", question.casefold()).strip().rstrip("?!.").strip()
+
+
+def evidence_key(collection_name: str, chunks: Iterable[CodeChunk]) -> str:
+    """Hash the document IDs of the retrieved chunks.
+
+    The IDs are the ones the retrievers index the chunks under, so they
+    include the content hash: when a retrieved document changes, so does the
+    key, and answers built on the old version are no longer found.
+    """
+    ids = sorted({chunk_document(collection_name, chunk)[0] for chunk in chunks})
+    return hashlib.sha256("\n".join(ids).encode("utf-8")).hexdigest()
+
+
+class AnswerCacheStore:
+    """Stores cache entries grouped by evidence key, with TTL and size-bounded eviction."""
+
+    def get(self, evidence: str) -> List[Tuple[str, CacheEntry]]:
+        """Return the live ``(question key, entry)`` pairs stored for the evidence."""
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def put(self, evidence: str, question_key: str, entry: CacheEntry) -> None:
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def clear(self) -> None:
+        raise NotImplementedError("Subclasses must implement this method")
+
+
+class InMemoryCacheStore(AnswerCacheStore):
+    """An LRU store in process memory.
+
+    Args:
+        max_entries: Least recently used entries are evicted beyond this size
+        ttl: Seconds an entry stays valid, ``None`` for no expiry
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], CacheEntry]" = OrderedDict()
+        self._by_evidence: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def _expired(self, entry: CacheEntry, now: float) -> bool:
+        return self.ttl is not None and now - entry.created_at > self.ttl
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        del self._entries[key]
+        evidence, question_key = key
+        keys = self._by_evidence[evidence]
+        keys.remove(question_key)
+        if not keys:
+            del self._by_evidence[evidence]
+
+    def get(self, evidence: str) -> List[Tuple[str, CacheEntry]]:
+        now = time.time()
+        with self._lock:
+            result = []
+            for question_key in list(self._by_evidence.get(evidence, [])):
+                key = (evidence, question_key)
+                entry = self._entries[key]
+                if self._expired(entry, now):
+                    self._remove(key)
+                    continue
+                self._entries.move_to_end(key)
+                result.append((question_key, entry))
+            return result
+
+    def put(self, evidence: str, question_key: str, entry: CacheEntry) -> None:
+        key = (evidence, question_key)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._by_evidence.setdefault(evidence, []).append(question_key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_evidence.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SqliteCacheStore(AnswerCacheStore):
+    """A store in a SQLite file, shared by processes and kept across restarts.
+
+    Args:
+        path: The database file
+        max_entries: Least recently used entries are evicted beyond this size
+        ttl: Seconds an entry stays valid, ``None`` for no expiry
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        max_entries: int = 100_000,
+        ttl: Optional[float] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._connection = sqlite3.connect(
+            str(path), check_same_thread=False, isolation_level=None
+        )
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                " evidence TEXT NOT NULL,"
+                " question_key TEXT NOT NULL,"
+                " entry TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL,"
+                " PRIMARY KEY (evidence, question_key))"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS answers_accessed_at ON answers (accessed_at)"
+            )
+
+    def get(self, evidence: str) -> List[Tuple[str, CacheEntry]]:
+        now = time.time()
+        with self._lock:
+            if self.ttl is not None:
+                self._connection.execute(
+                    "DELETE FROM answers WHERE evidence = ? AND created_at < ?",
+                    (evidence, now - self.ttl),
+                )
+            rows = self._connection.execute(
+                "SELECT question_key, entry FROM answers WHERE evidence = ?",
+                (evidence,),
+            ).fetchall()
+            if rows:
+                self._connection.execute(
+                    "UPDATE answers SET accessed_at = ? WHERE evidence = ?",
+                    (now, evidence),
+                )
+        return [
+            (question_key, CacheEntry.model_validate_json(entry))
+            for question_key, entry in rows
+        ]
+
+    def put(self, evidence: str, question_key: str, entry: CacheEntry) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?)",
+                (
+                    evidence,
+                    question_key,
+                    entry.model_dump_json(),
+                    entry.created_at,
+                    now,
+                ),
+            )
+            self._connection.execute(
+                "DELETE FROM answers WHERE rowid IN ("
+                " SELECT rowid FROM answers ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM answers")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM answers").fetchone()[
+                0
+            ]
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+class AnswerCache:
+    """Caches answers by question and the evidence they were generated from.
+
+    A cached answer is reused when the same documents are retrieved and the
+    question matches, either after :func:`normalize_question` or, with an
+    ``encoder``, when the cosine similarity of the question embeddings reaches
+    ``similarity_threshold``.
+    """
+
+    def __init__(
+        self,
+        store: Optional[AnswerCacheStore] = None,
+        encoder: Optional[Any] = None,
+        similarity_threshold: float = 0.95,
+    ):
+        """
+        Args:
+            store: Where entries are kept, an ``InMemoryCacheStore`` by default
+            encoder: Embeds questions for similarity matching
+            similarity_threshold: The cosine similarity of a matching question
+        """
+        self.store = store or InMemoryCacheStore()
+        self._encoder = encoder
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.misses = 0
+
+    def _embed(self, question: str) -> List[float]:
+        embedding = np.asarray(
+            self._encoder.encode(question, prompt_name="search_query"), dtype=np.float32
+        )
+        norm = np.linalg.norm(embedding)
+        return (embedding / norm if norm else embedding).tolist()
+
+    def lookup(self, question: str, evidence: str) -> Optional[str]:
+        """Return the cached answer for the question and evidence, if any."""
+        entries = self.store.get(evidence)
+        question_key = normalize_question(question)
+        answer = next(
+            (entry.answer for key, entry in entries if key == question_key), None
+        )
+
+        if answer is None and self._encoder is not None and entries:
+            embedded = [
+                (key, entry) for key, entry in entries if entry.embedding is not None
+            ]
+            if embedded:
+                query = np.asarray(self._embed(question), dtype=np.float32)
+                scores = (
+                    np.asarray(
+                        [entry.embedding for _, entry in embedded], dtype=np.float32
+                    )
+                    @ query
+                )
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity_threshold:
+                    answer = embedded[best][1].answer
+
+        if answer is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return answer
+
+    def remember(self, question: str, evidence: str, answer: str) -> None:
+        """Store an answer generated from the evidence."""
+        entry = CacheEntry(
+            question=question,
+            answer=answer,
+            embedding=self._embed(question) if self._encoder is not None else None,
+            created_at=time.time(),
+        )
+        self.store.put(evidence, normalize_question(question), entry)
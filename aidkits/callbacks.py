@@ -0,0 +1,38 @@
+from typing import TYPE_CHECKING, Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+if TYPE_CHECKING:
+    from aidkits.documentation_tool import TokensCounter
+
+
+class TokensCounterCallback(BaseCallbackHandler):
+    """Adds the token usage reported by the LLM to a ``TokensCounter``.
+
+    The usage arrives with the final result, so it is counted once a streamed
+    answer has been fully consumed as well.
+    """
+
+    def __init__(self, tokens_counter: "TokensCounter"):
+        self._tokens_counter = tokens_counter
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(
+                    getattr(generation, "message", None), "usage_metadata", None
+                )
+                if usage:
+                    prompt_tokens += usage.get("input_tokens", 0)
+                    completion_tokens += usage.get("output_tokens", 0)
+
+        if not prompt_tokens and not completion_tokens:
+            # Providers without usage metadata on messages report it here
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+
+        self._tokens_counter.add_prompt_tokens(prompt_tokens)
+        self._tokens_counter.add_completion_tokens(completion_tokens)
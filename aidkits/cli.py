@@ -0,0 +1,266 @@
+import argparse
+import logging
+from typing import Any, List, Optional
+
+
+def _encoder(args: argparse.Namespace) -> Any:
+    if args.onnx:
+        from aidkits.encoders import OnnxEncoder
+
+        return OnnxEncoder.from_pretrained(args.onnx)
+    if args.model:
+        from sentence_transformers import SentenceTransformer
+
+        return SentenceTransformer(args.model, trust_remote_code=True)
+    from aidkits.benchmarks.retrieval import HashingEncoder
+
+    return HashingEncoder()
+
+
+def _client(args: argparse.Namespace) -> Any:
+    if args.host:
+        from opensearchpy import OpenSearch
+
+        return OpenSearch(hosts=[args.host])
+    from aidkits.benchmarks.fake_opensearch import FakeOpenSearch
+
+    return FakeOpenSearch()
+
+
+def _ingest(args: argparse.Namespace) -> int:
+    from aidkits.pipeline import ingest
+    from aidkits.storage.opensearch_retriever import OpenSearchRetriever
+
+    retriever = OpenSearchRetriever(_client(args), _encoder(args))
+    report = ingest(
+        args.source,
+        retriever,
+        args.collection,
+        path_prefix=args.path_prefix,
+        batch_size=args.batch_size,
+        window_size=args.window_size,
+        queue_size=args.queue_size,
+        delete_stale=not args.keep_stale,
+        chunks_path=args.chunks_output,
+    )
+    print(report.model_dump_json(indent=4, exclude={"bulk": {"failed"}}))
+    return 0 if report.bulk.ok else 1
+
+
+def _watch(args: argparse.Namespace) -> int:
+    from aidkits.storage.opensearch_retriever import OpenSearchRetriever
+    from aidkits.watch import DirectoryWatch
+
+    watch = DirectoryWatch(
+        args.directory,
+        OpenSearchRetriever(_client(args), _encoder(args)),
+        args.collection,
+        debounce=args.debounce,
+        interval=args.interval,
+        batch_size=args.batch_size,
+        polling=args.polling,
+    )
+    try:
+        watch.run(initial_sync=not args.no_initial_sync)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def _profile(args: argparse.Namespace) -> int:
+    from aidkits.profiling import StageProfiler, format_profile, profile_ingestion
+
+    encoder = _encoder(args)
+    client = _client(args)
+
+    profiler = StageProfiler(
+        trace_memory=not args.no_memory, top=args.top, profile_dir=args.profile_dir
+    )
+    report = profile_ingestion(
+        args.source,
+        encoder,
+        client,
+        collection_name=args.collection,
+        path_prefix=args.path_prefix,
+        batch_size=args.batch_size,
+        profiler=profiler,
+    )
+    print(format_profile(report))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(report.model_dump_json(indent=4))
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="aidkits", description="Tools for building documentation assistants."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    profile = commands.add_parser(
+        "profile",
+        help="Profile fetch, crawl, encode and index on a source.",
+        description="Run ingestion on a source and report wall time, throughput, peak RSS and the top "
+        "allocating lines of every stage.",
+    )
+    _add_source_arguments(profile)
+    profile.add_argument(
+        "--collection",
+        type=str,
+        default="aidkits-profile",
+        help="The collection to index into (default: aidkits-profile).",
+    )
+    _add_backend_arguments(profile, required=False)
+    profile.add_argument(
+        "--batch-size",
+        type=int,
+        default=100,
+        help="The batch size for encoding (default: 100).",
+    )
+    profile.add_argument(
+        "--no-memory",
+        action="store_true",
+        help="Skip tracemalloc, which slows allocation-heavy stages down.",
+    )
+    profile.add_argument(
+        "--top",
+        type=int,
+        default=10,
+        help="Allocating lines reported per stage (default: 10).",
+    )
+    profile.add_argument(
+        "--profile-dir",
+        type=str,
+        default=None,
+        help="Write a cProfile dump of every stage to this directory.",
+    )
+    profile.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Write the report as JSON to this file.",
+    )
+    profile.set_defaults(handler=_profile)
+
+    ingest = commands.add_parser(
+        "ingest",
+        help="Stream a source into a collection.",
+        description="Crawl a source and stream its chunks through encoding into bulk indexing, with bounded "
+        "queues between the stages.",
+    )
+    _add_source_arguments(ingest)
+    ingest.add_argument(
+        "--collection", type=str, required=True, help="The collection to index into."
+    )
+    _add_backend_arguments(ingest, required=True)
+    ingest.add_argument(
+        "--batch-size",
+        type=int,
+        default=100,
+        help="The batch size for encoding (default: 100).",
+    )
+    ingest.add_argument(
+        "--window-size",
+        type=int,
+        default=1000,
+        help="Chunks encoded at once (default: 1000).",
+    )
+    ingest.add_argument(
+        "--queue-size",
+        type=int,
+        default=1000,
+        help="Chunks buffered between crawling and encoding (default: 1000).",
+    )
+    ingest.add_argument(
+        "--keep-stale",
+        action="store_true",
+        help="Keep indexed chunks that are no longer in the source.",
+    )
+    ingest.add_argument(
+        "--chunks-output",
+        type=str,
+        default=None,
+        help="Also write the chunks to this JSONL file.",
+    )
+    ingest.set_defaults(handler=_ingest)
+
+    watch = commands.add_parser(
+        "watch",
+        help="Keep a collection in sync with a local directory.",
+        description="Watch a local directory and re-index the markdown files that are created, modified or "
+        "deleted, until interrupted.",
+    )
+    watch.add_argument("directory", type=str, help="The local directory to watch.")
+    watch.add_argument(
+        "--collection", type=str, required=True, help="The collection to keep in sync."
+    )
+    _add_backend_arguments(watch, required=True)
+    watch.add_argument(
+        "--batch-size",
+        type=int,
+        default=100,
+        help="The batch size for encoding (default: 100).",
+    )
+    watch.add_argument(
+        "--debounce",
+        type=float,
+        default=0.5,
+        help="Seconds without changes before a burst is synchronized (default: 0.5).",
+    )
+    watch.add_argument(
+        "--interval",
+        type=float,
+        default=1.0,
+        help="Seconds between polls (default: 1.0).",
+    )
+    watch.add_argument(
+        "--polling", action="store_true", help="Poll even when watchdog is installed."
+    )
+    watch.add_argument(
+        "--no-initial-sync",
+        action="store_true",
+        help="Skip the full ingestion of the directory on start.",
+    )
+    watch.set_defaults(handler=_watch)
+    return parser
+
+
+def _add_source_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("source", type=str, help="A git URL or a local directory.")
+    parser.add_argument(
+        "--path-prefix", type=str, default="", help="Only crawl this subdirectory."
+    )
+
+
+def _add_backend_arguments(parser: argparse.ArgumentParser, required: bool) -> None:
+    """Add the cluster and encoder options; optional ones fall back to offline stand-ins."""
+    parser.add_argument(
+        "--host",
+        type=str,
+        default=None,
+        required=required,
+        help="OpenSearch URL."
+        if required
+        else "OpenSearch URL; without it an in-process stand-in is used.",
+    )
+    encoder = parser.add_mutually_exclusive_group(required=required)
+    encoder.add_argument(
+        "--model", type=str, default=None, help="A sentence-transformers model name."
+    )
+    encoder.add_argument(
+        "--onnx", type=str, default=None, help="A directory exported with export_onnx."
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,142 @@
+import math
+from typing import Callable, Dict, List, Optional, Sequence
+
+from pydantic import BaseModel
+
+from aidkits.models import CodeChunk
+
+# Counts the tokens of a text
+TokenCounter = Callable[[str], int]
+
+# Rough number of characters per token of English text and code
+CHARS_PER_TOKEN = 4
+
+TRIM_MARKER = "\n..."
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens of a text without a tokenizer."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class PackedContext(BaseModel):
+    """The documentation placed in a prompt and its token accounting.
+
+    Attributes:
+        text: The rendered documentation
+        tokens: The tokens of ``text`` according to the token counter
+        chunks: The chunks that were included, fully or trimmed, in rank order
+        trimmed: The number of included chunks that were cut to fit
+        dropped: The number of chunks left out
+    """
+
+    text: str
+    tokens: int
+    chunks: List[CodeChunk]
+    trimmed: int = 0
+    dropped: int = 0
+
+
+def _trim(text: str, max_tokens: int, token_counter: TokenCounter) -> str:
+    """Return the longest prefix of ``text`` (plus a marker) that fits in ``max_tokens``."""
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if token_counter(text[:middle] + TRIM_MARKER) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low] + TRIM_MARKER if low else ""
+
+
+def pack_context(
+    chunks: Sequence[CodeChunk],
+    max_tokens: int,
+    token_counter: TokenCounter = estimate_tokens,
+    max_chunk_tokens: Optional[int] = None,
+    min_trimmed_tokens: int = 32,
+    separator: str = "\n\n",
+) -> PackedContext:
+    """Greedily pack ranked chunks into a token budget.
+
+    Chunks are taken in rank order. Files are told apart by their path, or by
+    their title for chunks crawled without one. The path (or title) is written
+    once per file, with that file's chunks below it in ``chunk_num`` order, and
+    repeated chunks are skipped. A chunk that does not fit is trimmed to the remaining
+    budget when at least ``min_trimmed_tokens`` are left, otherwise it is
+    dropped and smaller chunks further down may still fit.
+
+    With the default ``token_counter``, the precomputed ``CodeChunk.tokens`` is
+    used for chunk contents when set, so only titles and short headers are
+    counted at query time. Precomputed counts come from the parser's counter,
+    so any other ``token_counter`` counts the contents itself.
+
+    Args:
+        chunks: The retrieved chunks, best first
+        max_tokens: The token budget of the documentation
+        token_counter: Counts tokens, ideally with the LLM's tokenizer
+        max_chunk_tokens: Trim every chunk to at most this many tokens
+        min_trimmed_tokens: The smallest useful remainder of a trimmed chunk
+        separator: Placed between chunks and files
+
+    Returns:
+        The packed context
+    """
+    separator_tokens = token_counter(separator)
+    precomputed = token_counter is estimate_tokens
+    files: Dict[str, List[CodeChunk]] = {}
+    bodies: Dict[int, str] = {}
+    seen = set()
+    used = 0
+    trimmed = dropped = 0
+    included: List[CodeChunk] = []
+
+    for chunk in chunks:
+        file = chunk.path or chunk.title
+        key = (file, chunk.chunk_num, chunk.content)
+        if key in seen:
+            continue
+        seen.add(key)
+
+        header = f"Chunk {chunk.chunk_num}/{chunk.chunk_amount}\n\n"
+        cost = token_counter(header) + separator_tokens
+        if file not in files:
+            cost += token_counter(file) + separator_tokens
+        if precomputed and chunk.tokens is not None:
+            content_tokens = chunk.tokens
+        else:
+            content_tokens = token_counter(chunk.content)
+
+        content = chunk.content
+        remaining = max_tokens - used - cost
+        limit = (
+            remaining if max_chunk_tokens is None else min(remaining, max_chunk_tokens)
+        )
+        if content_tokens > limit:
+            if content_tokens > remaining and remaining < min_trimmed_tokens:
+                dropped += 1
+                continue
+            content = _trim(content, limit, token_counter)
+            content_tokens = token_counter(content)
+            trimmed += 1
+
+        used += cost + content_tokens
+        files.setdefault(file, []).append(chunk)
+        bodies[id(chunk)] = header + content
+        included.append(chunk)
+
+    sections = []
+    for file, file_chunks in files.items():
+        parts = [file] + [
+            bodies[id(chunk)]
+            for chunk in sorted(file_chunks, key=lambda chunk: chunk.chunk_num)
+        ]
+        sections.append(separator.join(parts))
+    text = separator.join(sections)
+    return PackedContext(
+        text=text,
+        tokens=token_counter(text),
+        chunks=included,
+        trimmed=trimmed,
+        dropped=dropped,
+    )
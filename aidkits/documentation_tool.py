@@ -1,9 +1,26 @@
-from typing import Dict, Optional, List
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, Iterator, Optional, List, Union
 
-from langchain_core.language_models import BaseChatModel
-from langchain_core.output_parsers import BaseOutputParser, StrOutputParser
+from aidkits import tracing
+from aidkits.cache import AnswerCache, evidence_key
+from aidkits.context import PackedContext, TokenCounter, estimate_tokens, pack_context
+from aidkits.models import CodeChunk
 
-from aidkits.storage.opensearch_retriever import OpenSearchRetriever
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.output_parsers import BaseOutputParser
+    from langchain_core.runnables import RunnableConfig
+
+    from aidkits.storage.opensearch_retriever import OpenSearchRetriever
+
+logger = logging.getLogger(__name__)
+
+# Default number of chain calls a batch runs at once
+DEFAULT_MAX_CONCURRENCY = 8
 
 # Default documentation prompt
 DOCUMENTATION_PROMPT = """You are an assistant that helps users with documentation questions.
@@ -22,14 +39,18 @@ class TokensCounter:
         self.prompt_tokens = 0
         self.completion_tokens = 0
         self.total_tokens = 0
+        # Batched calls report usage from several threads
+        self._lock = threading.Lock()
     
     def add_prompt_tokens(self, count: int):
-        self.prompt_tokens += count
-        self.total_tokens += count
+        with self._lock:
+            self.prompt_tokens += count
+            self.total_tokens += count
     
     def add_completion_tokens(self, count: int):
-        self.completion_tokens += count
-        self.total_tokens += count
+        with self._lock:
+            self.completion_tokens += count
+            self.total_tokens += count
 
 
 class AgentLogger:
@@ -44,9 +65,9 @@ class BaseLLMTool:
         self,
         name: str,
         description: str,
-        llm: BaseChatModel,
+        llm: "BaseChatModel",
         prompt: str,
-        parser: BaseOutputParser,
+        parser: "BaseOutputParser",
         tokens_counter: Optional[TokensCounter] = None,
         agent_logger: Optional[AgentLogger] = None,
     ):
@@ -58,13 +79,57 @@ class BaseLLMTool:
         self._tokens_counter = tokens_counter
         self._agent_logger = agent_logger
         
-        # Create a chain with the LLM and parser
-        self._chain = self._llm | self._parser
+        # Create a chain with the prompt, LLM and parser
+        from langchain_core.prompts import PromptTemplate
+
+        self._chain = PromptTemplate.from_template(self._prompt) | self._llm | self._parser
+    
+    def _config(self) -> "RunnableConfig":
+        """Return the chain config that reports token usage to the counter."""
+        if self._tokens_counter is None:
+            return {}
+        from aidkits.callbacks import TokensCounterCallback
+
+        return {"callbacks": [TokensCounterCallback(self._tokens_counter)]}
     
     def _invoke(self, input: Dict) -> str:
         """Invoke the tool with the given input."""
         raise NotImplementedError("Subclasses must implement this method")
     
+    async def _ainvoke(self, input: Dict) -> str:
+        """Invoke the tool asynchronously, by default in a worker thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._invoke, input)
+    
+    def _batch(self, inputs: List[Dict], max_concurrency: int) -> List[Union[str, Exception]]:
+        """Invoke the tool for every input, by default in a thread pool."""
+        def capture(input: Dict) -> Union[str, Exception]:
+            try:
+                return self._invoke(input)
+            except Exception as error:
+                return error
+        
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            return list(executor.map(capture, inputs))
+    
+    async def _abatch(self, inputs: List[Dict], max_concurrency: int) -> List[Union[str, Exception]]:
+        """Invoke the tool asynchronously for every input with bounded concurrency."""
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def limited(input: Dict) -> str:
+            async with semaphore:
+                return await self._ainvoke(input)
+        
+        return await asyncio.gather(*(limited(input) for input in inputs), return_exceptions=True)
+    
+    def _stream(self, input: Dict) -> Iterator[str]:
+        """Stream the answer for the given input."""
+        raise NotImplementedError("Subclasses must implement this method")
+    
+    def _astream(self, input: Dict) -> AsyncIterator[str]:
+        """Stream the answer for the given input asynchronously."""
+        raise NotImplementedError("Subclasses must implement this method")
+    
     def invoke(self, input: Dict) -> str:
         """Invoke the tool with the given input and log the action."""
         if self._agent_logger:
@@ -76,28 +141,203 @@ class BaseLLMTool:
             self._agent_logger.log(f"Tool {self.name} returned result")
         
         return result
+    
+    async def ainvoke(self, input: Dict) -> str:
+        """Invoke the tool asynchronously and log the action."""
+        if self._agent_logger:
+            self._agent_logger.log(f"Invoking tool: {self.name}")
+        
+        result = await self._ainvoke(input)
+        
+        if self._agent_logger:
+            self._agent_logger.log(f"Tool {self.name} returned result")
+        
+        return result
+    
+    def batch(
+        self,
+        inputs: List[Dict],
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    ) -> List[Union[str, Exception]]:
+        """Invoke the tool for many inputs and log the action.
+        
+        Args:
+            inputs: The inputs to invoke the tool with
+            max_concurrency: The maximum number of LLM calls in flight
+            
+        Returns:
+            The results in input order. A failed input yields its exception
+            instead of failing the batch
+        """
+        if self._agent_logger:
+            self._agent_logger.log(f"Batch invoking tool: {self.name} with {len(inputs)} inputs")
+        
+        results = self._batch(inputs, max_concurrency)
+        
+        if self._agent_logger:
+            failed = sum(isinstance(result, Exception) for result in results)
+            self._agent_logger.log(f"Tool {self.name} returned {len(results)} results, {failed} failed")
+        
+        return results
+    
+    async def abatch(
+        self,
+        inputs: List[Dict],
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    ) -> List[Union[str, Exception]]:
+        """Invoke the tool asynchronously for many inputs, see :meth:`batch`."""
+        if self._agent_logger:
+            self._agent_logger.log(f"Batch invoking tool: {self.name} with {len(inputs)} inputs")
+        
+        results = await self._abatch(inputs, max_concurrency)
+        
+        if self._agent_logger:
+            failed = sum(isinstance(result, Exception) for result in results)
+            self._agent_logger.log(f"Tool {self.name} returned {len(results)} results, {failed} failed")
+        
+        return results
+    
+    def stream(self, input: Dict) -> Iterator[str]:
+        """Stream the answer of the tool and log the action."""
+        if self._agent_logger:
+            self._agent_logger.log(f"Streaming tool: {self.name}")
+        
+        yield from self._stream(input)
+        
+        if self._agent_logger:
+            self._agent_logger.log(f"Tool {self.name} finished streaming")
+    
+    async def astream(self, input: Dict) -> AsyncIterator[str]:
+        """Stream the answer of the tool asynchronously and log the action."""
+        if self._agent_logger:
+            self._agent_logger.log(f"Streaming tool: {self.name}")
+        
+        async for token in self._astream(input):
+            yield token
+        
+        if self._agent_logger:
+            self._agent_logger.log(f"Tool {self.name} finished streaming")
+
+
+class _Request:
+    """One question on its way through retrieval, the answer cache and the chain."""
+    __slots__ = ("question", "chain_input", "evidence", "answer")
+    
+    def __init__(self, question: str, chain_input: Dict[str, str]):
+        self.question = question
+        self.chain_input = chain_input
+        self.evidence: Optional[str] = None
+        self.answer: Optional[str] = None
 
 
 class DocumentationTool(BaseLLMTool):
     """Tool for answering questions using documentation stored in OpenSearch."""
     def __init__(
         self,
-        llm: BaseChatModel,
-        retriever: OpenSearchRetriever,
+        llm: "BaseChatModel",
+        retriever: "OpenSearchRetriever",
         collection_name: str,
         top_k: int = 5,
+        neighbors: int = 0,
+        max_context_tokens: int = 4000,
+        token_counter: Optional[TokenCounter] = None,
+        answer_cache: Optional[AnswerCache] = None,
         name: str = "documentation_tool",
         description: str = "Answer question with documentation knowledge",
         prompt: str = DOCUMENTATION_PROMPT,
-        parser: BaseOutputParser = StrOutputParser(),
+        parser: Optional["BaseOutputParser"] = None,
         tokens_counter: Optional[TokensCounter] = None,
         agent_logger: Optional[AgentLogger] = None,
     ):
+        if parser is None:
+            from langchain_core.output_parsers import StrOutputParser
+
+            parser = StrOutputParser()
         super().__init__(name, description, llm, prompt, parser, tokens_counter, agent_logger)
         self._retriever = retriever
         self._top_k = top_k
+        self._neighbors = neighbors
+        self._max_context_tokens = max_context_tokens
+        self._token_counter = token_counter or estimate_tokens
+        self._answer_cache = answer_cache
         self._collection_name = collection_name
     
+    def _pack(self, examples: List[CodeChunk]) -> PackedContext:
+        """Pack the retrieved chunks, best first, into the context token budget."""
+        with tracing.span("tool.pack", chunks=len(examples)) as span:
+            packed = pack_context(examples, self._max_context_tokens, self._token_counter)
+            span.set(tokens=packed.tokens, dropped=packed.dropped)
+        return packed
+    
+    def _request(self, question: str, examples: List[CodeChunk]) -> _Request:
+        """Build the prompt variables and look the answer up in the cache."""
+        request = _Request(question, {"query": question, "documentation": self._pack(examples).text})
+        if self._answer_cache is not None:
+            with tracing.span("tool.cache") as span:
+                request.evidence = evidence_key(self._collection_name, examples)
+                request.answer = self._answer_cache.lookup(question, request.evidence)
+                span.set(hit=request.answer is not None)
+        return request
+    
+    def _remember(self, request: _Request, answer: str) -> str:
+        if self._answer_cache is not None and request.evidence is not None:
+            self._answer_cache.remember(request.question, request.evidence, answer)
+        return answer
+    
+    def _retrieve(self, question: str) -> _Request:
+        """Retrieve the documentation for a question and prepare its chain call."""
+        with tracing.span("tool.retrieve", collection=self._collection_name):
+            examples = self._retriever.search(
+                question=question,
+                collection_name=self._collection_name,
+                top_k=self._top_k,
+                neighbors=self._neighbors,
+            )
+        return self._request(question, examples)
+    
+    def _retrieve_batch(self, questions: List[str]) -> List[Union[_Request, Exception]]:
+        """Retrieve the documentation for many questions with one batched search."""
+        with tracing.span("tool.retrieve", collection=self._collection_name, questions=len(questions)):
+            results = self._retriever.search_batch(
+                questions=questions,
+                collection_name=self._collection_name,
+                top_k=self._top_k,
+                neighbors=self._neighbors,
+                return_exceptions=True,
+            )
+        return [
+            result if isinstance(result, Exception) else self._request(question, result)
+            for question, result in zip(questions, results)
+        ]
+    
+    def _merge_answers(
+        self,
+        requests: List[Union[_Request, Exception]],
+        answers: List[Union[str, Exception]],
+    ) -> List[Union[str, Exception]]:
+        """Merge the chain answers with cached answers and failed retrievals, in input order."""
+        remaining = iter(answers)
+        results: List[Union[str, Exception]] = []
+        for request in requests:
+            if isinstance(request, Exception):
+                results.append(request)
+            elif request.answer is not None:
+                results.append(request.answer)
+            else:
+                answer = next(remaining)
+                results.append(answer if isinstance(answer, Exception) else self._remember(request, answer))
+        return results
+    
+    @staticmethod
+    def _pending(requests: List[Union[_Request, Exception]]) -> List[Dict[str, str]]:
+        return [
+            request.chain_input for request in requests
+            if not isinstance(request, Exception) and request.answer is None
+        ]
+    
+    def _batch_config(self, max_concurrency: int) -> "RunnableConfig":
+        return {**self._config(), "max_concurrency": max_concurrency}
+    
     def _invoke(self, input: Dict) -> str:
         """Retrieve relevant documentation and answer the question.
         
@@ -108,20 +348,110 @@ class DocumentationTool(BaseLLMTool):
             The answer to the question
         """
         question = input.get("question")
-        examples = self._retriever.search(
-            question=question,
-            collection_name=self._collection_name,
-            top_k=self._top_k,
-        )
+        request = self._retrieve(question)
+        if request.answer is not None:
+            answer = request.answer
+        else:
+            with tracing.span("tool.llm"):
+                answer = self._chain.invoke(request.chain_input, config=self._config())
+            self._remember(request, answer)
+        logger.debug("Answered %r: %r", question, answer)
+        return answer
+    
+    async def _ainvoke(self, input: Dict) -> str:
+        """Retrieve relevant documentation in a worker thread and answer the question asynchronously."""
+        loop = asyncio.get_running_loop()
+        request = await loop.run_in_executor(None, self._retrieve, input.get("question"))
+        if request.answer is not None:
+            return request.answer
+        with tracing.span("tool.llm"):
+            answer = await self._chain.ainvoke(request.chain_input, config=self._config())
+        return self._remember(request, answer)
+    
+    def _batch(self, inputs: List[Dict], max_concurrency: int) -> List[Union[str, Exception]]:
+        """Retrieve documentation for all questions at once, then answer them with the chain's batch API.
         
-        answer = self._chain.invoke(
-            {
-                "query": question,
-                "documentation": "\n\n".join([item.markdown for item in examples]),
-            }
+        Args:
+            inputs: Dictionaries containing the questions
+            max_concurrency: The maximum number of LLM calls in flight
+            
+        Returns:
+            The answers in input order, with the exception of every failed input
+        """
+        requests = self._retrieve_batch([input.get("question") for input in inputs])
+        pending = self._pending(requests)
+        with tracing.span("tool.llm", questions=len(pending)):
+            answers = self._chain.batch(pending, config=self._batch_config(max_concurrency), return_exceptions=True)
+        return self._merge_answers(requests, answers)
+    
+    async def _abatch(self, inputs: List[Dict], max_concurrency: int) -> List[Union[str, Exception]]:
+        """Asynchronous version of :meth:`_batch`; retrieval runs in a worker thread."""
+        loop = asyncio.get_running_loop()
+        requests = await loop.run_in_executor(
+            None, self._retrieve_batch, [input.get("question") for input in inputs],
         )
+        pending = self._pending(requests)
+        with tracing.span("tool.llm", questions=len(pending)):
+            answers = await self._chain.abatch(
+                pending, config=self._batch_config(max_concurrency), return_exceptions=True,
+            )
+        return self._merge_answers(requests, answers)
+    
+    def _stream(self, input: Dict) -> Iterator[str]:
+        """Retrieve relevant documentation, then stream the answer as the LLM produces it.
         
-        print("QUESTION:", question)
-        print("ANSWER:", answer)
+        Args:
+            input: Dictionary containing the question
+            
+        Returns:
+            An iterator over the chunks of the answer
+        """
+        request = self._retrieve(input.get("question"))
+        if request.answer is not None:
+            yield request.answer
+            return
         
-        return answer
\ No newline at end of file
+        chunks = []
+        with tracing.span("tool.llm", stream=True) as span:
+            started = time.perf_counter()
+            for chunk in self._chain.stream(request.chain_input, config=self._config()):
+                if not chunks:
+                    span.set(first_token_seconds=time.perf_counter() - started)
+                chunks.append(chunk)
+                yield chunk
+        self._remember(request, "".join(chunks))
+    
+    async def _astream(self, input: Dict) -> AsyncIterator[str]:
+        """Retrieve relevant documentation without blocking the event loop, then stream the answer.
+        
+        Args:
+            input: Dictionary containing the question
+            
+        Returns:
+            An async iterator over the chunks of the answer
+        """
+        loop = asyncio.get_running_loop()
+        request = await loop.run_in_executor(None, self._retrieve, input.get("question"))
+        if request.answer is not None:
+            yield request.answer
+            return
+        
+        chunks = []
+        with tracing.span("tool.llm", stream=True) as span:
+            started = time.perf_counter()
+            async for chunk in self._chain.astream(request.chain_input, config=self._config()):
+                if not chunks:
+                    span.set(first_token_seconds=time.perf_counter() - started)
+                chunks.append(chunk)
+                yield chunk
+        self._remember(request, "".join(chunks))
+
+
+def __getattr__(name: str) -> Any:
+    # The callback subclasses a langchain class, so it lives in its own module
+    # and langchain is only imported once a tool is built
+    if name == "TokensCounterCallback":
+        from aidkits.callbacks import TokensCounterCallback
+
+        return TokensCounterCallback
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
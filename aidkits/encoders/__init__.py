@@ -0,0 +1,14 @@
+from .base import Encoder
+from .bucketing import LengthBucketedEncoder, PaddingReport, length_batches
+from .onnx_encoder import OnnxEncoder, export_onnx
+from .pool_encoder import MultiProcessEncoder
+
+__all__ = [
+    "Encoder",
+    "LengthBucketedEncoder",
+    "MultiProcessEncoder",
+    "OnnxEncoder",
+    "PaddingReport",
+    "export_onnx",
+    "length_batches",
+]
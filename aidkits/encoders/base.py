@@ -0,0 +1,24 @@
+import typing
+
+import numpy as np
+
+
+class Encoder(typing.Protocol):
+    """The part of the ``SentenceTransformer`` interface the retrievers use.
+
+    ``SentenceTransformer`` satisfies it as is, so any backend implementing
+    these two methods can be passed wherever an encoder is expected.
+    """
+
+    def encode(
+        self,
+        sentences: typing.Union[str, typing.List[str]],
+        batch_size: int = 32,
+        prompt_name: typing.Optional[str] = None,
+        show_progress_bar: typing.Optional[bool] = None,
+        **kwargs: typing.Any,
+    ) -> np.ndarray:
+        raise NotImplementedError
+
+    def get_sentence_embedding_dimension(self) -> typing.Optional[int]:
+        raise NotImplementedError
@@ -0,0 +1,169 @@
+import argparse
+import time
+from functools import partial
+from typing import Any, List, Mapping, Optional, Sequence
+
+import numpy as np
+from pydantic import BaseModel
+
+from aidkits.storage.batching import read_jsonl
+
+
+class EncoderBenchmark(BaseModel):
+    name: str
+    texts: int
+    seconds: float
+    texts_per_second: float
+    mean_cosine: float
+    min_cosine: float
+
+
+def _timed_encode(
+    encoder: Any, texts: List[str], batch_size: int, prompt_name: Optional[str]
+) -> tuple:
+    start = time.perf_counter()
+    embeddings = np.asarray(
+        encoder.encode(
+            texts,
+            batch_size=batch_size,
+            prompt_name=prompt_name,
+            show_progress_bar=False,
+        ),
+        dtype=np.float32,
+    )
+    return embeddings, time.perf_counter() - start
+
+
+def _normalized(embeddings: np.ndarray) -> np.ndarray:
+    return embeddings / np.clip(
+        np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None
+    )
+
+
+def benchmark_encoders(
+    reference: Any,
+    candidates: Mapping[str, Any],
+    texts: Sequence[str],
+    batch_size: int = 32,
+    prompt_name: Optional[str] = None,
+    warmup: int = 8,
+) -> List[EncoderBenchmark]:
+    """Measure throughput and embedding drift of encoders against a reference.
+
+    Args:
+        reference: The reference encoder, usually the ``SentenceTransformer``
+        candidates: The encoders to compare, by name
+        texts: The texts to encode
+        batch_size: The batch size for encoding
+        prompt_name: The prompt to encode with
+        warmup: The number of texts encoded once before timing
+
+    Returns:
+        The reference first, then every candidate. Drift is the cosine
+        similarity of each embedding to the reference embedding of the text
+    """
+    texts = list(texts)
+    results = []
+    reference_embeddings: Optional[np.ndarray] = None
+    for name, encoder in [("reference", reference), *candidates.items()]:
+        if warmup:
+            encoder.encode(
+                texts[:warmup],
+                batch_size=batch_size,
+                prompt_name=prompt_name,
+                show_progress_bar=False,
+            )
+        embeddings, seconds = _timed_encode(encoder, texts, batch_size, prompt_name)
+        embeddings = _normalized(embeddings)
+        if reference_embeddings is None:
+            reference_embeddings = embeddings
+        cosines = np.sum(embeddings * reference_embeddings, axis=1)
+        results.append(
+            EncoderBenchmark(
+                name=name,
+                texts=len(texts),
+                seconds=seconds,
+                texts_per_second=len(texts) / seconds if seconds else float("inf"),
+                mean_cosine=float(cosines.mean()) if len(texts) else 1.0,
+                min_cosine=float(cosines.min()) if len(texts) else 1.0,
+            )
+        )
+    return results
+
+
+def main():
+    """Compare a SentenceTransformer with its ONNX export and a process pool."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark encoder throughput and embedding drift against a SentenceTransformer.",
+    )
+    parser.add_argument(
+        "model", type=str, help="SentenceTransformer model name or path."
+    )
+    parser.add_argument("texts", type=str, help="JSONL file with one chunk per line.")
+    parser.add_argument(
+        "--field",
+        type=str,
+        default="content",
+        help="Field holding the text (default: content).",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=1000,
+        help="Number of texts to encode (default: 1000).",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=32, help="Batch size (default: 32)."
+    )
+    parser.add_argument(
+        "--onnx-dir", type=str, default=None, help="Directory written by export_onnx."
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=0,
+        help="Also benchmark a pool of this many processes.",
+    )
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+
+    from aidkits.encoders.onnx_encoder import OnnxEncoder
+    from aidkits.encoders.pool_encoder import MultiProcessEncoder
+
+    texts = [
+        row[args.field] for _, row in zip(range(args.limit), read_jsonl(args.texts))
+    ]
+    reference = SentenceTransformer(args.model, device="cpu")
+
+    candidates = {}
+    if args.onnx_dir:
+        candidates["onnx"] = OnnxEncoder.from_pretrained(args.onnx_dir)
+        candidates["onnx-int8"] = OnnxEncoder.from_pretrained(
+            args.onnx_dir, quantized=True
+        )
+    pool = None
+    if args.processes:
+        pool = MultiProcessEncoder(
+            partial(SentenceTransformer, args.model, device="cpu"), args.processes
+        )
+        candidates[f"pool-{args.processes}"] = pool
+
+    try:
+        results = benchmark_encoders(
+            reference, candidates, texts, batch_size=args.batch_size
+        )
+    finally:
+        if pool is not None:
+            pool.close()
+
+    print(f"{'encoder':<12} {'texts/s':>10} {'mean cos':>10} {'min cos':>10}")
+    for result in results:
+        print(
+            f"{result.name:<12} {result.texts_per_second:>10.1f} {result.mean_cosine:>10.5f} {result.min_cosine:>10.5f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
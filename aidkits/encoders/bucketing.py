@@ -0,0 +1,220 @@
+import logging
+from typing import Any, Callable, List, Optional, Sequence, Union
+
+import numpy as np
+from pydantic import BaseModel
+
+from aidkits.storage.batching import batched
+
+logger = logging.getLogger(__name__)
+
+# Counts the tokens of each text, including special tokens and truncation
+TokenCounter = Callable[[List[str]], List[int]]
+
+# Rough fallback when the encoder exposes no tokenizer
+_CHARS_PER_TOKEN = 4
+
+
+class PaddingReport(BaseModel):
+    """Token accounting of the batches sent to an encoder.
+
+    ``padded_tokens`` counts every position a batch is padded to, i.e. the
+    batch size times its longest text. ``*_before`` describes fixed-size
+    batches in input order, ``*_after`` the length-bucketed batches.
+    """
+
+    texts: int = 0
+    tokens: int = 0
+    batches_before: int = 0
+    batches_after: int = 0
+    padded_tokens_before: int = 0
+    padded_tokens_after: int = 0
+
+    @property
+    def waste_before(self) -> float:
+        return _waste(self.tokens, self.padded_tokens_before)
+
+    @property
+    def waste_after(self) -> float:
+        return _waste(self.tokens, self.padded_tokens_after)
+
+    def merge(self, other: "PaddingReport") -> None:
+        self.texts += other.texts
+        self.tokens += other.tokens
+        self.batches_before += other.batches_before
+        self.batches_after += other.batches_after
+        self.padded_tokens_before += other.padded_tokens_before
+        self.padded_tokens_after += other.padded_tokens_after
+
+
+def _waste(tokens: int, padded_tokens: int) -> float:
+    return 1.0 - tokens / padded_tokens if padded_tokens else 0.0
+
+
+def _padded_tokens(lengths: Sequence[int], batches: Sequence[Sequence[int]]) -> int:
+    return sum(
+        len(batch) * max(lengths[i] for i in batch) for batch in batches if batch
+    )
+
+
+def token_counter(encoder: Any) -> TokenCounter:
+    """Return a token counter for the encoder's own tokenizer.
+
+    Uses ``encoder.count_tokens`` (e.g. :class:`OnnxEncoder`), then the
+    Hugging Face ``encoder.tokenizer`` of a ``SentenceTransformer``, and
+    falls back to an estimate of four characters per token.
+    """
+    if hasattr(encoder, "count_tokens"):
+        return encoder.count_tokens
+
+    tokenizer = getattr(encoder, "tokenizer", None)
+    if tokenizer is not None and callable(tokenizer):
+        max_length = getattr(encoder, "max_seq_length", None)
+
+        def count(texts: List[str]) -> List[int]:
+            input_ids = tokenizer(
+                texts,
+                truncation=max_length is not None,
+                max_length=max_length,
+            )["input_ids"]
+            return [len(ids) for ids in input_ids]
+
+        return count
+
+    return lambda texts: [len(text) // _CHARS_PER_TOKEN + 1 for text in texts]
+
+
+def length_batches(
+    lengths: Sequence[int],
+    max_tokens: int,
+    max_batch_size: Optional[int] = None,
+) -> List[List[int]]:
+    """Group positions into batches whose padded size stays under a token budget.
+
+    Positions are sorted by length, longest first, and each batch grows while
+    ``batch size * longest length`` fits in ``max_tokens``. A text longer
+    than the budget gets a batch of its own.
+
+    Args:
+        lengths: The token length of every text
+        max_tokens: The padded tokens a batch may hold
+        max_batch_size: An optional cap on the number of texts per batch
+
+    Returns:
+        Batches of positions into ``lengths``
+    """
+    if max_tokens < 1:
+        raise ValueError("max_tokens must be at least 1")
+
+    batches: List[List[int]] = []
+    batch: List[int] = []
+    for position in sorted(range(len(lengths)), key=lambda i: -lengths[i]):
+        # Sorted longest first, so the first text of a batch sets its padded length
+        full = max_batch_size is not None and len(batch) >= max_batch_size
+        if batch and (full or (len(batch) + 1) * lengths[batch[0]] > max_tokens):
+            batches.append(batch)
+            batch = []
+        batch.append(position)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class LengthBucketedEncoder:
+    """Wraps an encoder so that lists of texts are encoded in length buckets.
+
+    A fixed ``batch_size`` pads every batch to its longest text, so one long
+    chunk makes the whole batch expensive. This encoder counts tokens, sorts
+    the texts by length, forms batches under a token budget and restores the
+    input order of the embeddings. Single strings (questions) are passed
+    through unchanged.
+
+    :attr:`report` accumulates the padding waste of every call compared with
+    fixed ``batch_size`` batches in input order.
+    """
+
+    def __init__(
+        self,
+        encoder: Any,
+        max_tokens: int = 16384,
+        max_batch_size: Optional[int] = None,
+        counter: Optional[TokenCounter] = None,
+    ) -> None:
+        """
+        Args:
+            encoder: The wrapped encoder
+            max_tokens: The padded tokens a batch may hold
+            max_batch_size: An optional cap on the number of texts per batch
+            counter: Counts tokens, defaults to :func:`token_counter`
+        """
+        self.encoder = encoder
+        self.max_tokens = max_tokens
+        self.max_batch_size = max_batch_size
+        self._counter = counter or token_counter(encoder)
+        self.report = PaddingReport()
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 32,
+        prompt_name: Optional[str] = None,
+        show_progress_bar: Optional[bool] = None,
+        **kwargs: Any,
+    ) -> np.ndarray:
+        """Encode the sentences in length buckets and return them in input order."""
+        if isinstance(sentences, str):
+            return self.encoder.encode(
+                sentences,
+                batch_size=batch_size,
+                prompt_name=prompt_name,
+                show_progress_bar=show_progress_bar,
+                **kwargs,
+            )
+
+        texts = list(sentences)
+        if not texts:
+            return np.empty(
+                (0, self.get_sentence_embedding_dimension()), dtype=np.float32
+            )
+
+        lengths = self._counter(texts)
+        buckets = length_batches(lengths, self.max_tokens, self.max_batch_size)
+        fixed = list(batched(range(len(texts)), batch_size))
+
+        embeddings: Optional[np.ndarray] = None
+        for bucket in buckets:
+            encoded = np.asarray(
+                self.encoder.encode(
+                    [texts[i] for i in bucket],
+                    batch_size=len(bucket),
+                    prompt_name=prompt_name,
+                    show_progress_bar=False,
+                    **kwargs,
+                )
+            )
+            if embeddings is None:
+                embeddings = np.empty(
+                    (len(texts),) + encoded.shape[1:], dtype=encoded.dtype
+                )
+            embeddings[bucket] = encoded
+
+        report = PaddingReport(
+            texts=len(texts),
+            tokens=sum(lengths),
+            batches_before=len(fixed),
+            batches_after=len(buckets),
+            padded_tokens_before=_padded_tokens(lengths, fixed),
+            padded_tokens_after=_padded_tokens(lengths, buckets),
+        )
+        logger.debug(
+            "Encoded %d texts in %d batches, padding waste %.1f%% -> %.1f%%",
+            report.texts,
+            report.batches_after,
+            100 * report.waste_before,
+            100 * report.waste_after,
+        )
+        self.report.merge(report)
+        return embeddings
+
+    def get_sentence_embedding_dimension(self) -> Optional[int]:
+        return self.encoder.get_sentence_embedding_dimension()
@@ -0,0 +1,243 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+from aidkits.storage.batching import batched
+
+CONFIG_NAME = "aidkits_onnx.json"
+MODEL_NAME = "model.onnx"
+QUANTIZED_MODEL_NAME = "model_int8.onnx"
+
+
+class OnnxEncoder:
+    """A CPU encoder running a transformer exported to ONNX with ONNX Runtime.
+
+    Use :func:`export_onnx` to export a ``SentenceTransformer`` together with
+    its tokenizer, pooling and prompts, then load it with
+    :meth:`from_pretrained`. Requires ``onnxruntime`` and ``tokenizers``.
+    """
+
+    def __init__(
+        self,
+        model_path: Union[str, Path],
+        tokenizer_path: Union[str, Path],
+        pooling: str = "mean",
+        normalize: bool = True,
+        max_length: int = 512,
+        prompts: Optional[Dict[str, str]] = None,
+        dimension: Optional[int] = None,
+        intra_op_num_threads: Optional[int] = None,
+    ) -> None:
+        """
+        Args:
+            model_path: The ONNX model returning ``last_hidden_state``
+            tokenizer_path: The ``tokenizer.json`` of the model
+            pooling: ``mean``, ``cls`` or ``max`` pooling of the token embeddings
+            normalize: Whether to L2-normalize the embeddings
+            max_length: Inputs are truncated to this many tokens
+            prompts: Prefixes by prompt name, e.g. ``{"search_query": "query: "}``
+            dimension: The embedding dimension, detected when omitted
+            intra_op_num_threads: Threads ONNX Runtime may use per call
+        """
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        if pooling not in ("mean", "cls", "max"):
+            raise ValueError(f"Unsupported pooling: {pooling}")
+
+        options = onnxruntime.SessionOptions()
+        if intra_op_num_threads is not None:
+            options.intra_op_num_threads = intra_op_num_threads
+        self._session = onnxruntime.InferenceSession(
+            str(model_path),
+            options,
+            providers=["CPUExecutionProvider"],
+        )
+        self._input_names = {
+            model_input.name for model_input in self._session.get_inputs()
+        }
+
+        self._tokenizer = Tokenizer.from_file(str(tokenizer_path))
+        self._tokenizer.enable_truncation(max_length)
+        self._tokenizer.enable_padding()
+
+        self.pooling = pooling
+        self.normalize = normalize
+        self.prompts = prompts or {}
+        self._dimension = dimension
+
+    @classmethod
+    def from_pretrained(
+        cls,
+        directory: Union[str, Path],
+        quantized: bool = False,
+        intra_op_num_threads: Optional[int] = None,
+    ) -> "OnnxEncoder":
+        """Load a model written by :func:`export_onnx`.
+
+        Args:
+            directory: The export directory
+            quantized: Load the int8 model instead of the float32 one
+            intra_op_num_threads: Threads ONNX Runtime may use per call
+        """
+        directory = Path(directory)
+        config = json.loads((directory / CONFIG_NAME).read_text(encoding="utf-8"))
+        return cls(
+            model_path=directory / (QUANTIZED_MODEL_NAME if quantized else MODEL_NAME),
+            tokenizer_path=directory / "tokenizer.json",
+            intra_op_num_threads=intra_op_num_threads,
+            **config,
+        )
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 32,
+        prompt_name: Optional[str] = None,
+        show_progress_bar: Optional[bool] = None,
+        **kwargs: Any,
+    ) -> np.ndarray:
+        """Encode one sentence into a vector or a list of sentences into a matrix."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        prefix = self.prompts.get(prompt_name, "") if prompt_name else ""
+
+        embeddings = [
+            self._encode_batch([prefix + text for text in batch])
+            for batch in batched(texts, batch_size)
+        ]
+        if not embeddings:
+            return np.empty(
+                (0, self.get_sentence_embedding_dimension()), dtype=np.float32
+            )
+        result = np.concatenate(embeddings)
+        return result[0] if single else result
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self._tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.array(
+                [encoding.ids for encoding in encodings], dtype=np.int64
+            ),
+            "attention_mask": np.array(
+                [encoding.attention_mask for encoding in encodings], dtype=np.int64
+            ),
+        }
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.array(
+                [encoding.type_ids for encoding in encodings], dtype=np.int64
+            )
+
+        hidden = self._session.run(None, feeds)[0].astype(np.float32)
+        mask = feeds["attention_mask"][..., None].astype(np.float32)
+        if self.pooling == "cls":
+            pooled = hidden[:, 0]
+        elif self.pooling == "max":
+            pooled = np.where(mask > 0, hidden, -np.inf).max(axis=1)
+        else:
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        if self.normalize:
+            pooled = pooled / np.clip(
+                np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None
+            )
+        return pooled
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """Return the number of tokens of each text after truncation."""
+        return [
+            sum(encoding.attention_mask)
+            for encoding in self._tokenizer.encode_batch(texts)
+        ]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        if self._dimension is None:
+            self._dimension = int(self._encode_batch([""]).shape[1])
+        return self._dimension
+
+
+def export_onnx(
+    model: Any,
+    output_dir: Union[str, Path],
+    quantize: bool = True,
+    opset_version: int = 17,
+) -> Path:
+    """Export a ``SentenceTransformer`` for :class:`OnnxEncoder`.
+
+    Writes the transformer as ``model.onnx``, the tokenizer, the pooling and
+    prompt settings and, with ``quantize``, a dynamically int8-quantized
+    ``model_int8.onnx``. Requires ``torch``, ``onnx`` and ``onnxruntime``.
+
+    Args:
+        model: The ``SentenceTransformer`` to export
+        output_dir: The directory to write to
+        quantize: Whether to also write the int8 model
+        opset_version: The ONNX opset to export with
+
+    Returns:
+        The output directory
+    """
+    import torch
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    transformer = model[0]
+    tokenizer = transformer.tokenizer
+    sample = tokenizer(["An example sentence"], return_tensors="pt")
+    input_names = [
+        name
+        for name in ("input_ids", "attention_mask", "token_type_ids")
+        if name in sample
+    ]
+
+    class _LastHiddenState(torch.nn.Module):
+        def __init__(self, auto_model: Any) -> None:
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, *inputs: Any) -> Any:
+            return self.auto_model(**dict(zip(input_names, inputs)))[0]
+
+    torch.onnx.export(
+        _LastHiddenState(transformer.auto_model).eval(),
+        tuple(sample[name] for name in input_names),
+        str(output_dir / MODEL_NAME),
+        input_names=input_names,
+        output_names=["last_hidden_state"],
+        dynamic_axes={
+            name: {0: "batch", 1: "sequence"}
+            for name in input_names + ["last_hidden_state"]
+        },
+        opset_version=opset_version,
+    )
+    tokenizer.save_pretrained(str(output_dir))
+
+    pooling = "mean"
+    for module in model:
+        if hasattr(module, "get_pooling_mode_str"):
+            pooling = {"cls": "cls", "max": "max"}.get(
+                module.get_pooling_mode_str(), "mean"
+            )
+    config = {
+        "pooling": pooling,
+        "normalize": any(type(module).__name__ == "Normalize" for module in model),
+        "max_length": model.max_seq_length,
+        "prompts": getattr(model, "prompts", {}),
+        "dimension": model.get_sentence_embedding_dimension(),
+    }
+    (output_dir / CONFIG_NAME).write_text(
+        json.dumps(config, indent=4), encoding="utf-8"
+    )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(
+            str(output_dir / MODEL_NAME),
+            str(output_dir / QUANTIZED_MODEL_NAME),
+            weight_type=QuantType.QInt8,
+        )
+    return output_dir
@@ -0,0 +1,116 @@
+import multiprocessing
+import os
+from typing import Any, Callable, List, Optional, Union
+
+import numpy as np
+
+from aidkits.storage.batching import batched
+
+# The encoder of the current worker process
+_worker_encoder: Any = None
+
+
+def _init_worker(factory: Callable[[], Any], threads: int) -> None:
+    # Must run before the factory imports torch or onnxruntime
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[variable] = str(threads)
+    global _worker_encoder
+    _worker_encoder = factory()
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def _encode_chunk(arguments: tuple) -> np.ndarray:
+    sentences, batch_size, prompt_name = arguments
+    return np.asarray(
+        _worker_encoder.encode(
+            sentences,
+            batch_size=batch_size,
+            prompt_name=prompt_name,
+            show_progress_bar=False,
+        ),
+        dtype=np.float32,
+    )
+
+
+def _dimension(_: Any) -> int:
+    return _worker_encoder.get_sentence_embedding_dimension()
+
+
+class MultiProcessEncoder:
+    """Spreads encoding over a pool of CPU worker processes.
+
+    Every worker builds its own encoder by calling ``factory``, which must be
+    picklable, e.g. ``functools.partial(SentenceTransformer, "model-name",
+    device="cpu")`` or ``functools.partial(OnnxEncoder.from_pretrained, path)``.
+    Each worker is limited to ``threads_per_process`` threads, so
+    ``processes * threads_per_process`` should not exceed the number of cores.
+    Meant for bulk uploads: sending single questions to a worker only adds
+    inter-process overhead.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        processes: Optional[int] = None,
+        threads_per_process: int = 1,
+        chunk_size: int = 256,
+    ) -> None:
+        """
+        Args:
+            factory: Builds the encoder inside each worker
+            processes: The number of workers, defaults to the number of cores
+            threads_per_process: Intra-op threads of each worker
+            chunk_size: Sentences sent to a worker at a time
+        """
+        self.processes = processes or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._pool = multiprocessing.get_context("spawn").Pool(
+            self.processes,
+            initializer=_init_worker,
+            initargs=(factory, threads_per_process),
+        )
+        self._dimension: Optional[int] = None
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 32,
+        prompt_name: Optional[str] = None,
+        show_progress_bar: Optional[bool] = None,
+        **kwargs: Any,
+    ) -> np.ndarray:
+        """Encode sentences on the workers and return them in input order."""
+        if isinstance(sentences, str):
+            return self._pool.apply(
+                _encode_chunk, (([sentences], batch_size, prompt_name),)
+            )[0]
+
+        chunks = [
+            (chunk, batch_size, prompt_name)
+            for chunk in batched(sentences, self.chunk_size)
+        ]
+        if not chunks:
+            return np.empty(
+                (0, self.get_sentence_embedding_dimension()), dtype=np.float32
+            )
+        return np.concatenate(self._pool.map(_encode_chunk, chunks, chunksize=1))
+
+    def get_sentence_embedding_dimension(self) -> int:
+        if self._dimension is None:
+            self._dimension = self._pool.apply(_dimension, (None,))
+        return self._dimension
+
+    def close(self) -> None:
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self) -> "MultiProcessEncoder":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
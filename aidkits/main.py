@@ -2,7 +2,7 @@ import argparse
 from pathlib import Path
 
 from aidkits.parse import MarkdownCrawler
-from aidkits.storage import MdLocation
+from aidkits.sources import MdLocation
 from aidkits.json_splitter import JsonSplitter
 
 
@@ -1,6 +1,7 @@
-from typing import List
+import mmap
+from typing import Annotated, Any, List, Optional, Union
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class CodeChunk(BaseModel):
@@ -9,6 +10,10 @@ class CodeChunk(BaseModel):
     length: int
     chunk_num: int
     chunk_amount: int
+    # Tokens of ``content``, counted when the chunk is crawled or uploaded
+    tokens: Optional[int] = None
+    # The file path relative to the crawled directory; titles are only file names
+    path: Optional[str] = None
 
     @property
     def markdown(self) -> str:
@@ -18,14 +23,84 @@ class CodeChunk(BaseModel):
         return text
 
 
+class ChunkLocation(BaseModel):
+    """Where a chunk lives in its markdown file.
+
+    Attributes:
+        path: The file path
+        offset: The byte offset of the chunk in the file
+        size: The byte size of the chunk
+        start_line: The first line of the chunk, 1-based
+        end_line: The last line of the chunk, inclusive
+        header_path: The titles of the enclosing headers, outermost first,
+            ending with the header that opens the chunk
+        digest: SHA-256 of the chunk bytes, to deduplicate and diff chunks
+            without their content
+    """
+
+    path: str
+    offset: int
+    size: int
+    start_line: int
+    end_line: int
+    header_path: List[str] = Field(default_factory=list)
+    digest: Optional[str] = None
+
+    def read(self) -> str:
+        """Read the chunk from a memory map of the file, with newlines normalized like text mode."""
+        if not self.size:
+            return ""
+        with open(self.path, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                data = mapped[self.offset : self.offset + self.size]
+        return data.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+
+
+class LazyCodeChunk(CodeChunk):
+    """A chunk that reads its content from its file on every access instead of holding it.
+
+    Only the location is kept in memory, so a crawl can be planned,
+    deduplicated (``location.digest``) and diffed without the text of every
+    document. Serializing a lazy chunk writes the location, not the content;
+    :meth:`load` returns a regular chunk. The file must not change while the
+    chunk is in use.
+    """
+
+    content: Optional[str] = None  # type: ignore[assignment]
+    location: ChunkLocation
+
+    def __getattribute__(self, name: str) -> Any:
+        if name == "content":
+            content = object.__getattribute__(self, "__dict__").get("content")
+            if content is None:
+                return object.__getattribute__(self, "location").read()
+            return content
+        return object.__getattribute__(self, name)
+
+    def load(self) -> CodeChunk:
+        return CodeChunk(
+            **self.model_dump(exclude={"location", "content"}), content=self.content
+        )
+
+
 class LibrarySource(BaseModel):
     title: str
-    chunks: List[CodeChunk]
+    # Regular chunks are tried first; lazy ones keep their type and serialize as locations
+    chunks: List[
+        Annotated[Union[CodeChunk, LazyCodeChunk], Field(union_mode="left_to_right")]
+    ]
 
     def save_json(self, path: str) -> None:
         with open(path, "w", encoding="utf-8") as file:
             file.write(self.model_dump_json(indent=4))
 
+    def save_jsonl(self, path: str) -> None:
+        """Write the chunks one per line, for lazy reading with ``read_jsonl``."""
+        with open(path, "w", encoding="utf-8") as file:
+            for chunk in self.chunks:
+                file.write(chunk.model_dump_json())
+                file.write("\n")
+
     @classmethod
     def from_json(cls, path: str) -> "LibrarySource":
         with open(path, encoding="utf-8") as file:
@@ -1,11 +1,14 @@
+import hashlib
 import json
 import logging
 import os
 import re
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import Iterator, List, Optional, Tuple, Union
 
-from aidkits.models import CodeChunk, LibrarySource
+from aidkits import tracing
+from aidkits.context import TokenCounter, estimate_tokens
+from aidkits.models import ChunkLocation, CodeChunk, LazyCodeChunk, LibrarySource
 
 
 class MarkdownCrawler:
@@ -14,10 +17,18 @@ class MarkdownCrawler:
         repo_url: str,
         output_path: str = "output.json",
         path_prefix: str = None,
+        token_counter: TokenCounter = estimate_tokens,
+        lazy: bool = False,
     ):
+        """
+        :param lazy: Produce LazyCodeChunk objects that keep the location of
+            their text in the file and read it on access, instead of the text
+        """
         self.repo_url = repo_url
         self.output_path = output_path
         self.path_prefix = path_prefix
+        self.token_counter = token_counter
+        self.lazy = lazy
 
     def _is_inside_code_blocks(self, index, code_blocks) -> bool:
         """Checks if the index is inside a code block."""
@@ -30,6 +41,20 @@ class MarkdownCrawler:
         """Splits the Markdown document text by headers (the `#` symbol),
         excluding headers that are inside code blocks (` or `````).
         """
+        return [
+            markdown_text[start:end]
+            for start, end, _ in self.split_markdown_spans(markdown_text)
+        ]
+
+    def split_markdown_spans(
+        self, markdown_text
+    ) -> List[Tuple[int, int, Optional[Tuple[int, str]]]]:
+        """Locates the chunks of split_markdown_by_headers in the text without copying them.
+
+        :param markdown_text: The Markdown document text
+        :return: (start, end, header) per chunk, where header is the (level, title)
+            of the header opening the chunk, or None before the first header
+        """
         code_block_pattern = re.compile(
             r"(```.*?```|`.*?`)", re.DOTALL
         )  # Ищет блоки кода (одинарные/тройные)
@@ -54,20 +79,39 @@ class MarkdownCrawler:
         ]
 
         if not headers:
-            return [markdown_text]
+            return [(0, len(markdown_text), None)]
 
-        chunks = []
+        spans = []
         last_index = 0
+        last_header = None
 
         for start, header_level, header_text in headers:
             if start > last_index:
-                chunks.append(markdown_text[last_index:start].strip())
+                spans.append(
+                    (*self._strip_span(markdown_text, last_index, start), last_header)
+                )
             last_index = start
+            last_header = (len(header_level), header_text.strip())
 
         if last_index < len(markdown_text):
-            chunks.append(markdown_text[last_index:].strip())
+            spans.append(
+                (
+                    *self._strip_span(markdown_text, last_index, len(markdown_text)),
+                    last_header,
+                )
+            )
+
+        return spans
 
-        return chunks
+    @staticmethod
+    def _strip_span(text: str, start: int, end: int) -> Tuple[int, int]:
+        """Narrows text[start:end] to the span of its strip()."""
+        segment = text[start:end]
+        stripped = segment.lstrip()
+        if not stripped:
+            return start, start
+        start += len(segment) - len(stripped)
+        return start, start + len(stripped.rstrip())
 
     def collect_markdown_files(self, directory: str) -> List[LibrarySource]:
         """Iterates over the given directory and its subdirectories, collects markdown files,
@@ -76,36 +120,118 @@ class MarkdownCrawler:
         :param directory: Path to the root directory
         :return: A list of LibrarySource objects
         """
-        library_sources = []
+        return list(self.iter_markdown_files(directory))
+
+    def iter_markdown_files(self, directory: str) -> Iterator[LibrarySource]:
+        """Lazily yields the LibrarySource of every markdown file under the directory,
+        one file at a time, so consumers can start before the crawl is over.
+
+        :param directory: Path to the root directory
+        :return: An iterator over LibrarySource objects
+        """
         for root, _, files in os.walk(directory):
             for file in files:
                 if file.endswith(".md"):
-                    file_path = os.path.join(root, file)
-                    with open(file_path, encoding="utf-8") as f:
-                        content = f.read()
-                    chunks = self.split_markdown_by_headers(content)
-                    chunk_amount = len(chunks)
-                    code_chunks = [
-                        CodeChunk(
-                            title=f"{file}",
-                            content=chunk_content,
-                            length=len(chunk_content),
-                            chunk_num=chunk_num + 1,
-                            chunk_amount=chunk_amount,
-                        )
-                        for chunk_num, chunk_content in enumerate(chunks)
-                    ]
-                    library_sources.append(
-                        LibrarySource(title=file, chunks=code_chunks),
-                    )
+                    yield self.read_markdown_file(os.path.join(root, file), directory)
 
-        return library_sources
+    def read_markdown_file(
+        self, file_path: str, root: Optional[str] = None
+    ) -> LibrarySource:
+        """Reads one markdown file and splits it by headers.
+
+        :param file_path: Path to the markdown file
+        :param root: The crawled directory; chunks then carry their path relative to it,
+            which tells apart files with the same name
+        :return: The LibrarySource of the file, titled with its name
+        """
+        file = os.path.basename(file_path)
+        path = (
+            Path(os.path.relpath(file_path, root)).as_posix()
+            if root is not None
+            else None
+        )
+        if self.lazy:
+            return self._read_lazy(file_path, path)
+        with tracing.span("crawl.file") as span:
+            with open(file_path, encoding="utf-8") as f:
+                content = f.read()
+            chunks = self.split_markdown_by_headers(content)
+            span.set(characters=len(content), chunks=len(chunks))
+        chunk_amount = len(chunks)
+        code_chunks = [
+            CodeChunk(
+                title=f"{file}",
+                content=chunk_content,
+                length=len(chunk_content),
+                chunk_num=chunk_num + 1,
+                chunk_amount=chunk_amount,
+                tokens=self.token_counter(chunk_content),
+                path=path,
+            )
+            for chunk_num, chunk_content in enumerate(chunks)
+        ]
+        return LibrarySource(title=file, chunks=code_chunks)
+
+    def _read_lazy(self, file_path: str, path: Optional[str] = None) -> LibrarySource:
+        """Splits a file into LazyCodeChunk objects, keeping no text once it returns.
+
+        The file is decoded without newline translation, so character positions
+        map to byte offsets; the chunks normalize newlines when they are read.
+        """
+        file = os.path.basename(file_path)
+        with tracing.span("crawl.file") as span:
+            with open(file_path, "rb") as f:
+                data = f.read()
+            text = data.decode("utf-8")
+            spans = self.split_markdown_spans(text)
+            span.set(characters=len(text), chunks=len(spans))
+
+        code_chunks = []
+        headers: List[Tuple[int, str]] = []
+        position = offset = 0
+        line = 1
+        for chunk_num, (start, end, header) in enumerate(spans):
+            # Advance the byte offset and the line number incrementally to the chunk
+            offset += len(text[position:start].encode("utf-8"))
+            line += text.count("\n", position, start)
+            raw = text[start:end].encode("utf-8")
+            position = end
+
+            if header is not None:
+                while headers and headers[-1][0] >= header[0]:
+                    headers.pop()
+                headers.append(header)
+            content = raw.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+            location = ChunkLocation(
+                path=file_path,
+                offset=offset,
+                size=len(raw),
+                start_line=line,
+                end_line=line + text.count("\n", start, end),
+                header_path=[title for _, title in headers],
+                digest=hashlib.sha256(raw).hexdigest(),
+            )
+            code_chunks.append(
+                LazyCodeChunk(
+                    title=file,
+                    length=len(content),
+                    chunk_num=chunk_num + 1,
+                    chunk_amount=len(spans),
+                    tokens=self.token_counter(content),
+                    path=path,
+                    location=location,
+                )
+            )
+            offset += len(raw)
+            line = location.end_line
+        return LibrarySource(title=file, chunks=code_chunks)
 
     def work(self) -> Optional[list[LibrarySource]]:
         directory_path = Path(self.repo_url).joinpath(Path(self.path_prefix))
         logging.info("Collecting markdown files...{}".format(directory_path))
 
-        library_sources = self.collect_markdown_files(directory_path)
+        with tracing.span("crawl.collect", directory=str(directory_path)):
+            library_sources = self.collect_markdown_files(directory_path)
         if library_sources:
             # Save to JSON file
             with open(self.output_path, "w", encoding="utf-8") as f:
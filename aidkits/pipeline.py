@@ -0,0 +1,117 @@
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Iterator, Optional, Union
+
+from pydantic import BaseModel, Field
+
+from aidkits import tracing
+from aidkits.models import CodeChunk
+from aidkits.parse import MarkdownCrawler
+from aidkits.sources import MdLocation
+from aidkits.storage.batching import prefetch
+from aidkits.storage.bulk import BulkReport
+
+logger = logging.getLogger(__name__)
+
+
+class IngestReport(BaseModel):
+    """The outcome of one :func:`ingest` run.
+
+    Attributes:
+        files: The crawled markdown files
+        chunks: The chunks streamed to the retriever
+        seconds: Wall time of the run
+        bulk: Indexed, skipped, deleted and failed documents
+    """
+
+    files: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+    bulk: BulkReport = Field(default_factory=BulkReport)
+
+
+def ingest(
+    source: str,
+    retriever: Any,
+    collection_name: str,
+    path_prefix: str = "",
+    batch_size: int = 100,
+    window_size: int = 1000,
+    queue_size: int = 1000,
+    delete_stale: bool = True,
+    chunks_path: Optional[Union[str, Path]] = None,
+    crawler: Optional[MarkdownCrawler] = None,
+) -> IngestReport:
+    """Stream a source into a collection: crawl, encode and bulk-index in overlapping stages.
+
+    The crawler runs in a background thread and hands chunks over through a
+    queue of ``queue_size``; the retriever encodes them window by window in a
+    second thread while the calling thread serializes bulk requests for its
+    workers. Every queue is bounded, so a slow stage holds the others back
+    instead of buffering the whole corpus, and no intermediate file is needed.
+
+    Args:
+        source: A git URL or a local directory, as accepted by ``MdLocation``
+        retriever: An ``OpenSearchRetriever`` or ``NumpyRetriever``
+        collection_name: The collection to index into
+        path_prefix: Only crawl this subdirectory of the source
+        batch_size: The batch size for encoding
+        window_size: The chunks encoded at once
+        queue_size: The chunks buffered between crawling and encoding
+        delete_stale: Delete indexed chunks that are no longer in the source
+        chunks_path: Also write the chunks to this JSONL file as they stream,
+            readable with ``read_jsonl(path, model=CodeChunk)``
+        crawler: The crawler splitting the files, a default one if omitted
+
+    Returns:
+        The number of files and chunks and the bulk report
+    """
+    report = IngestReport()
+    start = time.perf_counter()
+    with tracing.span("ingest.fetch", source=source):
+        directory = MdLocation(source).define().fetch()
+    crawler = crawler or MarkdownCrawler(directory, path_prefix=path_prefix)
+
+    def chunks() -> Iterator[CodeChunk]:
+        file = (
+            open(chunks_path, "w", encoding="utf-8")
+            if chunks_path is not None
+            else None
+        )
+        try:
+            for library in crawler.iter_markdown_files(
+                os.path.join(directory, path_prefix or "")
+            ):
+                report.files += 1
+                for chunk in library.chunks:
+                    report.chunks += 1
+                    if file is not None:
+                        file.write(chunk.model_dump_json())
+                        file.write("\n")
+                    yield chunk
+        finally:
+            if file is not None:
+                file.close()
+
+    report.bulk = retriever.upload_library(
+        prefetch(chunks(), queue_size),
+        batch_size,
+        collection_name=collection_name,
+        window_size=window_size,
+        delete_stale=delete_stale,
+    )
+    report.seconds = time.perf_counter() - start
+    logger.info(
+        "Ingested %d files (%d chunks) into %s in %.1fs: %d indexed, %d skipped, %d deleted, %d failed",
+        report.files,
+        report.chunks,
+        collection_name,
+        report.seconds,
+        report.bulk.succeeded,
+        report.bulk.skipped,
+        report.bulk.deleted,
+        len(report.bulk.failed),
+    )
+    return report
@@ -0,0 +1,313 @@
+import cProfile
+import gc
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from aidkits import tracing
+from aidkits.encoders import Encoder
+from aidkits.models import LibrarySource
+from aidkits.parse import MarkdownCrawler
+from aidkits.sources import MdLocation
+from aidkits.storage.ids import chunk_document
+
+logger = logging.getLogger(__name__)
+
+# Frames of the profiler itself, left out of the allocation report
+_IGNORED_FRAMES = (
+    __file__,
+    tracemalloc.__file__,
+    cProfile.__file__,
+    "<frozen importlib._bootstrap>",
+)
+
+
+class Allocation(BaseModel):
+    """Memory still allocated at the end of a stage by one source line.
+
+    Attributes:
+        location: ``file:line`` of the allocating code
+        size: Allocated bytes
+        count: Allocated blocks
+    """
+
+    location: str
+    size: int
+    count: int
+
+
+class StageProfile(BaseModel):
+    """Timing and memory of one ingestion stage.
+
+    Attributes:
+        name: ``fetch``, ``crawl``, ``encode`` or ``index``
+        seconds: Wall time of the stage
+        items: The units processed, in ``unit``
+        unit: What ``items`` counts, e.g. ``files`` or ``chunks``
+        throughput: ``items`` per second
+        peak_rss: The peak resident set size of the process at the end of the
+            stage, in bytes. It never decreases, so a stage that raises it is
+            the one that needed the memory. ``None`` where the platform does
+            not report it
+        peak_traced: The peak of memory allocated by Python during the stage
+        top_allocations: The source lines holding the most memory at the end
+            of the stage
+        profile_path: The cProfile dump of the stage, open it with ``pstats``
+            or ``snakeviz``
+    """
+
+    name: str
+    seconds: float
+    items: int = 0
+    unit: str = "items"
+    throughput: float = 0.0
+    peak_rss: Optional[int] = None
+    peak_traced: Optional[int] = None
+    top_allocations: List[Allocation] = Field(default_factory=list)
+    profile_path: Optional[str] = None
+
+
+class IngestionProfile(BaseModel):
+    source: str
+    collection_name: str
+    files: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+    stages: List[StageProfile] = Field(default_factory=list)
+    spans: Dict[str, Dict[str, float]] = Field(default_factory=dict)
+
+
+def peak_rss() -> Optional[int]:
+    """Return the peak resident set size of the process in bytes, ``None`` if unknown."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def top_allocations(
+    snapshot: tracemalloc.Snapshot, limit: int = 10
+) -> List[Allocation]:
+    snapshot = snapshot.filter_traces(
+        [tracemalloc.Filter(False, pattern) for pattern in _IGNORED_FRAMES]
+    )
+    return [
+        Allocation(
+            location=f"{statistic.traceback[0].filename}:{statistic.traceback[0].lineno}",
+            size=statistic.size,
+            count=statistic.count,
+        )
+        for statistic in snapshot.statistics("lineno")[:limit]
+    ]
+
+
+class StageProfiler:
+    """Measures stages of a run one after another.
+
+    Args:
+        trace_memory: Trace Python allocations with ``tracemalloc``. It slows
+            allocation-heavy code down noticeably, which inflates the timings
+        top: The number of allocating lines reported per stage
+        profile_dir: Write a cProfile dump of every stage to this directory
+    """
+
+    def __init__(
+        self,
+        trace_memory: bool = True,
+        top: int = 10,
+        profile_dir: Optional[Union[str, Path]] = None,
+    ) -> None:
+        self.trace_memory = trace_memory
+        self.top = top
+        self.profile_dir = Path(profile_dir) if profile_dir is not None else None
+        self.stages: List[StageProfile] = []
+
+    @contextmanager
+    def stage(self, name: str, unit: str = "items") -> Iterator[StageProfile]:
+        """Measure the body, which sets ``items`` on the yielded profile."""
+        profile = StageProfile(name=name, seconds=0.0, unit=unit)
+        profiler = cProfile.Profile() if self.profile_dir is not None else None
+        gc.collect()
+        if self.trace_memory:
+            tracemalloc.start()
+        if profiler is not None:
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield profile
+        finally:
+            profile.seconds = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                self.profile_dir.mkdir(parents=True, exist_ok=True)
+                path = self.profile_dir / f"{len(self.stages) + 1:02d}-{name}.prof"
+                profiler.dump_stats(str(path))
+                profile.profile_path = str(path)
+            if self.trace_memory:
+                _, profile.peak_traced = tracemalloc.get_traced_memory()
+                profile.top_allocations = top_allocations(
+                    tracemalloc.take_snapshot(), self.top
+                )
+                tracemalloc.stop()
+            profile.peak_rss = peak_rss()
+            profile.throughput = (
+                profile.items / profile.seconds if profile.seconds else 0.0
+            )
+            self.stages.append(profile)
+
+
+class _PrecomputedEncoder:
+    """Serves the embeddings of the encode stage, so the index stage measures indexing alone."""
+
+    def __init__(self, encoder: Encoder, texts: Sequence[str], embeddings: Any) -> None:
+        self._encoder = encoder
+        self._embeddings = {text: row for text, row in zip(texts, embeddings)}
+        self.misses = 0
+
+    def encode(self, sentences: Union[str, Sequence[str]], **kwargs: Any) -> Any:
+        if isinstance(sentences, str):
+            return self.encode([sentences], **kwargs)[0]
+        missing = [text for text in sentences if text not in self._embeddings]
+        if missing:
+            self.misses += len(missing)
+            self._embeddings.update(
+                zip(missing, self._encoder.encode(sentences=missing, **kwargs))
+            )
+        return np.asarray([self._embeddings[text] for text in sentences])
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._encoder.get_sentence_embedding_dimension()
+
+
+def profile_ingestion(
+    source: str,
+    encoder: Encoder,
+    client: Any,
+    collection_name: str = "aidkits-profile",
+    path_prefix: str = "",
+    batch_size: int = 100,
+    profiler: Optional[StageProfiler] = None,
+) -> IngestionProfile:
+    """Run fetch, crawl, encode and index on a source and measure every stage.
+
+    The encode stage embeds every chunk; the index stage then streams all
+    chunks through one upload with those embeddings, as ``pipeline.ingest``
+    does, so it measures ID hashing, a single existing-ID scan and bulk
+    indexing without the model. Chunks already in the collection are skipped
+    by the upload, as in production.
+
+    cProfile only sees the thread that enabled it: the dump of the index stage
+    misses the work done on the window prefetch and bulk worker threads, whose
+    time shows up as waiting in the calling thread. The stage's wall time and
+    the tracing spans still cover it.
+
+    Args:
+        source: A git URL or a local directory, as accepted by ``MdLocation``
+        encoder: The document encoder
+        client: The OpenSearch client
+        collection_name: The collection to index into, created if missing
+        path_prefix: Only crawl this subdirectory of the source
+        batch_size: The batch size for encoding
+        profiler: Configures memory tracing and cProfile dumps
+
+    Returns:
+        The profile of every stage, with the tracing summary of the run
+    """
+    from aidkits.storage.opensearch_retriever import OpenSearchRetriever
+
+    profiler = profiler or StageProfiler()
+    report = IngestionProfile(source=source, collection_name=collection_name)
+    histogram = tracing.add_sink(tracing.HistogramSink())
+    start = time.perf_counter()
+    try:
+        with profiler.stage("fetch", "sources") as stage:
+            directory = MdLocation(source).define().fetch()
+            stage.items = 1
+
+        with profiler.stage("crawl", "files") as stage:
+            crawler = MarkdownCrawler(directory, path_prefix=path_prefix)
+            libraries: List[LibrarySource] = crawler.collect_markdown_files(
+                os.path.join(directory, path_prefix or "")
+            )
+            stage.items = len(libraries)
+        report.files = len(libraries)
+        report.chunks = sum(len(library.chunks) for library in libraries)
+
+        texts = [
+            chunk_document(library.title, chunk)[2]
+            for library in libraries
+            for chunk in library.chunks
+        ]
+        with profiler.stage("encode", "chunks") as stage:
+            embeddings = encoder.encode(
+                sentences=texts,
+                batch_size=batch_size,
+                prompt_name="search_document",
+                show_progress_bar=False,
+            )
+            stage.items = len(texts)
+
+        precomputed = _PrecomputedEncoder(encoder, texts, embeddings)
+        retriever = OpenSearchRetriever(client, precomputed)
+        with profiler.stage("index", "chunks") as stage:
+            if not client.indices.exists(index=collection_name):
+                retriever.create_collection(collection_name)
+            retriever.upload_library(
+                (chunk for library in libraries for chunk in library.chunks),
+                batch_size,
+                collection_name=collection_name,
+                delete_stale=False,
+            )
+            stage.items = report.chunks
+        if precomputed.misses:
+            logger.warning(
+                "%d chunks were encoded again during indexing", precomputed.misses
+            )
+    finally:
+        tracing.remove_sink(histogram)
+
+    report.seconds = time.perf_counter() - start
+    report.stages = profiler.stages
+    report.spans = histogram.summary()
+    return report
+
+
+def format_profile(report: IngestionProfile) -> str:
+    lines = [
+        f"{report.source}: {report.files} files, {report.chunks} chunks in {report.seconds:.2f}s",
+        f"{'stage':<8} {'seconds':>9} {'throughput':>20} {'peak RSS':>12} {'traced':>12}",
+    ]
+    for stage in report.stages:
+        rss = (
+            f"{stage.peak_rss / 2**20:.1f} MiB" if stage.peak_rss is not None else "n/a"
+        )
+        traced = (
+            f"{stage.peak_traced / 2**20:.1f} MiB"
+            if stage.peak_traced is not None
+            else "n/a"
+        )
+        lines.append(
+            f"{stage.name:<8} {stage.seconds:>9.3f} {stage.throughput:>12,.1f} {stage.unit + '/s':<7}"
+            f" {rss:>12} {traced:>12}"
+        )
+    for stage in report.stages:
+        if stage.top_allocations:
+            lines.append(f"\ntop allocations of {stage.name}:")
+            lines.extend(
+                f"  {allocation.size / 2**10:>10.1f} KiB {allocation.count:>8} blocks  {allocation.location}"
+                for allocation in stage.top_allocations
+            )
+        if stage.profile_path:
+            lines.append(f"cProfile dump of {stage.name}: {stage.profile_path}")
+    return "\n".join(lines)
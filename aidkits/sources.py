@@ -4,8 +4,6 @@ import typing
 from functools import cached_property
 from pathlib import Path
 
-from git import Repo
-
 
 class Location(typing.Protocol):
     def __init__(self, uri: str):
@@ -42,6 +40,8 @@ class RemoteGitRepository:
         :param repo_url: URL of the repository (GitHub, Bitbucket, or other remote repositories)
         :return: The path to the temporary directory where the repository was cloned
         """
+        from git import Repo
+
         temp_dir = tempfile.mkdtemp()
         try:
             print(f"Cloning repository {self.uri} into {temp_dir}...")
@@ -0,0 +1,122 @@
+import json
+import queue
+import threading
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Type, TypeVar, Union
+
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+
+def batched(iterable: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Lazily split an iterable into lists of at most ``size`` items.
+
+    Args:
+        iterable: Any iterable, including generators
+        size: The maximum number of items per batch
+
+    Returns:
+        An iterator over the batches
+    """
+    if size < 1:
+        raise ValueError("Batch size must be at least 1")
+
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+_DONE = object()
+
+
+class _Failure:
+    __slots__ = ("error",)
+
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+def prefetch(iterable: Iterable[T], maxsize: int) -> Iterator[T]:
+    """Produce an iterable in a background thread, at most ``maxsize`` items ahead.
+
+    The bounded queue applies backpressure: the producer blocks while the
+    consumer is behind, so memory stays bounded while both stages overlap.
+    Exceptions of the producer are raised in the consumer. Closing the
+    iterator early stops the producer at its next item.
+
+    Args:
+        iterable: Any iterable, consumed in the background thread
+        maxsize: The maximum number of items buffered between the threads
+
+    Returns:
+        An iterator over the same items in the same order
+    """
+    if maxsize < 1:
+        raise ValueError("Queue size must be at least 1")
+
+    buffer: "queue.Queue[Any]" = queue.Queue(maxsize)
+    stopped = threading.Event()
+
+    def put(item: Any) -> bool:
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_Failure(e))
+        else:
+            put(_DONE)
+
+    thread = threading.Thread(target=produce, name="prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def read_jsonl(
+    path: Union[str, Path],
+    model: Optional[Type[BaseModel]] = None,
+    encoding: str = "utf-8",
+) -> Iterator[Union[Dict[str, Any], BaseModel]]:
+    """Lazily read a JSON Lines file one record at a time.
+
+    Args:
+        path: Path to the JSONL file
+        model: Optional model to validate every record with
+        encoding: The encoding of the file
+
+    Returns:
+        An iterator over the records, as dicts or ``model`` instances
+    """
+    with open(path, encoding=encoding) as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            if model is not None:
+                yield model.model_validate_json(line)
+            else:
+                yield json.loads(line)
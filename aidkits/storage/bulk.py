@@ -0,0 +1,227 @@
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional
+
+from pydantic import BaseModel, Field
+
+from aidkits import tracing
+
+if TYPE_CHECKING:
+    from opensearchpy import OpenSearch
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying: queue rejections and transient gateway errors
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+
+class BulkFailure(BaseModel):
+    id: Optional[str]
+    index: Optional[str]
+    status: Optional[int]
+    error: Any = None
+
+
+class BulkReport(BaseModel):
+    succeeded: int = 0
+    failed: List[BulkFailure] = Field(default_factory=list)
+    skipped: int = 0
+    deleted: int = 0
+    requests: int = 0
+    retries: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+    def merge(self, other: "BulkReport") -> None:
+        self.succeeded += other.succeeded
+        self.failed.extend(other.failed)
+        self.skipped += other.skipped
+        self.deleted += other.deleted
+        self.requests += other.requests
+        self.retries += other.retries
+
+
+class _BulkItem:
+    __slots__ = ("action", "lines")
+
+    def __init__(self, action: Dict[str, Any]) -> None:
+        self.action = action
+        op_type = action.get("_op_type", "index")
+        meta = {"_index": action["_index"], "_id": action.get("_id")}
+        if action.get("_routing") is not None:
+            meta["routing"] = action["_routing"]
+        lines = json.dumps({op_type: meta}, ensure_ascii=False) + "\n"
+        if op_type != "delete":
+            lines += json.dumps(action["_source"], ensure_ascii=False) + "\n"
+        self.lines = lines.encode("utf-8")
+
+    def failure(self, status: Optional[int], error: Any) -> BulkFailure:
+        return BulkFailure(
+            id=self.action.get("_id"),
+            index=self.action.get("_index"),
+            status=status,
+            error=error,
+        )
+
+
+class BulkIndexer:
+    """Sends bulk requests from a stream of actions with several in-flight workers.
+
+    Actions are dicts in the ``opensearchpy.helpers`` format
+    (``_op_type``, ``_index``, ``_id``, ``_source``, ``_routing``). They are
+    serialized in the calling thread and packed into requests of roughly
+    ``target_bytes``, so the request size does not depend on document size or
+    on the encoder batch size. Requests rejected with 429 (as a whole or per
+    item) are retried with exponential backoff, and a request refused as too
+    large (413) is split and the byte target lowered for the rest of the run.
+    """
+
+    def __init__(
+        self,
+        client: "OpenSearch",
+        max_workers: int = 4,
+        target_bytes: int = 5 * 1024 * 1024,
+        max_actions: int = 5000,
+        max_retries: int = 5,
+        initial_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+    ) -> None:
+        self._client = client
+        self.max_workers = max_workers
+        self.target_bytes = target_bytes
+        self.max_actions = max_actions
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+
+    def index(self, actions: Iterable[Dict[str, Any]]) -> BulkReport:
+        """Consume the actions lazily and send them as concurrent bulk requests.
+
+        At most ``max_workers`` requests are in flight; producing further
+        actions blocks until one of them finishes.
+
+        Args:
+            actions: The bulk actions to send
+
+        Returns:
+            A report with the number of successful actions and every failure
+        """
+        report = BulkReport()
+        slots = threading.Semaphore(self.max_workers)
+
+        def collect(future) -> None:
+            try:
+                with self._lock:
+                    report.merge(future.result())
+            finally:
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for batch in self._batches(actions):
+                slots.acquire()
+                executor.submit(self._send, batch).add_done_callback(collect)
+
+        if report.failed:
+            logger.warning(
+                "Bulk indexing finished with %d failed documents, e.g. %s",
+                len(report.failed),
+                report.failed[0],
+            )
+        return report
+
+    def _batches(self, actions: Iterable[Dict[str, Any]]) -> Iterator[List[_BulkItem]]:
+        batch: List[_BulkItem] = []
+        size = 0
+        for action in actions:
+            item = _BulkItem(action)
+            if batch and (
+                size + len(item.lines) > self.target_bytes
+                or len(batch) >= self.max_actions
+            ):
+                yield batch
+                batch, size = [], 0
+            batch.append(item)
+            size += len(item.lines)
+        if batch:
+            yield batch
+
+    def _backoff(self, attempt: int) -> float:
+        return min(self.max_backoff, self.initial_backoff * 2 ** (attempt - 1))
+
+    def _send(self, batch: List[_BulkItem]) -> BulkReport:
+        from opensearchpy.exceptions import TransportError
+
+        report = BulkReport()
+        pending = batch
+        try:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    report.retries += 1
+                    time.sleep(self._backoff(attempt))
+
+                report.requests += 1
+                try:
+                    body = b"".join(item.lines for item in pending)
+                    with tracing.span(
+                        "ingest.bulk",
+                        actions=len(pending),
+                        bytes=len(body),
+                        attempt=attempt,
+                    ):
+                        response = self._client.bulk(body=body)
+                except TransportError as e:
+                    if e.status_code == 413 and len(pending) > 1:
+                        return self._split(pending, report)
+                    if (
+                        e.status_code in RETRY_STATUSES or e.status_code == "N/A"
+                    ) and attempt < self.max_retries:
+                        continue
+                    status = e.status_code if isinstance(e.status_code, int) else None
+                    report.failed.extend(
+                        item.failure(status, e.error) for item in pending
+                    )
+                    return report
+
+                retry = []
+                for item, result in zip(pending, response["items"]):
+                    info = next(iter(result.values()))
+                    status = info.get("status", 500)
+                    if status < 300 or (
+                        status == 404 and item.action.get("_op_type") == "delete"
+                    ):
+                        report.succeeded += 1
+                    elif status in RETRY_STATUSES:
+                        retry.append(item)
+                    else:
+                        report.failed.append(item.failure(status, info.get("error")))
+                if not retry:
+                    return report
+                pending = retry
+
+            report.failed.extend(
+                item.failure(429, "retries exhausted") for item in pending
+            )
+        except Exception as e:
+            logger.exception("Bulk request failed")
+            report.failed.extend(item.failure(None, str(e)) for item in pending)
+        return report
+
+    def _split(self, pending: List[_BulkItem], report: BulkReport) -> BulkReport:
+        """Halve a request the cluster refused as too large and lower the byte target."""
+        half = len(pending) // 2
+        with self._lock:
+            self.target_bytes = max(
+                1, min(self.target_bytes, sum(len(item.lines) for item in pending) // 2)
+            )
+        logger.info(
+            "Bulk request too large, lowering target to %d bytes", self.target_bytes
+        )
+        report.merge(self._send(pending[:half]))
+        report.merge(self._send(pending[half:]))
+        return report
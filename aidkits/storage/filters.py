@@ -0,0 +1,61 @@
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+# Structured filters map a payload field to a condition:
+#   {"title": ["a.md", "b.md"]}           any of the values
+#   {"chunk_num": {"gte": 2, "lte": 4}}   a range
+#   {"library": "docs"}                   one value
+Filters = Mapping[str, Any]
+
+_RANGE_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "gt": lambda value, bound: value > bound,
+    "gte": lambda value, bound: value >= bound,
+    "lt": lambda value, bound: value < bound,
+    "lte": lambda value, bound: value <= bound,
+}
+
+
+def _is_range(condition: Any) -> bool:
+    if not isinstance(condition, Mapping) or not condition:
+        return False
+    unknown = set(condition) - set(_RANGE_OPERATORS)
+    if unknown:
+        raise ValueError(f"Unknown range operators: {sorted(unknown)}")
+    return True
+
+
+def filter_clauses(filters: Optional[Filters]) -> List[Dict[str, Any]]:
+    """Translate structured filters into OpenSearch ``bool.filter`` clauses.
+
+    Args:
+        filters: The structured filters
+
+    Returns:
+        The clauses, empty when there are no filters
+    """
+    clauses: List[Dict[str, Any]] = []
+    for field, condition in (filters or {}).items():
+        if _is_range(condition):
+            clauses.append({"range": {field: dict(condition)}})
+        elif isinstance(condition, (list, tuple, set, frozenset)):
+            clauses.append({"terms": {field: list(condition)}})
+        else:
+            clauses.append({"term": {field: condition}})
+    return clauses
+
+
+def matches(filters: Optional[Filters], payload: Mapping[str, Any]) -> bool:
+    """Evaluate structured filters against a payload, with the OpenSearch semantics."""
+    for field, condition in (filters or {}).items():
+        value = payload.get(field)
+        if _is_range(condition):
+            if value is None or not all(
+                _RANGE_OPERATORS[operator](value, bound)
+                for operator, bound in condition.items()
+            ):
+                return False
+        elif isinstance(condition, (list, tuple, set, frozenset)):
+            if value not in condition:
+                return False
+        elif value != condition:
+            return False
+    return True
@@ -0,0 +1,58 @@
+import hashlib
+from typing import Any, Dict, Tuple
+
+from aidkits.context import estimate_tokens
+from aidkits.models import CodeChunk, LazyCodeChunk
+
+_SEPARATOR = "\x1f"
+
+
+def content_hash(text: str) -> str:
+    """Return a stable hash of the text that is encoded for a document."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(library: str, file: str, chunk_num: int, text_hash: str) -> str:
+    """Derive a deterministic document ID for a chunk.
+
+    The ID changes whenever the chunk moves or its content changes, so an
+    ID that is already indexed never needs to be encoded again.
+
+    Args:
+        library: The library (collection) title
+        file: The source file title
+        chunk_num: The position of the chunk in the file
+        text_hash: The ``content_hash`` of the encoded text
+
+    Returns:
+        A 32 character hex ID
+    """
+    key = _SEPARATOR.join((library, file, str(chunk_num), text_hash))
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def keyed_document(
+    library: str,
+    file: str,
+    position: int,
+    payload: Dict[str, Any],
+    text: str,
+) -> Tuple[str, Dict[str, Any], str]:
+    """Attach the content hash to a payload and return it with its ID and text."""
+    text_hash = content_hash(text)
+    payload["content_hash"] = text_hash
+    return chunk_id(library, file, position, text_hash), payload, text
+
+
+def chunk_document(library: str, chunk: CodeChunk) -> Tuple[str, Dict[str, Any], str]:
+    """Key a chunk for upload, estimating its tokens if the crawler did not count them."""
+    if isinstance(chunk, LazyCodeChunk):
+        # The index stores the text, so it is read here, one chunk at a time
+        chunk = chunk.load()
+    payload = chunk.model_dump()
+    if payload["tokens"] is None:
+        payload["tokens"] = estimate_tokens(chunk.content)
+    # Titles are file names, so the path keeps same-named files in different directories apart
+    return keyed_document(
+        library, chunk.path or chunk.title, chunk.chunk_num, payload, chunk.markdown
+    )
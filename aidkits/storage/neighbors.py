@@ -0,0 +1,137 @@
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+# The field and value identifying the file of a chunk: ("path", ...) or ("title", ...)
+FileKey = Tuple[str, str]
+
+# A run of consecutive chunks of one file: (file key, first chunk_num, last chunk_num)
+Window = Tuple[FileKey, int, int]
+
+NEIGHBOR_FIELDS = ["path", "title", "chunk_num", "chunk_amount"]
+
+
+def file_key(payload: Mapping[str, Any]) -> Optional[FileKey]:
+    """Identify the file of a chunk by its path, or by its title if it was crawled without one.
+
+    Titles are bare file names, so only the path tells apart files with the
+    same name in different directories.
+    """
+    if payload.get("path") is not None:
+        return "path", payload["path"]
+    if payload.get("title") is not None:
+        return "title", payload["title"]
+    return None
+
+
+def window_filters(window: Window) -> Dict[str, Any]:
+    """Return the structured filters matching every chunk of a window."""
+    (field, value), first, last = window
+    return {field: value, "chunk_num": {"gte": first, "lte": last}}
+
+
+def neighbor_windows(
+    payloads: Iterable[Mapping[str, Any]], neighbors: int
+) -> List[Optional[Window]]:
+    """Compute the windows of ±``neighbors`` chunks around ranked hits.
+
+    Windows of the same file that overlap or touch are merged into the window
+    of the best-ranked hit, so every chunk appears once.
+
+    Args:
+        payloads: The hits in rank order
+        neighbors: The number of chunks to add on each side of a hit
+
+    Returns:
+        One entry per resulting window in rank order. Hits without a
+        ``path`` or ``title`` and a ``chunk_num`` cannot be expanded and are
+        kept as ``None`` slots
+    """
+    slots: List[Optional[List[Any]]] = []
+    for payload in payloads:
+        key, chunk_num = file_key(payload), payload.get("chunk_num")
+        if key is None or chunk_num is None:
+            slots.append([None, 0, 0])
+            continue
+
+        first = max(1, chunk_num - neighbors)
+        last = chunk_num + neighbors
+        if payload.get("chunk_amount"):
+            last = min(last, payload["chunk_amount"])
+
+        touching = [
+            position
+            for position, slot in enumerate(slots)
+            if slot is not None
+            and slot[0] == key
+            and first <= slot[2] + 1
+            and last >= slot[1] - 1
+        ]
+        if not touching:
+            slots.append([key, first, last])
+            continue
+
+        # Merge into the best-ranked window and drop the others
+        target = slots[touching[0]]
+        for position in touching:
+            slot = slots[position]
+            target[1], target[2] = (
+                min(target[1], slot[1], first),
+                max(target[2], slot[2], last),
+            )
+        for position in touching[1:]:
+            slots[position] = None
+
+    windows: List[Optional[Window]] = []
+    for slot in slots:
+        if slot is not None:
+            windows.append(None if slot[0] is None else (slot[0], slot[1], slot[2]))
+    return windows
+
+
+def expand_neighbors(
+    payloads: List[Dict[str, Any]],
+    neighbors: int,
+    fetch: Callable[[List[Window]], Iterable[Dict[str, Any]]],
+) -> List[Dict[str, Any]]:
+    """Replace ranked hits with their merged neighbor windows.
+
+    Args:
+        payloads: The hits in rank order
+        neighbors: The number of chunks to add on each side of a hit
+        fetch: Returns the payloads of every chunk in the given windows, in
+            any order, with a single lookup
+
+    Returns:
+        The chunks of every window in rank order, each window sorted by
+        ``chunk_num``
+    """
+    windows = neighbor_windows(payloads, neighbors)
+    concrete = [window for window in windows if window is not None]
+
+    chunks: Dict[Tuple[FileKey, int], Dict[str, Any]] = {}
+    for payload in payloads:
+        key = file_key(payload)
+        if key is not None and payload.get("chunk_num") is not None:
+            chunks[(key, payload["chunk_num"])] = payload
+    if concrete:
+        for payload in fetch(concrete):
+            key = file_key(payload)
+            if key is not None:
+                chunks.setdefault((key, payload["chunk_num"]), payload)
+
+    unexpandable = iter(
+        payload
+        for payload in payloads
+        if file_key(payload) is None or payload.get("chunk_num") is None
+    )
+    expanded = []
+    for window in windows:
+        if window is None:
+            expanded.append(next(unexpandable))
+            continue
+        key, first, last = window
+        expanded.extend(
+            chunks[(key, chunk_num)]
+            for chunk_num in range(first, last + 1)
+            if (key, chunk_num) in chunks
+        )
+    return expanded
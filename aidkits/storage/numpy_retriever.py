@@ -0,0 +1,643 @@
+import fnmatch
+import heapq
+import json
+import shutil
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
+
+import numpy as np
+from pydantic import BaseModel
+
+from aidkits import tracing
+from aidkits.encoders.base import Encoder
+from aidkits.models import CodeChunk, LibrarySource
+from aidkits.storage.batching import batched
+from aidkits.storage.bulk import BulkReport
+from aidkits.storage.filters import Filters, matches
+from aidkits.storage.ids import chunk_document, keyed_document
+from aidkits.storage.neighbors import (
+    NEIGHBOR_FIELDS,
+    Window,
+    expand_neighbors,
+    window_filters,
+)
+from aidkits.storage.quantization import VectorOptions
+
+
+class _LocalCollection:
+    """One collection on disk: a float32 matrix, the document IDs and the payloads.
+
+    ``vectors.f32`` holds the normalized embeddings row by row and is memory
+    mapped for search, ``ids.txt`` and ``payloads.jsonl`` hold one line per
+    row. Only the IDs and the byte offsets of the payload lines are kept in
+    memory; payloads are read for the hits only.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        meta = json.loads((directory / "meta.json").read_text(encoding="utf-8"))
+        self.dimension: int = meta["dimension"]
+        self._matrix: Optional[np.ndarray] = None
+        self._ann: Any = None
+        self._load()
+
+    @classmethod
+    def create(cls, directory: Path, dimension: int) -> "_LocalCollection":
+        directory.mkdir(parents=True)
+        (directory / "meta.json").write_text(
+            json.dumps({"dimension": dimension}), encoding="utf-8"
+        )
+        for name in ("vectors.f32", "ids.txt", "payloads.jsonl"):
+            (directory / name).touch()
+        return cls(directory)
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.directory / "vectors.f32"
+
+    @property
+    def _ids_path(self) -> Path:
+        return self.directory / "ids.txt"
+
+    @property
+    def _payloads_path(self) -> Path:
+        return self.directory / "payloads.jsonl"
+
+    def _load(self) -> None:
+        self.ids: List[str] = self._ids_path.read_text(encoding="utf-8").splitlines()
+        self.rows: Dict[str, int] = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self._offsets: List[int] = []
+        offset = 0
+        with open(self._payloads_path, "rb") as file:
+            for line in file:
+                self._offsets.append(offset)
+                offset += len(line)
+        self._matrix = None
+        self._ann = None
+        self._columns: Dict[str, List[Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            if not self.ids:
+                return np.empty((0, self.dimension), dtype=np.float32)
+            self._matrix = np.memmap(
+                self._vectors_path,
+                dtype=np.float32,
+                mode="r",
+                shape=(len(self.ids), self.dimension),
+            )
+        return self._matrix
+
+    def append(
+        self, ids: List[str], payloads: List[Dict[str, Any]], vectors: np.ndarray
+    ) -> None:
+        offset = self._payloads_path.stat().st_size
+        with open(self._payloads_path, "ab") as file:
+            for payload in payloads:
+                line = json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n"
+                self._offsets.append(offset)
+                offset += len(line)
+                file.write(line)
+        with open(self._ids_path, "a", encoding="utf-8") as file:
+            file.writelines(f"{doc_id}\n" for doc_id in ids)
+        with open(self._vectors_path, "ab") as file:
+            file.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+
+        for doc_id in ids:
+            self.rows[doc_id] = len(self.ids)
+            self.ids.append(doc_id)
+        self._matrix = None
+        self._ann = None
+        self._columns = {}
+
+    def delete(self, ids: Set[str]) -> int:
+        """Drop rows by rewriting the files without them."""
+        keep = [row for row, doc_id in enumerate(self.ids) if doc_id not in ids]
+        deleted = len(self.ids) - len(keep)
+        if not deleted:
+            return 0
+
+        payloads = [self.payload(row) for row in keep]
+        vectors = np.array(self.matrix[keep], dtype=np.float32)
+        kept_ids = [self.ids[row] for row in keep]
+        self._matrix = None
+        for name in ("vectors.f32", "ids.txt", "payloads.jsonl"):
+            (self.directory / name).write_bytes(b"")
+        self._load()
+        self.append(kept_ids, payloads, vectors)
+        return deleted
+
+    def payload(self, row: int) -> Dict[str, Any]:
+        with open(self._payloads_path, "rb") as file:
+            file.seek(self._offsets[row])
+            return json.loads(file.readline())
+
+    def rows_matching(self, filters: Filters) -> np.ndarray:
+        """Return the rows whose payload matches the filters.
+
+        The filtered fields are read from the payloads once and cached as
+        columns until the collection changes.
+        """
+        for field in filters:
+            if field not in self._columns:
+                with open(self._payloads_path, "rb") as file:
+                    self._columns[field] = [
+                        json.loads(line).get(field) for line in file
+                    ]
+        return np.array(
+            [
+                row
+                for row in range(len(self.ids))
+                if matches(
+                    filters, {field: self._columns[field][row] for field in filters}
+                )
+            ],
+            dtype=np.int64,
+        )
+
+    def search(
+        self,
+        query: np.ndarray,
+        top_k: int,
+        ann_threshold: Optional[int],
+        rows: Optional[np.ndarray] = None,
+    ) -> List[Tuple[int, float]]:
+        """Return ``(row, cosine)`` pairs of the best matches, best first.
+
+        When ``rows`` is given only those rows are scored, always exactly.
+        """
+        count = len(self.ids) if rows is None else len(rows)
+        top_k = min(top_k, count)
+        if top_k == 0:
+            return []
+
+        if rows is None and ann_threshold is not None and count >= ann_threshold:
+            labels, distances = self._ann_index(top_k).knn_query(query, k=top_k)
+            # hnswlib reports inner product distances as 1 - ip
+            return [
+                (int(row), 1.0 - float(distance))
+                for row, distance in zip(labels[0], distances[0])
+            ]
+
+        scores = (self.matrix if rows is None else self.matrix[rows]) @ query
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        found = top if rows is None else rows[top]
+        return [(int(row), float(score)) for row, score in zip(found, scores[top])]
+
+    def _ann_index(self, top_k: int) -> Any:
+        try:
+            import hnswlib
+        except ImportError as e:
+            raise ImportError(
+                "ann_threshold requires hnswlib, install it with `pip install hnswlib`"
+            ) from e
+
+        if self._ann is None:
+            index = hnswlib.Index(space="ip", dim=self.dimension)
+            index.init_index(max_elements=len(self.ids), ef_construction=200, M=16)
+            index.add_items(np.asarray(self.matrix), np.arange(len(self.ids)))
+            self._ann = index
+        self._ann.set_ef(max(64, top_k))
+        return self._ann
+
+
+class NumpyRetriever:
+    """An in-process vector index with the interface of ``OpenSearchRetriever``.
+
+    Each collection is a directory under ``path`` holding a memory-mapped
+    matrix of normalized embeddings and the payloads alongside. Search is an
+    exact matrix-vector product with an ``argpartition`` top-k, or an HNSW
+    graph (``hnswlib``) once a collection has ``ann_threshold`` documents.
+    Scores are ``cosine + 1`` like the OpenSearch script score, so results
+    of both backends are comparable. Not safe for concurrent writers.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        encoder: Encoder,
+        vector_options: Optional[VectorOptions] = None,
+        ann_threshold: Optional[int] = None,
+    ) -> None:
+        """
+        Args:
+            path: The directory holding the collections
+            encoder: The encoder for documents and questions
+            vector_options: Truncation applied to documents and questions.
+                Vectors are always stored as float32
+            ann_threshold: Use an HNSW index for collections of at least this
+                many documents. Exact search is used by default
+        """
+        self._path = Path(path)
+        self._path.mkdir(parents=True, exist_ok=True)
+        self._encoder = encoder
+        self._vector_options = vector_options or VectorOptions()
+        self._ann_threshold = ann_threshold
+        self._collections: Dict[str, _LocalCollection] = {}
+
+    def _collection(self, collection_name: str) -> Optional[_LocalCollection]:
+        if collection_name not in self._collections:
+            directory = self._path / collection_name
+            if not (directory / "meta.json").exists():
+                return None
+            self._collections[collection_name] = _LocalCollection(directory)
+        return self._collections[collection_name]
+
+    def create_collection(self, collection_name: str) -> bool:
+        """Create a new collection.
+
+        Args:
+            collection_name: The name of the collection to create
+
+        Returns:
+            True if the collection was created, False if it already exists
+        """
+        if self._collection(collection_name) is not None:
+            return False
+
+        dimension = self._encoder.get_sentence_embedding_dimension()
+        if self._vector_options.dimension:
+            dimension = min(dimension, self._vector_options.dimension)
+        self._collections[collection_name] = _LocalCollection.create(
+            self._path / collection_name, dimension
+        )
+        return True
+
+    def delete_collection(self, collection_name: str) -> bool:
+        """Delete a collection and its files.
+
+        Args:
+            collection_name: The name of the collection to delete
+
+        Returns:
+            True if the collection was deleted
+        """
+        if self._collection(collection_name) is None:
+            return False
+
+        del self._collections[collection_name]
+        shutil.rmtree(self._path / collection_name)
+        return True
+
+    def refresh_collection(self, collection_name: str) -> None:
+        """Uploaded documents are searchable at once; kept for ``OpenSearchRetriever`` compatibility."""
+
+    def search(
+        self,
+        question: str,
+        collection_name: str,
+        payload_model: Type[BaseModel] = CodeChunk,
+        top_k: int = 5,
+        fields: Optional[List[str]] = None,
+        include_vector: bool = False,
+        trusted: bool = False,
+        filters: Optional[Filters] = None,
+        neighbors: int = 0,
+    ) -> List[BaseModel]:
+        """Search for documents based on a question, see ``OpenSearchRetriever.search``."""
+        if neighbors and fields is not None:
+            fields = list(dict.fromkeys([*fields, *NEIGHBOR_FIELDS]))
+        hits = self._search_hits(
+            question, collection_name, top_k, fields, include_vector, filters
+        )
+        payloads = [hit["payload"] for hit in hits]
+        if neighbors:
+            payloads = expand_neighbors(
+                payloads,
+                neighbors,
+                lambda windows: self._fetch_windows(
+                    collection_name, windows, fields, include_vector
+                ),
+            )
+
+        with tracing.span("retriever.parse", hits=len(payloads)):
+            if trusted:
+                return [
+                    payload_model.model_construct(**payload) for payload in payloads
+                ]
+            return [payload_model.model_validate(payload) for payload in payloads]
+
+    def search_batch(
+        self,
+        questions: Sequence[str],
+        collection_name: str,
+        payload_model: Type[BaseModel] = CodeChunk,
+        top_k: int = 5,
+        fields: Optional[List[str]] = None,
+        trusted: bool = False,
+        filters: Optional[Filters] = None,
+        neighbors: int = 0,
+        return_exceptions: bool = False,
+    ) -> List[Union[List[BaseModel], Exception]]:
+        """Search for several questions, see ``OpenSearchRetriever.search_batch``."""
+        results: List[Union[List[BaseModel], Exception]] = []
+        for question in questions:
+            try:
+                results.append(
+                    self.search(
+                        question,
+                        collection_name,
+                        payload_model,
+                        top_k,
+                        fields,
+                        trusted=trusted,
+                        filters=filters,
+                        neighbors=neighbors,
+                    )
+                )
+            except Exception as error:
+                if not return_exceptions:
+                    raise
+                results.append(error)
+        return results
+
+    def search_scored(
+        self,
+        question: str,
+        collection_name: str,
+        top_k: int = 5,
+        fields: Optional[List[str]] = None,
+        include_vector: bool = False,
+        filters: Optional[Filters] = None,
+    ) -> List[Dict[str, Any]]:
+        """Search for documents and return scored results, see ``OpenSearchRetriever.search_scored``."""
+        return self._search_hits(
+            question, collection_name, top_k, fields, include_vector, filters
+        )
+
+    def search_collections(
+        self,
+        question: str,
+        collections: Union[str, Sequence[str]],
+        top_k: int = 5,
+        fields: Optional[List[str]] = None,
+        include_vector: bool = False,
+        filters: Optional[Filters] = None,
+    ) -> List[Dict[str, Any]]:
+        """Search several collections and merge them into a global top-k.
+
+        See ``OpenSearchRetriever.search_collections``. Patterns are matched
+        against the collection directories with ``fnmatch``.
+        """
+        names = [collections] if isinstance(collections, str) else list(collections)
+        available = [
+            directory.name
+            for directory in self._path.iterdir()
+            if (directory / "meta.json").exists()
+        ]
+        matched = [
+            name
+            for name in available
+            if any(fnmatch.fnmatchcase(name, pattern) for pattern in names)
+        ]
+
+        query = self._encode_query(question)
+        hits = []
+        for name in matched:
+            for hit in self._collection_hits(
+                query, name, top_k, fields, include_vector, filters
+            ):
+                hit["collection"] = name
+                hits.append(hit)
+        return heapq.nlargest(top_k, hits, key=lambda hit: hit["score"])
+
+    def _search_hits(
+        self,
+        question: str,
+        collection_name: str,
+        top_k: int,
+        fields: Optional[List[str]],
+        include_vector: bool,
+        filters: Optional[Filters],
+    ) -> List[Dict[str, Any]]:
+        if self._collection(collection_name) is None:
+            raise KeyError(f"Collection not found: {collection_name}")
+        return self._collection_hits(
+            self._encode_query(question),
+            collection_name,
+            top_k,
+            fields,
+            include_vector,
+            filters,
+        )
+
+    def _encode_query(self, question: str) -> np.ndarray:
+        with tracing.span("retriever.encode", questions=1):
+            return self._prepare(
+                self._encoder.encode(sentences=question, prompt_name="search_query")
+            )
+
+    def _collection_hits(
+        self,
+        query: np.ndarray,
+        collection_name: str,
+        top_k: int,
+        fields: Optional[List[str]],
+        include_vector: bool,
+        filters: Optional[Filters],
+    ) -> List[Dict[str, Any]]:
+        collection = self._collection(collection_name)
+        with tracing.span("retriever.query", collection=collection_name, top_k=top_k):
+            rows = collection.rows_matching(filters) if filters else None
+            best = collection.search(query, top_k, self._ann_threshold, rows)
+        hits = []
+        for row, cosine in best:
+            payload = self._payload(collection, row, fields, include_vector)
+            hits.append(
+                {
+                    "id": collection.ids[row],
+                    "payload": payload,
+                    "score": cosine + 1.0,
+                    "vector": payload.get("vector", []) if include_vector else [],
+                }
+            )
+        return hits
+
+    def _fetch_windows(
+        self,
+        collection_name: str,
+        windows: List[Window],
+        fields: Optional[List[str]],
+        include_vector: bool,
+    ) -> List[Dict[str, Any]]:
+        collection = self._collection(collection_name)
+        return [
+            self._payload(collection, row, fields, include_vector)
+            for window in windows
+            for row in collection.rows_matching(window_filters(window))
+        ]
+
+    @staticmethod
+    def _payload(
+        collection: _LocalCollection,
+        row: int,
+        fields: Optional[List[str]],
+        include_vector: bool,
+    ) -> Dict[str, Any]:
+        payload = collection.payload(row)
+        if fields is not None:
+            payload = {field: payload[field] for field in fields if field in payload}
+        if include_vector:
+            payload["vector"] = collection.matrix[row].tolist()
+        return payload
+
+    def upload_collection(
+        self,
+        collection_name: str,
+        data: Iterable[Mapping[str, Any]],
+        payload_vectorize_field: str,
+        batch_size: int = 100,
+        show_progress_bar: bool = True,
+        window_size: int = 1000,
+        delete_stale: bool = False,
+        id_namespace: Optional[str] = None,
+    ) -> BulkReport:
+        """Upload a collection of documents, see ``OpenSearchRetriever.upload_collection``."""
+        documents = (
+            keyed_document(
+                id_namespace or collection_name,
+                "",
+                position,
+                dict(item),
+                item[payload_vectorize_field],
+            )
+            for position, item in enumerate(data)
+        )
+        return self._sync(
+            collection_name,
+            documents,
+            batch_size,
+            show_progress_bar,
+            window_size,
+            delete_stale,
+        )
+
+    def upload_library(
+        self,
+        library: Union[LibrarySource, Iterable[CodeChunk]],
+        batch_size: int = 100,
+        collection_name: Optional[str] = None,
+        window_size: int = 1000,
+        delete_stale: bool = False,
+        id_namespace: Optional[str] = None,
+    ) -> BulkReport:
+        """Upload a library, see ``OpenSearchRetriever.upload_library``."""
+        if isinstance(library, LibrarySource):
+            collection_name = collection_name or library.title
+            chunks: Iterable[CodeChunk] = library.chunks
+        elif collection_name is None:
+            raise ValueError(
+                "collection_name is required when uploading an iterable of chunks"
+            )
+        else:
+            chunks = library
+
+        documents = (
+            chunk_document(id_namespace or collection_name, chunk) for chunk in chunks
+        )
+        return self._sync(
+            collection_name,
+            documents,
+            batch_size,
+            True,
+            window_size,
+            delete_stale,
+        )
+
+    def sync_file(
+        self,
+        path: str,
+        chunks: Iterable[CodeChunk],
+        collection_name: str,
+        batch_size: int = 100,
+    ) -> BulkReport:
+        """Replace the chunks of one file, see ``OpenSearchRetriever.sync_file``."""
+        documents = (chunk_document(collection_name, chunk) for chunk in chunks)
+        return self._sync(
+            collection_name,
+            documents,
+            batch_size,
+            False,
+            batch_size,
+            True,
+            filters={"path": path},
+        )
+
+    def _sync(
+        self,
+        collection_name: str,
+        documents: Iterable[Tuple[str, Dict[str, Any], str]],
+        batch_size: int,
+        show_progress_bar: bool,
+        window_size: int,
+        delete_stale: bool,
+        filters: Optional[Filters] = None,
+    ) -> BulkReport:
+        self.create_collection(collection_name)
+        collection = self._collection(collection_name)
+        if filters:
+            existing = {
+                collection.ids[row] for row in collection.rows_matching(filters)
+            }
+        else:
+            existing = set(collection.ids)
+        seen: Set[str] = set()
+        report = BulkReport()
+
+        def changed() -> Iterator[Tuple[str, Dict[str, Any], str]]:
+            for doc_id, payload, text in documents:
+                if doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                if doc_id not in existing:
+                    yield doc_id, payload, text
+
+        for window in batched(changed(), window_size):
+            with tracing.span(
+                "ingest.encode", collection=collection_name, documents=len(window)
+            ):
+                embeddings = self._encoder.encode(
+                    sentences=[text for _, _, text in window],
+                    batch_size=batch_size,
+                    prompt_name="search_document",
+                    show_progress_bar=show_progress_bar,
+                )
+            with tracing.span(
+                "ingest.write", collection=collection_name, documents=len(window)
+            ):
+                collection.append(
+                    [doc_id for doc_id, _, _ in window],
+                    [payload for _, payload, _ in window],
+                    self._prepare(embeddings),
+                )
+            report.succeeded += len(window)
+            report.requests += 1
+
+        report.skipped = len(seen & existing)
+        if delete_stale and report.ok:
+            report.deleted = collection.delete(existing - seen)
+        return report
+
+    def _prepare(self, embeddings: Any) -> np.ndarray:
+        # Quantized values are scaled, so normalize again to keep cosine scores
+        vectors = self._vector_options.prepare(embeddings).astype(np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
@@ -1,21 +1,57 @@
-from typing import List, Dict, Mapping, Any, Type
+import logging
+import time
+from typing import TYPE_CHECKING, List, Dict, Mapping, Any, Type, Iterable, Iterator, Optional, Union, Tuple, Set, Callable, Sequence
 from uuid import uuid4
 
-from opensearchpy import OpenSearch
 from pydantic import BaseModel
-from sentence_transformers import SentenceTransformer
 
+from aidkits import tracing
+from aidkits.encoders.base import Encoder
 from aidkits.models import LibrarySource, CodeChunk
+from aidkits.storage.batching import batched, prefetch
+from aidkits.storage.bulk import BulkIndexer, BulkReport
+from aidkits.storage.filters import Filters, filter_clauses
+from aidkits.storage.ids import chunk_document, keyed_document
+from aidkits.storage.neighbors import NEIGHBOR_FIELDS, Window, expand_neighbors, window_filters
+from aidkits.storage.quantization import VectorOptions
+
+if TYPE_CHECKING:
+    from opensearchpy import OpenSearch
+
+logger = logging.getLogger(__name__)
+
+# Only the parts of a search response the retriever reads
+SEARCH_FILTER_PATH = ["hits.hits._id", "hits.hits._index", "hits.hits._score", "hits.hits._source"]
+MSEARCH_FILTER_PATH = ["responses.error", "responses.status"] + [f"responses.{path}" for path in SEARCH_FILTER_PATH]
 
 
 class OpenSearchRetriever:
     def __init__(
             self,
-            client: OpenSearch,
-            encoder: SentenceTransformer,
+            client: "OpenSearch",
+            encoder: Encoder,
+            bulk_indexer: Optional[BulkIndexer] = None,
+            vector_options: Optional[VectorOptions] = None,
+            shared_collection: Optional[str] = None,
     ) -> None:
+        """
+        Args:
+            client: The OpenSearch client
+            encoder: The encoder for documents and questions
+            bulk_indexer: Sends the bulk requests of the upload methods
+            vector_options: Truncation and quantization of stored vectors.
+                Applied to both documents and questions; by default the full
+                float32 embeddings are stored
+            shared_collection: Store every collection (library) in this one
+                index instead of an index per collection. Documents carry a
+                ``library`` keyword and are routed by it, so collection names
+                keep working for search, upload and delete
+        """
         self._client = client
         self._encoder = encoder
+        self._bulk_indexer = bulk_indexer or BulkIndexer(client)
+        self._vector_options = vector_options
+        self._shared_collection = shared_collection
 
     def search(
             self,
@@ -23,6 +59,11 @@ class OpenSearchRetriever:
             collection_name: str,
             payload_model: Type[BaseModel] = CodeChunk,
             top_k: int = 5,
+            fields: Optional[List[str]] = None,
+            include_vector: bool = False,
+            trusted: bool = False,
+            filters: Optional[Filters] = None,
+            neighbors: int = 0,
     ) -> List[BaseModel]:
         """Search for documents in OpenSearch based on a question.
         
@@ -31,50 +72,144 @@ class OpenSearchRetriever:
             collection_name: The name of the index to search in
             payload_model: The model to use for parsing the results
             top_k: The number of results to return
+            fields: Only fetch these source fields
+            include_vector: Whether to fetch the stored vector
+            trusted: Build the models with ``model_construct`` instead of
+                validating every hit. Only use it for indices written by this
+                retriever, and note that fields left out by ``fields`` are
+                missing on the models
+            filters: Structured pre-filters, e.g.
+                ``{"title": ["a.md"], "chunk_num": {"gte": 2, "lte": 4}}``.
+                Only matching documents are scored
+            neighbors: Expand every hit with this many chunks before and
+                after it from the same file, fetched with one extra request.
+                Overlapping windows are merged, so a chunk is returned once
             
         Returns:
-            A list of documents matching the query
+            A list of documents matching the query. With ``neighbors``, the
+            windows follow the rank of their best hit and each window is in
+            chunk order
         """
-        query_embedding = self._encoder.encode(
-            sentences=question,
-            prompt_name="search_query",
-        )
-
-        # Convert the embedding to a list if it's not already
-        if hasattr(query_embedding, "tolist"):
-            query_embedding = query_embedding.tolist()
-
-        # Create a script score query to calculate cosine similarity
-        search_body = {
-            "size": top_k,
-            "query": {
-                "script_score": {
-                    "query": {"match_all": {}},
-                    "script": {
-                        "source": "cosineSimilarity(params.query_vector, 'vector') + 1.0",
-                        "params": {"query_vector": query_embedding}
-                    }
-                }
-            }
-        }
+        if neighbors and fields is not None:
+            fields = list(dict.fromkeys([*fields, *NEIGHBOR_FIELDS]))
+        hits = self._search_hits(question, collection_name, top_k, fields, include_vector, filters)
+        payloads = [hit["_source"] for hit in hits]
+        if neighbors:
+            payloads = expand_neighbors(
+                payloads,
+                neighbors,
+                lambda windows: self._fetch_windows(collection_name, windows, fields, include_vector),
+            )
+
+        with tracing.span("retriever.parse", hits=len(payloads)):
+            if trusted:
+                return [payload_model.model_construct(**payload) for payload in payloads]
+            return [payload_model.model_validate(payload) for payload in payloads]
+
+    def search_batch(
+            self,
+            questions: Sequence[str],
+            collection_name: str,
+            payload_model: Type[BaseModel] = CodeChunk,
+            top_k: int = 5,
+            fields: Optional[List[str]] = None,
+            trusted: bool = False,
+            filters: Optional[Filters] = None,
+            neighbors: int = 0,
+            return_exceptions: bool = False,
+    ) -> List[Union[List[BaseModel], Exception]]:
+        """Search for several questions with one encoder call and one ``msearch`` request.
 
-        response = self._client.search(
-            index=collection_name,
-            body=search_body
-        )
+        If the ``msearch`` request itself fails, every question is searched
+        on its own, so one failing search does not fail the others.
 
-        documents: List[BaseModel] = [
-            payload_model.model_validate(hit["_source"])
-            for hit in response["hits"]["hits"]
-        ]
+        Args:
+            questions: The questions to search for
+            collection_name: The name of the index to search in
+            payload_model: The model to use for parsing the results
+            top_k: The number of results to return per question
+            fields: Only fetch these source fields
+            trusted: Skip validation, see :meth:`search`
+            filters: Structured pre-filters, see :meth:`search`
+            neighbors: Expand every hit with its neighbors, see :meth:`search`
+            return_exceptions: Return the error of a failed search in place of
+                its results instead of raising it
 
-        return documents
+        Returns:
+            The results of every question, in input order
+        """
+        if not questions:
+            return []
+        if neighbors and fields is not None:
+            fields = list(dict.fromkeys([*fields, *NEIGHBOR_FIELDS]))
+
+        index, routing = self._scope(collection_name)
+        header: Dict[str, Any] = {"index": index}
+        if routing is not None:
+            filters = {**(filters or {}), "library": collection_name}
+            header["routing"] = routing
+
+        searches: List[Dict[str, Any]] = []
+        for query_embedding in self._encode_queries(list(questions)):
+            body = self._search_body(query_embedding, top_k, filters)
+            body["_source"] = self._source_filter(fields, False)
+            searches.extend([header, body])
+        from opensearchpy.exceptions import TransportError
+
+        responses: List[Union[Dict[str, Any], Exception]]
+        with tracing.span("retriever.query", collection=collection_name, questions=len(questions)):
+            try:
+                responses = self._client.msearch(body=searches, filter_path=MSEARCH_FILTER_PATH).get("responses", [])
+            except TransportError as error:
+                # The request as a whole failed (a timeout, a size limit), so
+                # send the searches one by one and fail only the ones that fail again
+                logger.warning("msearch of %d questions failed, searching one by one: %s", len(questions), error)
+                responses = [self._search_one(header, body) for header, body in zip(searches[::2], searches[1::2])]
+
+        results: List[Union[List[BaseModel], Exception]] = []
+        for response in responses:
+            try:
+                if isinstance(response, Exception):
+                    raise response
+                if "error" in response:
+                    error = response["error"]
+                    error_type = error.get("type", "search_error") if isinstance(error, dict) else str(error)
+                    raise TransportError(response.get("status", "N/A"), error_type, error)
+                payloads = [hit["_source"] for hit in response.get("hits", {}).get("hits", [])]
+                if neighbors:
+                    payloads = expand_neighbors(
+                        payloads,
+                        neighbors,
+                        lambda windows: self._fetch_windows(collection_name, windows, fields, False),
+                    )
+                if trusted:
+                    results.append([payload_model.model_construct(**payload) for payload in payloads])
+                else:
+                    results.append([payload_model.model_validate(payload) for payload in payloads])
+            except Exception as error:
+                if not return_exceptions:
+                    raise
+                results.append(error)
+        return results
+
+    def _search_one(self, header: Dict[str, Any], body: Dict[str, Any]) -> Union[Dict[str, Any], Exception]:
+        """Send one search of an ``msearch`` request on its own, returning its error instead of raising it."""
+        from opensearchpy.exceptions import TransportError
+
+        params = {key: value for key, value in header.items() if key != "index"}
+        try:
+            return self._client.search(index=header["index"], body=body, filter_path=SEARCH_FILTER_PATH, **params)
+        except TransportError as error:
+            return error
 
     def search_scored(
             self,
             question: str,
             collection_name: str,
             top_k: int = 5,
+            fields: Optional[List[str]] = None,
+            include_vector: bool = False,
+            filters: Optional[Filters] = None,
     ) -> List[Dict[str, Any]]:
         """Search for documents in OpenSearch and return scored results.
         
@@ -82,25 +217,272 @@ class OpenSearchRetriever:
             question: The question to search for
             collection_name: The name of the index to search in
             top_k: The number of results to return
+            fields: Only fetch these source fields
+            include_vector: Whether to fetch the stored vector. Otherwise
+                ``vector`` is an empty list
+            filters: Structured pre-filters, see :meth:`search`
             
         Returns:
             A list of scored documents matching the query
         """
-        query_embedding = self._encoder.encode(
-            sentences=question,
-            prompt_name="search_query",
+        hits = self._search_hits(question, collection_name, top_k, fields, include_vector, filters)
+
+        # Format the results to match the expected output format
+        scored_points = []
+        for hit in hits:
+            scored_point = {
+                "id": hit["_id"],
+                "payload": hit["_source"],
+                "score": hit["_score"],
+                "vector": hit["_source"].get("vector", [])
+            }
+            scored_points.append(scored_point)
+
+        return scored_points
+
+    def search_collections(
+            self,
+            question: str,
+            collections: Union[str, Sequence[str]],
+            top_k: int = 5,
+            fields: Optional[List[str]] = None,
+            include_vector: bool = False,
+            filters: Optional[Filters] = None,
+    ) -> List[Dict[str, Any]]:
+        """Search several collections at once and return the global top-k.
+
+        The question is encoded once and sent as a single multi-index
+        request, so OpenSearch merges the per-shard results itself. Scores
+        are absolute cosine similarities and stay comparable across
+        collections. Missing collections are ignored.
+
+        Args:
+            question: The question to search for
+            collections: Collection names or aliases, or an index pattern such
+                as ``"docs-*"``
+            top_k: The number of results to return in total
+            fields: Only fetch these source fields
+            include_vector: Whether to fetch the stored vector
+            filters: Structured pre-filters, see :meth:`search`
+
+        Returns:
+            Scored results like :meth:`search_scored`, each with the
+            ``collection`` it came from
+        """
+        names = [collections] if isinstance(collections, str) else list(collections)
+        if self._shared_collection is not None:
+            return self._search_libraries(question, names, top_k, fields, include_vector, filters)
+
+        body = self._search_body(self._encode_query(question), top_k, filters)
+        body["_source"] = self._source_filter(fields, include_vector)
+
+        with tracing.span("retriever.query", collection=",".join(names)):
+            response = self._client.search(
+                index=",".join(names),
+                body=body,
+                filter_path=SEARCH_FILTER_PATH,
+                ignore_unavailable=True,
+            )
+        hits = response.get("hits", {}).get("hits", [])
+
+        # Hits name the physical index; map indices behind aliases back to the alias
+        physical = {hit["_index"] for hit in hits} - set(names)
+        aliases: Dict[str, str] = {}
+        if physical:
+            for index, info in self._client.indices.get_alias(index=",".join(physical)).items():
+                requested = [alias for alias in info.get("aliases", {}) if alias in names]
+                if requested:
+                    aliases[index] = requested[0]
+
+        return [
+            {
+                "id": hit["_id"],
+                "collection": aliases.get(hit["_index"], hit["_index"]),
+                "payload": hit["_source"],
+                "score": hit["_score"],
+                "vector": hit["_source"].get("vector", []),
+            }
+            for hit in hits
+        ]
+
+    def _search_libraries(
+            self,
+            question: str,
+            names: List[str],
+            top_k: int,
+            fields: Optional[List[str]],
+            include_vector: bool,
+            filters: Optional[Filters],
+    ) -> List[Dict[str, Any]]:
+        """Search several libraries of the shared collection in one request."""
+        patterns = [name for name in names if "*" in name or "?" in name]
+        libraries = {
+            "bool": {
+                "should": [
+                    {"wildcard": {"library": name}} if name in patterns else {"term": {"library": name}}
+                    for name in names
+                ],
+                "minimum_should_match": 1,
+            }
+        }
+        body = self._search_body(self._encode_query(question), top_k, filters, [libraries])
+        body["_source"] = self._source_filter(
+            list(fields) + ["library"] if fields is not None else None, include_vector,
         )
 
+        params: Dict[str, Any] = {}
+        if not patterns:
+            params["routing"] = ",".join(names)
+        with tracing.span("retriever.query", collection=",".join(names)):
+            response = self._client.search(
+                index=self._shared_collection,
+                body=body,
+                filter_path=SEARCH_FILTER_PATH,
+                **params,
+            )
+        return [
+            {
+                "id": hit["_id"],
+                "collection": hit["_source"].get("library"),
+                "payload": hit["_source"],
+                "score": hit["_score"],
+                "vector": hit["_source"].get("vector", []),
+            }
+            for hit in response.get("hits", {}).get("hits", [])
+        ]
+
+    def _search_hits(
+            self,
+            question: str,
+            collection_name: str,
+            top_k: int,
+            fields: Optional[List[str]],
+            include_vector: bool,
+            filters: Optional[Filters],
+    ) -> List[Dict[str, Any]]:
+        index, routing = self._scope(collection_name)
+        params: Dict[str, Any] = {}
+        if routing is not None:
+            filters = {**(filters or {}), "library": collection_name}
+            params["routing"] = routing
+
+        body = self._search_body(self._encode_query(question), top_k, filters)
+        body["_source"] = self._source_filter(fields, include_vector)
+
+        with tracing.span("retriever.query", collection=collection_name, top_k=top_k):
+            response = self._client.search(
+                index=index,
+                body=body,
+                filter_path=SEARCH_FILTER_PATH,
+                **params,
+            )
+        # filter_path drops the "hits" key entirely when nothing matched
+        return response.get("hits", {}).get("hits", [])
+
+    def _fetch_windows(
+            self,
+            collection_name: str,
+            windows: List[Window],
+            fields: Optional[List[str]],
+            include_vector: bool,
+    ) -> List[Dict[str, Any]]:
+        """Fetch every chunk of the given windows with a single request."""
+        index, routing = self._scope(collection_name)
+        params: Dict[str, Any] = {}
+        clauses: List[Dict[str, Any]] = []
+        if routing is not None:
+            clauses = filter_clauses({"library": collection_name})
+            params["routing"] = routing
+
+        body = {
+            "size": sum(last - first + 1 for _, first, last in windows),
+            "query": {
+                "bool": {
+                    "filter": clauses,
+                    "should": [{"bool": {"filter": filter_clauses(window_filters(window))}} for window in windows],
+                    "minimum_should_match": 1,
+                }
+            },
+            "_source": self._source_filter(fields, include_vector),
+        }
+        with tracing.span("retriever.neighbors", collection=collection_name, windows=len(windows)):
+            response = self._client.search(
+                index=index,
+                body=body,
+                filter_path=SEARCH_FILTER_PATH,
+                **params,
+            )
+        return [hit["_source"] for hit in response.get("hits", {}).get("hits", [])]
+
+    def _scope(self, collection_name: str) -> Tuple[str, Optional[str]]:
+        """Return the index holding a collection and the routing value for it."""
+        if self._shared_collection is None:
+            return collection_name, None
+        return self._shared_collection, collection_name
+
+    @staticmethod
+    def _source_filter(fields: Optional[List[str]], include_vector: bool) -> Any:
+        """Exclude the stored vector, which dominates the response size, unless requested."""
+        if fields is not None:
+            return list(fields) + ["vector"] if include_vector else list(fields)
+        if include_vector:
+            return True
+        return {"excludes": ["vector"]}
+
+    def _encode_queries(self, questions: List[str]) -> List[List[float]]:
+        with tracing.span("retriever.encode", questions=len(questions)):
+            query_embeddings = self._encoder.encode(
+                sentences=questions,
+                prompt_name="search_query",
+            )
+        if self._vector_options is not None:
+            query_embeddings = self._vector_options.prepare(query_embeddings)
+        return [
+            embedding.tolist() if hasattr(embedding, "tolist") else list(embedding)
+            for embedding in query_embeddings
+        ]
+
+    def _encode_query(self, question: str) -> List[float]:
+        with tracing.span("retriever.encode", questions=1):
+            query_embedding = self._encoder.encode(
+                sentences=question,
+                prompt_name="search_query",
+            )
+        if self._vector_options is not None:
+            query_embedding = self._vector_options.prepare(query_embedding)
+
         # Convert the embedding to a list if it's not already
         if hasattr(query_embedding, "tolist"):
             query_embedding = query_embedding.tolist()
+        return query_embedding
+
+    def _search_body(
+            self,
+            query_embedding: List[float],
+            top_k: int,
+            filters: Optional[Filters] = None,
+            clauses: Sequence[Dict[str, Any]] = (),
+    ) -> Dict[str, Any]:
+        clauses = filter_clauses(filters) + list(clauses)
+
+        # Collections created with vector options have an HNSW graph; nmslib
+        # cannot filter while traversing it, so filtered queries score exactly
+        if self._vector_options is not None and (not clauses or self._vector_options.engine != "nmslib"):
+            knn: Dict[str, Any] = {"vector": query_embedding, "k": top_k}
+            if clauses:
+                knn["filter"] = {"bool": {"filter": clauses}}
+            return {"size": top_k, "query": {"knn": {"vector": knn}}}
+
+        # Filters narrow the documents the script is evaluated on, so a
+        # filtered query scores fewer vectors than an unfiltered one
+        candidates = {"bool": {"filter": clauses}} if clauses else {"match_all": {}}
 
         # Create a script score query to calculate cosine similarity
-        search_body = {
+        return {
             "size": top_k,
             "query": {
                 "script_score": {
-                    "query": {"match_all": {}},
+                    "query": candidates,
                     "script": {
                         "source": "cosineSimilarity(params.query_vector, 'vector') + 1.0",
                         "params": {"query_vector": query_embedding}
@@ -109,59 +491,55 @@ class OpenSearchRetriever:
             }
         }
 
-        response = self._client.search(
-            index=collection_name,
-            body=search_body
-        )
-
-        # Format the results to match the expected output format
-        scored_points = []
-        for hit in response["hits"]["hits"]:
-            scored_point = {
-                "id": hit["_id"],
-                "payload": hit["_source"],
-                "score": hit["_score"],
-                "vector": hit["_source"].get("vector", [])
-            }
-            scored_points.append(scored_point)
-
-        return scored_points
-
-    def create_collection(self, collection_name: str) -> bool:
+    def create_collection(self, collection_name: str, number_of_shards: int = 1) -> bool:
         """Create a new index in OpenSearch.
+
+        With a shared collection this creates the shared index if needed.
         
         Args:
             collection_name: The name of the index to create
+            number_of_shards: The number of primary shards
             
         Returns:
             True if the index was created successfully
         """
+        collection_name, _ = self._scope(collection_name)
+
         # Check if the index already exists
         if self._client.indices.exists(index=collection_name):
             return False
 
+        dimension = self._encoder.get_sentence_embedding_dimension()
+        vector_field: Dict[str, Any] = {"type": "knn_vector", "dimension": dimension}
+        if self._vector_options is not None:
+            vector_field = self._vector_options.mapping(dimension)
+
         # Create the index with the appropriate mappings for vector search
         index_body = {
             "settings": {
-                "number_of_shards": 1,
+                "number_of_shards": number_of_shards,
                 "number_of_replicas": 0
             },
             "mappings": {
                 "properties": {
-                    "vector": {
-                        "type": "knn_vector",
-                        "dimension": self._encoder.get_sentence_embedding_dimension()
-                    },
-                    "title": {"type": "text"},
+                    "vector": vector_field,
+                    "title": {"type": "keyword"},
                     "content": {"type": "text"},
                     "length": {"type": "integer"},
                     "chunk_num": {"type": "integer"},
                     "chunk_amount": {"type": "integer"},
-                    "source_title": {"type": "text"}
+                    "source_title": {"type": "text"},
+                    "path": {"type": "keyword"},
+                    "content_hash": {"type": "keyword"},
+                    "library": {"type": "keyword"}
                 }
             }
         }
 
+        if self._vector_options is not None:
+            # Method-based mappings build a native k-NN graph
+            index_body["settings"]["index.knn"] = True
+
         response = self._client.indices.create(
             index=collection_name,
             body=index_body
@@ -171,6 +549,9 @@ class OpenSearchRetriever:
 
     def delete_collection(self, collection_name: str) -> bool:
         """Delete an index from OpenSearch.
+
+        With a shared collection only the documents of the library are
+        deleted, from the shard it is routed to.
         
         Args:
             collection_name: The name of the index to delete
@@ -178,108 +559,437 @@ class OpenSearchRetriever:
         Returns:
             True if the index was deleted successfully
         """
-        if not self._client.indices.exists(index=collection_name):
+        index, routing = self._scope(collection_name)
+        if not self._client.indices.exists(index=index):
             return False
 
+        if routing is not None:
+            response = self._client.delete_by_query(
+                index=index,
+                body={"query": {"term": {"library": collection_name}}},
+                routing=routing,
+                conflicts="proceed",
+            )
+            return response.get("deleted", 0) > 0
+
         response = self._client.indices.delete(index=collection_name)
         return response.get("acknowledged", False)
 
+    def refresh_collection(self, collection_name: str) -> None:
+        """Make every uploaded document searchable now instead of after the next refresh interval.
+
+        With a shared collection the whole shared index is refreshed.
+
+        Args:
+            collection_name: The name of the index or alias to refresh
+        """
+        index, _ = self._scope(collection_name)
+        self._client.indices.refresh(index=index)
+
     def upload_collection(
             self,
             collection_name: str,
-            data: List[Mapping[str, Any]],
+            data: Iterable[Mapping[str, Any]],
             payload_vectorize_field: str,
             batch_size: int = 100,
             show_progress_bar: bool = True,
-    ) -> None:
+            window_size: int = 1000,
+            delete_stale: bool = False,
+            id_namespace: Optional[str] = None,
+    ) -> BulkReport:
         """Upload a collection of documents to OpenSearch.
+
+        The data is consumed lazily in windows of ``window_size`` documents:
+        each window is encoded, bulk-indexed and released before the next one
+        is read, so peak memory does not depend on the size of the corpus.
+
+        Document IDs are derived from the collection name, the position of the
+        document and the hash of its vectorized text, so re-uploading the same
+        data skips documents that are already indexed.
         
         Args:
             collection_name: The name of the index to upload to
-            data: The data to upload
+            data: The data to upload, any iterable (e.g. ``read_jsonl(path)``)
             payload_vectorize_field: The field to use for vectorization
             batch_size: The batch size for encoding
             show_progress_bar: Whether to show a progress bar
+            window_size: The number of documents held in memory at once
+            delete_stale: Whether to delete indexed documents that are no
+                longer part of ``data``. Skipped if any document failed
+            id_namespace: The name document IDs are derived from, defaults to
+                ``collection_name``. Rebuilds write to a versioned index but
+                keep the IDs of the alias
+
+        Returns:
+            The bulk report listing the documents that failed to index
         """
-        # Create the index if it doesn't exist
-        if not self._client.indices.exists(index=collection_name):
-            self.create_collection(collection_name)
+        documents = (
+            keyed_document(id_namespace or collection_name, "", position, dict(item), item[payload_vectorize_field])
+            for position, item in enumerate(data)
+        )
+        return self._sync(
+            collection_name, documents, batch_size, show_progress_bar, window_size, delete_stale,
+        )
+
+    def upload_library(
+            self,
+            library: Union[LibrarySource, Iterable[CodeChunk]],
+            batch_size: int = 100,
+            collection_name: Optional[str] = None,
+            window_size: int = 1000,
+            delete_stale: bool = False,
+            id_namespace: Optional[str] = None,
+    ) -> BulkReport:
+        """Upload a library to OpenSearch.
 
-        texts: List[str] = [item[payload_vectorize_field] for item in data]
-        embeddings = self._encoder.encode(
-            sentences=texts,
-            batch_size=batch_size,
-            prompt_name="search_document",
-            show_progress_bar=show_progress_bar,
+        Chunks are encoded and indexed in windows of ``window_size``. IDs are
+        derived from the library title, file, chunk position and content hash:
+        chunks that are already indexed are neither encoded nor sent again,
+        see :meth:`upload_collection`.
+        
+        Args:
+            library: The library to upload, or any iterable of chunks
+                (e.g. ``read_jsonl(path, model=CodeChunk)``)
+            batch_size: The batch size for encoding
+            collection_name: The index to upload to. Defaults to the library
+                title and is required when ``library`` is a plain iterable
+            window_size: The number of chunks held in memory at once
+            delete_stale: Whether to delete indexed chunks that are no longer
+                part of the library. Skipped if any chunk failed
+            id_namespace: The name chunk IDs are derived from, see
+                :meth:`upload_collection`
+
+        Returns:
+            The bulk report listing the documents that failed to index
+        """
+        if isinstance(library, LibrarySource):
+            collection_name = collection_name or library.title
+            chunks: Iterable[CodeChunk] = library.chunks
+        elif collection_name is None:
+            raise ValueError("collection_name is required when uploading an iterable of chunks")
+        else:
+            chunks = library
+
+        documents = (
+            chunk_document(id_namespace or collection_name, chunk)
+            for chunk in chunks
+        )
+        return self._sync(
+            collection_name, documents, batch_size, True, window_size, delete_stale,
         )
 
-        # Bulk index the documents
-        bulk_data = []
-        for payload, embedding in zip(data, embeddings):
-            # Convert the embedding to a list if it's not already
-            if hasattr(embedding, "tolist"):
-                embedding = embedding.tolist()
+    def sync_file(
+            self,
+            path: str,
+            chunks: Iterable[CodeChunk],
+            collection_name: str,
+            batch_size: int = 100,
+    ) -> BulkReport:
+        """Replace the indexed chunks of one file with its current chunks.
 
-            # Add the vector to the payload
-            payload_with_vector = payload.copy()
-            payload_with_vector["vector"] = embedding
+        Only chunks with this ``path`` are compared: new or changed chunks are
+        encoded and indexed, unchanged ones are skipped and chunks the file no
+        longer has are deleted. Pass no chunks to remove a deleted file.
 
-            # Add the index operation
-            bulk_data.append({"index": {"_index": collection_name, "_id": uuid4().hex}})
-            bulk_data.append(payload_with_vector)
+        The collection is refreshed after any write: the next sync of the file
+        finds its indexed chunks with a search, which only sees refreshed
+        documents, so a quick second edit would otherwise leave stale chunks.
 
-            # If we've reached the batch size, index the documents
-            if len(bulk_data) >= batch_size * 2:
-                self._client.bulk(body=bulk_data)
-                bulk_data = []
+        Args:
+            path: The path the chunks carry, relative to the crawled directory
+                (see ``MarkdownCrawler.read_markdown_file``)
+            chunks: The current chunks of the file
+            collection_name: The collection holding the file
+            batch_size: The batch size for encoding
 
-        # Index any remaining documents
-        if bulk_data:
-            self._client.bulk(body=bulk_data)
+        Returns:
+            The bulk report of the indexed and deleted chunks
+        """
+        documents = (
+            chunk_document(collection_name, chunk)
+            for chunk in chunks
+        )
+        report = self._sync(
+            collection_name, documents, batch_size, False, batch_size, True, filters={"path": path},
+        )
+        if report.succeeded or report.deleted:
+            self.refresh_collection(collection_name)
+        return report
 
-    def upload_library(
+    def rebuild_collection(
             self,
-            library: LibrarySource,
+            alias: str,
+            data: Iterable[Mapping[str, Any]],
+            payload_vectorize_field: str,
             batch_size: int = 100,
-    ) -> None:
-        """Upload a library to OpenSearch.
-        
+            window_size: int = 1000,
+            number_of_replicas: Optional[int] = None,
+            force_merge: bool = True,
+            delete_previous: bool = True,
+    ) -> BulkReport:
+        """Rebuild a collection from scratch behind an alias.
+
+        The data is bulk-loaded into a new versioned index with refresh and
+        replicas disabled. Afterwards the settings are restored, the index is
+        optionally force-merged and ``alias`` is atomically switched to it, so
+        queries never see a half-built index.
+
         Args:
-            library: The library to upload
+            alias: The alias that is searched, e.g. the collection name
+            data: The data to upload, any iterable
+            payload_vectorize_field: The field to use for vectorization
             batch_size: The batch size for encoding
+            window_size: The number of documents held in memory at once
+            number_of_replicas: Replicas of the new index once loaded.
+                Defaults to the index settings of :meth:`create_collection`
+            force_merge: Whether to merge the new index into one segment
+            delete_previous: Whether to delete the indices the alias pointed to
+
+        Returns:
+            The bulk report. If any document failed the new index is dropped
+            and the alias is left untouched
         """
-        # Create the index if it doesn't exist
-        if not self._client.indices.exists(index=library.title):
-            self.create_collection(library.title)
-
-        texts = [item.markdown for item in library.chunks]
-        embeddings = self._encoder.encode(
-            sentences=texts,
-            batch_size=batch_size,
-            prompt_name="search_document",
-            show_progress_bar=True,
+        return self._rebuild(
+            alias,
+            lambda index: self.upload_collection(
+                index, data, payload_vectorize_field, batch_size, False, window_size, id_namespace=alias,
+            ),
+            number_of_replicas,
+            force_merge,
+            delete_previous,
         )
 
-        # Bulk index the documents
-        bulk_data = []
-        for chunk, embedding in zip(library.chunks, embeddings):
-            # Convert the embedding to a list if it's not already
-            if hasattr(embedding, "tolist"):
-                embedding = embedding.tolist()
-
-            # Add the vector to the payload
-            payload = chunk.model_dump()
-            payload["vector"] = embedding
-
-            # Add the index operation
-            bulk_data.append({"index": {"_index": library.title, "_id": uuid4().hex}})
-            bulk_data.append(payload)
-
-            # If we've reached the batch size, index the documents
-            if len(bulk_data) >= batch_size * 2:
-                self._client.bulk(body=bulk_data)
-                bulk_data = []
-
-        # Index any remaining documents
-        if bulk_data:
-            self._client.bulk(body=bulk_data)
+    def rebuild_library(
+            self,
+            library: LibrarySource,
+            alias: Optional[str] = None,
+            batch_size: int = 100,
+            window_size: int = 1000,
+            number_of_replicas: Optional[int] = None,
+            force_merge: bool = True,
+            delete_previous: bool = True,
+    ) -> BulkReport:
+        """Rebuild a library collection from scratch behind an alias.
+
+        See :meth:`rebuild_collection`. The alias defaults to the library title.
+        """
+        alias = alias or library.title
+        return self._rebuild(
+            alias,
+            lambda index: self.upload_library(
+                library, batch_size, collection_name=index, window_size=window_size, id_namespace=alias,
+            ),
+            number_of_replicas,
+            force_merge,
+            delete_previous,
+        )
+
+    def _rebuild(
+            self,
+            alias: str,
+            upload: Callable[[str], BulkReport],
+            number_of_replicas: Optional[int],
+            force_merge: bool,
+            delete_previous: bool,
+    ) -> BulkReport:
+        if self._shared_collection is not None:
+            raise ValueError("Rebuilds need an index per collection; use upload_library with a shared collection")
+
+        previous = self._alias_indices(alias)
+        index = f"{alias}-{time.strftime('%Y%m%d%H%M%S')}-{uuid4().hex[:6]}"
+        self.create_collection(index)
+
+        settings = self._client.indices.get_settings(index=index)[index]["settings"]["index"]
+        replicas = number_of_replicas
+        if replicas is None:
+            replicas = int(settings.get("number_of_replicas", 0))
+
+        try:
+            self._client.indices.put_settings(
+                index=index,
+                body={"index": {"refresh_interval": "-1", "number_of_replicas": 0}},
+            )
+            report = upload(index)
+            if not report.ok:
+                logger.error(
+                    "Rebuild of %s failed for %d documents, keeping the current index",
+                    alias,
+                    len(report.failed),
+                )
+                self._client.indices.delete(index=index)
+                return report
+
+            self._client.indices.put_settings(
+                index=index,
+                body={
+                    "index": {
+                        "refresh_interval": settings.get("refresh_interval"),
+                        "number_of_replicas": replicas,
+                    }
+                },
+            )
+            self._client.indices.refresh(index=index)
+            if force_merge:
+                self._client.indices.forcemerge(index=index, max_num_segments=1)
+        except Exception:
+            self._client.indices.delete(index=index, ignore=[404])
+            raise
+
+        actions = [{"remove": {"index": old, "alias": alias}} for old in previous]
+        actions.append({"add": {"index": index, "alias": alias}})
+        self._client.indices.update_aliases(body={"actions": actions})
+        logger.info("Alias %s now points to %s", alias, index)
+
+        if delete_previous:
+            for old in previous:
+                self._client.indices.delete(index=old, ignore=[404])
+
+        return report
+
+    def _alias_indices(self, alias: str) -> List[str]:
+        """Return the indices behind an alias, refusing names of concrete indices."""
+        if self._client.indices.exists_alias(name=alias):
+            return list(self._client.indices.get_alias(name=alias))
+        if self._client.indices.exists(index=alias):
+            raise ValueError(f"{alias} is an index, not an alias; delete or reindex it before rebuilding")
+        return []
+
+    def _sync(
+            self,
+            collection_name: str,
+            documents: Iterable[Tuple[str, Dict[str, Any], str]],
+            batch_size: int,
+            show_progress_bar: bool,
+            window_size: int,
+            delete_stale: bool,
+            filters: Optional[Filters] = None,
+    ) -> BulkReport:
+        """Index the documents that are not indexed yet and delete stale ones.
+
+        With ``filters`` only matching indexed documents are compared, so
+        stale documents outside them are left alone.
+        """
+        index, routing = self._scope(collection_name)
+        existing: Set[str] = set()
+        if self._client.indices.exists(index=index):
+            existing = self._existing_ids(index, routing, filters)
+        else:
+            self.create_collection(collection_name)
+
+        seen: Set[str] = set()
+
+        def changed() -> Iterator[Tuple[str, Dict[str, Any], str]]:
+            for doc_id, payload, text in documents:
+                # Identical chunks share an ID; index them once
+                if doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                if doc_id not in existing:
+                    if routing is not None:
+                        payload["library"] = collection_name
+                    yield doc_id, payload, text
+
+        report = self._upload_windows(
+            index, changed(), batch_size, show_progress_bar, window_size, routing,
+        )
+        report.skipped = len(seen & existing)
+
+        # A failed document still has its old copy among the stale ones
+        if delete_stale and report.ok:
+            stale = existing - seen
+            if stale:
+                deleted = self._bulk_indexer.index(
+                    {"_op_type": "delete", "_index": index, "_id": doc_id, "_routing": routing}
+                    for doc_id in stale
+                )
+                deleted.deleted, deleted.succeeded = deleted.succeeded, 0
+                report.merge(deleted)
+
+        return report
+
+    def _existing_ids(
+            self,
+            index: str,
+            library: Optional[str] = None,
+            filters: Optional[Filters] = None,
+    ) -> Set[str]:
+        """Collect the IDs of every document in the index (or library) without their sources."""
+        clauses = filter_clauses(filters)
+        params: Dict[str, Any] = {}
+        if library is not None:
+            clauses.append({"term": {"library": library}})
+            params["routing"] = library
+        query: Dict[str, Any] = {"match_all": {}}
+        if len(clauses) == 1:
+            query = clauses[0]
+        elif clauses:
+            query = {"bool": {"filter": clauses}}
+        from opensearchpy import helpers
+
+        with tracing.span("ingest.existing_ids", index=index) as span:
+            ids = {
+                hit["_id"]
+                for hit in helpers.scan(
+                    self._client,
+                    index=index,
+                    query={"query": query, "_source": False},
+                    size=1000,
+                    **params,
+                )
+            }
+            span.set(documents=len(ids))
+        return ids
+
+    def _upload_windows(
+            self,
+            collection_name: str,
+            documents: Iterable[Tuple[str, Dict[str, Any], str]],
+            batch_size: int,
+            show_progress_bar: bool,
+            window_size: int,
+            routing: Optional[str] = None,
+    ) -> BulkReport:
+        """Encode ``(id, payload, text)`` triples window by window and bulk-index them.
+
+        Encoding runs in a background thread up to one window ahead, while the
+        calling thread serializes the previous window and the bulk indexer
+        sends it, so bulk request size is independent of ``batch_size``.
+        """
+        return self._bulk_indexer.index(
+            prefetch(
+                self._encoded_actions(
+                    collection_name, documents, batch_size, show_progress_bar, window_size, routing,
+                ),
+                window_size,
+            )
+        )
+
+    def _encoded_actions(
+            self,
+            collection_name: str,
+            documents: Iterable[Tuple[str, Dict[str, Any], str]],
+            batch_size: int,
+            show_progress_bar: bool,
+            window_size: int,
+            routing: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        for window in batched(documents, window_size):
+            with tracing.span("ingest.encode", collection=collection_name, documents=len(window)):
+                embeddings = self._encoder.encode(
+                    sentences=[text for _, _, text in window],
+                    batch_size=batch_size,
+                    prompt_name="search_document",
+                    show_progress_bar=show_progress_bar,
+                )
+                if self._vector_options is not None:
+                    embeddings = self._vector_options.prepare(embeddings)
+
+            for (doc_id, payload, _), embedding in zip(window, embeddings):
+                # Convert the embedding to a list if it's not already
+                if hasattr(embedding, "tolist"):
+                    embedding = embedding.tolist()
+
+                # Add the vector to the payload
+                payload["vector"] = embedding
+
+                yield {"_index": collection_name, "_id": doc_id, "_source": payload, "_routing": routing}
@@ -0,0 +1,170 @@
+from typing import Any, Dict, List, Literal, Optional, Sequence
+
+import numpy as np
+from pydantic import BaseModel, model_validator
+
+from aidkits.encoders.base import Encoder
+
+_BYTES_PER_VALUE = {"float": 4, "float16": 2, "byte": 1}
+
+
+class VectorOptions(BaseModel):
+    """How embeddings are stored in the ``vector`` field.
+
+    Attributes:
+        dimension: Keep only the first ``dimension`` values of every embedding
+            (Matryoshka-style truncation) and re-normalize them
+        data_type: ``float`` stores float32, ``float16`` uses the faiss fp16
+            scalar quantizer and ``byte`` stores int8 values
+        engine: The k-NN engine of the HNSW graph
+        byte_scale: Multiplier applied to normalized values before rounding
+            them to int8, see :func:`calibrate_byte_scale`
+    """
+
+    dimension: Optional[int] = None
+    data_type: Literal["float", "float16", "byte"] = "float"
+    engine: Literal["faiss", "lucene", "nmslib"] = "faiss"
+    byte_scale: float = 127.0
+
+    @model_validator(mode="after")
+    def _check_engine(self) -> "VectorOptions":
+        if self.data_type == "float16" and self.engine != "faiss":
+            raise ValueError("float16 vectors require the faiss engine")
+        if self.data_type == "byte" and self.engine == "nmslib":
+            raise ValueError("byte vectors require the faiss or lucene engine")
+        return self
+
+    @property
+    def bytes_per_value(self) -> int:
+        return _BYTES_PER_VALUE[self.data_type]
+
+    def mapping(self, dimension: int) -> Dict[str, Any]:
+        """Return the ``knn_vector`` mapping for embeddings of ``dimension`` values."""
+        method: Dict[str, Any] = {
+            "name": "hnsw",
+            "engine": self.engine,
+            "space_type": "innerproduct",
+        }
+        field: Dict[str, Any] = {
+            "type": "knn_vector",
+            "dimension": min(dimension, self.dimension or dimension),
+            "method": method,
+        }
+        if self.data_type == "float16":
+            method["parameters"] = {
+                "encoder": {"name": "sq", "parameters": {"type": "fp16"}}
+            }
+        elif self.data_type == "byte":
+            field["data_type"] = "byte"
+        return field
+
+    def prepare(self, embeddings: np.ndarray) -> np.ndarray:
+        """Truncate, normalize and quantize a matrix (or a single vector) of embeddings."""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if self.dimension:
+            embeddings = embeddings[..., : self.dimension]
+        norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+        embeddings = embeddings / np.where(norms == 0, 1.0, norms)
+
+        if self.data_type == "float16":
+            return embeddings.astype(np.float16)
+        if self.data_type == "byte":
+            return np.clip(np.rint(embeddings * self.byte_scale), -128, 127).astype(
+                np.int8
+            )
+        return embeddings
+
+
+def calibrate_byte_scale(embeddings: np.ndarray, percentile: float = 99.9) -> float:
+    """Pick a ``byte_scale`` that maps the given percentile of normalized values onto 127.
+
+    Normalized embeddings rarely use the full ``[-1, 1]`` range, so the
+    default scale of 127 wastes most of the int8 resolution.
+    """
+    embeddings = VectorOptions().prepare(embeddings)
+    bound = float(np.percentile(np.abs(embeddings), percentile))
+    return 127.0 / bound if bound > 0 else 127.0
+
+
+class CompressionResult(BaseModel):
+    options: VectorOptions
+    bytes_per_vector: int
+    compression_ratio: float
+    recall_at_k: float
+
+
+def vector_size_report(
+    encoder: Encoder,
+    documents: Sequence[str],
+    queries: Sequence[str],
+    candidates: Sequence[VectorOptions],
+    top_k: int = 10,
+    batch_size: int = 32,
+) -> List[CompressionResult]:
+    """Compare storage settings by recall@k against full-precision search.
+
+    Documents and queries are encoded once; every candidate is then simulated
+    locally from the same embeddings, so the report costs a single encoding
+    pass regardless of the number of candidates.
+
+    Args:
+        encoder: The encoder used for the collection
+        documents: A representative sample of document texts
+        queries: Sample questions
+        candidates: The settings to compare
+        top_k: The k of recall@k
+        batch_size: The batch size for encoding
+
+    Returns:
+        One result per candidate, in the same order
+    """
+    document_embeddings = np.asarray(
+        encoder.encode(
+            list(documents), batch_size=batch_size, prompt_name="search_document"
+        ),
+        dtype=np.float32,
+    )
+    query_embeddings = np.asarray(
+        encoder.encode(
+            list(queries), batch_size=batch_size, prompt_name="search_query"
+        ),
+        dtype=np.float32,
+    )
+    top_k = min(top_k, len(documents))
+
+    reference = VectorOptions()
+    expected = _top_k(
+        reference.prepare(document_embeddings),
+        reference.prepare(query_embeddings),
+        top_k,
+    )
+    full_size = document_embeddings.shape[1] * reference.bytes_per_value
+
+    results = []
+    for options in candidates:
+        found = _top_k(
+            options.prepare(document_embeddings).astype(np.float32),
+            options.prepare(query_embeddings).astype(np.float32),
+            top_k,
+        )
+        hits = sum(len(set(e) & set(f)) for e, f in zip(expected, found))
+        dimension = min(
+            document_embeddings.shape[1],
+            options.dimension or document_embeddings.shape[1],
+        )
+        size = dimension * options.bytes_per_value
+        results.append(
+            CompressionResult(
+                options=options,
+                bytes_per_vector=size,
+                compression_ratio=full_size / size,
+                recall_at_k=hits / (len(queries) * top_k),
+            )
+        )
+    return results
+
+
+def _top_k(documents: np.ndarray, queries: np.ndarray, k: int) -> List[List[int]]:
+    scores = queries @ documents.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return top.tolist()
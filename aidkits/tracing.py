@@ -0,0 +1,209 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Stages are wrapped in span(). Without sinks, span() returns a shared no-op
+# context manager, so instrumentation costs a function call and a tuple check.
+
+
+class Span:
+    """A timed stage. Sinks may keep per-span state in ``state``."""
+
+    __slots__ = ("name", "attributes", "start", "duration", "error", "state")
+
+    def __init__(self, name: str, attributes: Dict[str, Any]) -> None:
+        self.name = name
+        self.attributes = attributes
+        self.start = 0.0
+        self.duration = 0.0
+        self.error: Optional[BaseException] = None
+        self.state: Dict[Any, Any] = {}
+
+    def set(self, **attributes: Any) -> None:
+        """Add attributes known only once the stage ran, e.g. result counts."""
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> "Span":
+        for sink in _sinks:
+            sink.on_start(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(
+        self, exc_type: Any, exc: Optional[BaseException], traceback: Any
+    ) -> None:
+        self.duration = time.perf_counter() - self.start
+        self.error = exc
+        for sink in _sinks:
+            try:
+                sink.on_end(self)
+            except Exception:
+                logger.exception("Tracing sink %r failed", sink)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Sink:
+    """Receives spans. Subclasses override ``on_end`` and optionally ``on_start``."""
+
+    def on_start(self, span: Span) -> None:
+        pass
+
+    def on_end(self, span: Span) -> None:
+        raise NotImplementedError("Subclasses must implement this method")
+
+
+class LoggingSink(Sink):
+    """Logs the duration of every stage."""
+
+    def __init__(
+        self, level: int = logging.DEBUG, target: Optional[logging.Logger] = None
+    ) -> None:
+        self.level = level
+        self.logger = target or logger
+
+    def on_end(self, span: Span) -> None:
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(
+                self.level,
+                "%s took %.2f ms%s %s",
+                span.name,
+                span.duration * 1000,
+                " (failed)" if span.error else "",
+                span.attributes,
+            )
+
+
+class HistogramSink(Sink):
+    """Keeps the latest durations of every stage in memory for percentiles."""
+
+    def __init__(self, max_samples: int = 10_000) -> None:
+        self.max_samples = max_samples
+        self._samples: Dict[str, Deque[float]] = {}
+        self._errors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def on_end(self, span: Span) -> None:
+        with self._lock:
+            samples = self._samples.get(span.name)
+            if samples is None:
+                samples = self._samples[span.name] = deque(maxlen=self.max_samples)
+            samples.append(span.duration)
+            if span.error is not None:
+                self._errors[span.name] = self._errors.get(span.name, 0) + 1
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Return count, errors, mean, p50, p95 and p99 in milliseconds per stage."""
+        import numpy as np
+
+        with self._lock:
+            samples = {
+                name: np.asarray(values) * 1000
+                for name, values in self._samples.items()
+            }
+            errors = dict(self._errors)
+        summary = {}
+        for name, values in sorted(samples.items()):
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            summary[name] = {
+                "count": len(values),
+                "errors": errors.get(name, 0),
+                "mean_ms": float(values.mean()),
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+                "p99_ms": float(p99),
+            }
+        return summary
+
+    def clear(self) -> None:
+        with self._lock:
+            self._samples.clear()
+            self._errors.clear()
+
+
+class OpenTelemetrySink(Sink):
+    """Exports stages as OpenTelemetry spans. Requires ``opentelemetry-api``."""
+
+    def __init__(self, tracer_name: str = "aidkits") -> None:
+        from opentelemetry import trace
+
+        self._trace = trace
+        self._tracer = trace.get_tracer(tracer_name)
+        self._active: ContextVar[Optional[Any]] = ContextVar(
+            f"aidkits_span_{id(self)}", default=None
+        )
+
+    def on_start(self, span: Span) -> None:
+        # Parented on the enclosing aidkits stage, else on the caller's current
+        # span. It is not made current itself: streaming stages stay open across
+        # yields, and a current span would parent whatever the caller runs in between
+        parent = self._active.get()
+        context = None if parent is None else self._trace.set_span_in_context(parent)
+        otel_span = self._tracer.start_span(
+            span.name, context=context, attributes=span.attributes
+        )
+        span.state[self] = otel_span, self._active.set(otel_span)
+
+    def on_end(self, span: Span) -> None:
+        started = span.state.pop(self, None)
+        if started is None:
+            # The sink was added while the stage was running
+            return
+        otel_span, token = started
+        try:
+            self._active.reset(token)
+        except ValueError:
+            # A stream consumed in another context, e.g. another thread, ends there
+            pass
+        otel_span.set_attributes(span.attributes)
+        if span.error is not None:
+            otel_span.record_exception(span.error)
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR))
+        otel_span.end()
+
+
+_sinks: Tuple[Sink, ...] = ()
+_sinks_lock = threading.Lock()
+
+
+def span(name: str, **attributes: Any) -> Any:
+    """Time a stage: ``with span("retriever.query", collection=name): ...``."""
+    if not _sinks:
+        return _NOOP_SPAN
+    return Span(name, attributes)
+
+
+def add_sink(sink: Sink) -> Sink:
+    global _sinks
+    with _sinks_lock:
+        _sinks = _sinks + (sink,)
+    return sink
+
+
+def remove_sink(sink: Sink) -> None:
+    global _sinks
+    with _sinks_lock:
+        _sinks = tuple(registered for registered in _sinks if registered is not sink)
+
+
+def enabled() -> bool:
+    return bool(_sinks)
@@ -0,0 +1,266 @@
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from pydantic import BaseModel, Field
+
+from aidkits import tracing
+from aidkits.parse import MarkdownCrawler
+from aidkits.pipeline import ingest
+from aidkits.sources import LocalFileSystem
+from aidkits.storage.bulk import BulkReport
+
+logger = logging.getLogger(__name__)
+
+# The modification time and size of a file, enough to notice an edit
+Stat = Tuple[int, int]
+
+
+def scan_markdown(directory: str) -> Dict[str, Stat]:
+    """Return the stat of every markdown file under the directory."""
+    files = {}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.endswith(".md"):
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files[path] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+class Watcher:
+    """Reports markdown files that were created, modified or deleted."""
+
+    def wait(self, timeout: float) -> Set[str]:
+        """Block for at most ``timeout`` seconds and return the paths changed since the last call."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class PollingWatcher(Watcher):
+    """Compares the modification time and size of every markdown file on each call.
+
+    Args:
+        directory: The directory to watch
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self._files = scan_markdown(directory)
+        self._closed = threading.Event()
+
+    def wait(self, timeout: float) -> Set[str]:
+        self._closed.wait(timeout)
+        files = scan_markdown(self.directory)
+        changed = {
+            path for path, stat in files.items() if self._files.get(path) != stat
+        }
+        changed |= self._files.keys() - files.keys()
+        self._files = files
+        return changed
+
+    def close(self) -> None:
+        self._closed.set()
+
+
+class NativeWatcher(Watcher):
+    """Receives file system events from ``watchdog`` (inotify, FSEvents or ReadDirectoryChangesW).
+
+    Requires ``watchdog``.
+
+    Args:
+        directory: The directory to watch, recursively
+    """
+
+    def __init__(self, directory: str) -> None:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        self._events: "queue.Queue[str]" = queue.Queue()
+        events = self._events
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event: Any) -> None:
+                if event.is_directory:
+                    return
+                for path in (event.src_path, getattr(event, "dest_path", "")):
+                    if path and os.fsdecode(path).endswith(".md"):
+                        events.put(os.fsdecode(path))
+
+        self._observer = Observer()
+        self._observer.schedule(Handler(), directory, recursive=True)
+        self._observer.start()
+
+    def wait(self, timeout: float) -> Set[str]:
+        try:
+            changed = {self._events.get(timeout=timeout)}
+        except queue.Empty:
+            return set()
+        while True:
+            try:
+                changed.add(self._events.get_nowait())
+            except queue.Empty:
+                return changed
+
+    def close(self) -> None:
+        self._observer.stop()
+        self._observer.join()
+
+
+def make_watcher(directory: str, polling: bool = False) -> Watcher:
+    """Watch with native file system events where ``watchdog`` is installed, by polling otherwise."""
+    if not polling:
+        try:
+            return NativeWatcher(directory)
+        except ImportError:
+            logger.info("watchdog is not installed, polling %s for changes", directory)
+    return PollingWatcher(directory)
+
+
+class SyncReport(BaseModel):
+    """The outcome of re-indexing one burst of changes.
+
+    Attributes:
+        updated: Files whose chunks were re-split and synchronized
+        removed: Deleted files whose chunks were removed
+        bulk: Indexed, skipped, deleted and failed chunks
+        seconds: Wall time of the synchronization
+    """
+
+    updated: int = 0
+    removed: int = 0
+    bulk: BulkReport = Field(default_factory=BulkReport)
+    seconds: float = 0.0
+
+
+class DirectoryWatch:
+    """Keeps a collection in sync with a local directory of markdown files.
+
+    Changes are collected until none arrived for ``debounce`` seconds, so a
+    burst (a checkout, an editor writing a temporary file and renaming it) is
+    synchronized once. Only the changed files are split again, and only their
+    chunks are compared with the index: unchanged chunks are skipped, changed
+    ones re-encoded and chunks of deleted files removed. Files are matched by
+    their path relative to ``directory``, so files with the same name in
+    different directories are kept apart.
+
+    Args:
+        directory: The local directory to watch
+        retriever: An ``OpenSearchRetriever`` or ``NumpyRetriever``
+        collection_name: The collection to keep in sync
+        debounce: Seconds without changes before a burst is synchronized
+        interval: Seconds between polls, or the longest wait for events
+        batch_size: The batch size for encoding
+        polling: Poll even when native events are available
+        crawler: The crawler splitting the files, a default one if omitted
+        on_sync: Called with the report of every synchronized burst
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        retriever: Any,
+        collection_name: str,
+        debounce: float = 0.5,
+        interval: float = 1.0,
+        batch_size: int = 100,
+        polling: bool = False,
+        crawler: Optional[MarkdownCrawler] = None,
+        on_sync: Optional[Callable[[SyncReport], None]] = None,
+    ) -> None:
+        self.directory = LocalFileSystem(directory).fetch()
+        self.retriever = retriever
+        self.collection_name = collection_name
+        self.debounce = debounce
+        self.interval = interval
+        self.batch_size = batch_size
+        self.polling = polling
+        self.crawler = crawler or MarkdownCrawler(self.directory)
+        self.on_sync = on_sync
+        self._stop = threading.Event()
+
+    def sync(self, paths: Set[str]) -> SyncReport:
+        """Synchronize the chunks of the given files, deleted or not."""
+        report = SyncReport()
+        start = time.perf_counter()
+        with tracing.span("watch.sync", files=len(paths)):
+            for path in sorted(paths):
+                relative = Path(os.path.relpath(path, self.directory)).as_posix()
+                if os.path.isfile(path):
+                    chunks = self.crawler.read_markdown_file(
+                        path, self.directory
+                    ).chunks
+                    report.updated += 1
+                else:
+                    chunks = []
+                    report.removed += 1
+                report.bulk.merge(
+                    self.retriever.sync_file(
+                        relative, chunks, self.collection_name, self.batch_size
+                    )
+                )
+        report.seconds = time.perf_counter() - start
+        logger.info(
+            "Synchronized %d changed and %d deleted files in %.2fs: %d indexed, %d deleted, %d failed",
+            report.updated,
+            report.removed,
+            report.seconds,
+            report.bulk.succeeded,
+            report.bulk.deleted,
+            len(report.bulk.failed),
+        )
+        if self.on_sync is not None:
+            self.on_sync(report)
+        return report
+
+    def run(self, initial_sync: bool = True) -> None:
+        """Watch until :meth:`stop` is called.
+
+        Args:
+            initial_sync: Ingest the whole directory first, so changes made
+                while nothing was watching are picked up
+        """
+        self._stop.clear()
+        watcher = make_watcher(self.directory, self.polling)
+        try:
+            if initial_sync:
+                ingest(
+                    self.directory,
+                    self.retriever,
+                    self.collection_name,
+                    batch_size=self.batch_size,
+                    crawler=self.crawler,
+                )
+                # Make the ingested chunks visible to the existing-ID scan of the first sync
+                self.retriever.refresh_collection(self.collection_name)
+
+            pending: Set[str] = set()
+            last_change = 0.0
+            while not self._stop.is_set():
+                changed = watcher.wait(
+                    min(self.interval, self.debounce) if pending else self.interval
+                )
+                if changed:
+                    pending |= changed
+                    last_change = time.monotonic()
+                elif pending and time.monotonic() - last_change >= self.debounce:
+                    paths, pending = pending, set()
+                    try:
+                        self.sync(paths)
+                    except Exception:
+                        # Keep watching; the files are retried on their next change
+                        logger.exception("Synchronizing %d files failed", len(paths))
+        finally:
+            watcher.close()
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+
+from aidkits.models import CodeChunk, LibrarySource
+from aidkits.storage.batching import batched, prefetch, read_jsonl
+
+
+def test_batched_splits_generator_lazily():
+    consumed = []
+
+    def numbers():
+        for i in range(5):
+            consumed.append(i)
+            yield i
+
+    batches = batched(numbers(), 2)
+    assert next(batches) == [0, 1]
+    assert consumed == [0, 1]
+    assert list(batches) == [[2, 3], [4]]
+
+
+def test_batched_rejects_empty_batches():
+    with pytest.raises(ValueError):
+        list(batched([1, 2], 0))
+
+
+def test_read_jsonl_roundtrip(tmp_path):
+    library = LibrarySource(
+        title="lib",
+        chunks=[
+            CodeChunk(title="a.md", content="A", length=1, chunk_num=1, chunk_amount=2),
+            CodeChunk(title="a.md", content="B", length=1, chunk_num=2, chunk_amount=2),
+        ],
+    )
+    path = tmp_path / "chunks.jsonl"
+    library.save_jsonl(str(path))
+
+    rows = list(read_jsonl(path))
+    assert [row["content"] for row in rows] == ["A", "B"]
+
+    chunks = list(read_jsonl(path, model=CodeChunk))
+    assert chunks == library.chunks
+
+
+def test_prefetch_keeps_order_and_bounds_the_buffer():
+    produced = []
+
+    def numbers():
+        for i in range(10):
+            produced.append(i)
+            yield i
+
+    items = prefetch(numbers(), 2)
+    assert next(items) == 0
+    time.sleep(0.05)
+    # One item handed over, two buffered and one blocked on the full queue
+    assert len(produced) <= 4
+    assert list(items) == list(range(1, 10))
+
+
+def test_prefetch_raises_producer_errors():
+    def failing():
+        yield 1
+        raise RuntimeError("crawl failed")
+
+    items = prefetch(failing(), 4)
+    assert next(items) == 1
+    with pytest.raises(RuntimeError, match="crawl failed"):
+        next(items)
+
+
+def test_prefetch_stops_the_producer_when_closed():
+    def endless():
+        while True:
+            yield 1
+
+    items = prefetch(endless(), 1)
+    assert next(items) == 1
+    items.close()
+    assert not any(thread.name == "prefetch" for thread in threading.enumerate())
@@ -0,0 +1,69 @@
+from aidkits.benchmarks.corpus import CorpusSpec, generate_corpus
+from aidkits.benchmarks.micro import compare_runs, load_runs, run_benchmarks, save_run
+from aidkits.parse import MarkdownCrawler
+
+
+def read_tree(root):
+    return {
+        path.relative_to(root).as_posix(): path.read_text(encoding="utf-8")
+        for path in root.rglob("*.md")
+    }
+
+
+def test_corpus_is_seeded(tmp_path):
+    spec = CorpusSpec(files=5, file_size=500, seed=7)
+
+    first = generate_corpus(tmp_path / "first", spec)
+    second = generate_corpus(tmp_path / "second", spec)
+    generate_corpus(tmp_path / "other", spec.model_copy(update={"seed": 8}))
+
+    assert first == second
+    assert read_tree(tmp_path / "first") == read_tree(tmp_path / "second")
+    assert read_tree(tmp_path / "first") != read_tree(tmp_path / "other")
+    assert first.files == len(read_tree(tmp_path / "first")) == 5
+    assert first.headers > 0
+
+
+def test_corpus_shape_follows_spec(tmp_path):
+    dense = generate_corpus(
+        tmp_path / "dense", CorpusSpec(files=5, header_density=8, code_fence_ratio=1)
+    )
+    flat = generate_corpus(
+        tmp_path / "flat",
+        CorpusSpec(files=5, header_density=0, code_fence_ratio=0, pathological_ratio=0),
+    )
+
+    assert dense.headers > flat.headers
+    assert flat.code_fences == 0 < dense.code_fences
+    crawler = MarkdownCrawler(str(tmp_path / "flat"), "", "")
+    assert all(
+        len(library.chunks) == 1
+        for library in crawler.collect_markdown_files(str(tmp_path / "flat"))
+    )
+
+
+def test_run_benchmarks_and_compare(tmp_path):
+    run = run_benchmarks(
+        CorpusSpec(files=3, file_size=300), repeats=1, workdir=tmp_path
+    )
+
+    assert [result.name for result in run.results] == [
+        "split_markdown_by_headers",
+        "collect_markdown_files",
+        "LibrarySource.model_dump_json",
+        "LibrarySource.model_validate_json",
+        "JsonSplitter.split_json_data",
+    ]
+    assert all(
+        result.throughput > 0 and result.peak_memory > 0 for result in run.results
+    )
+
+    history = tmp_path / "runs.jsonl"
+    save_run(run, history)
+    save_run(run, history)
+    baseline, current = load_runs(history)
+    ratios = compare_runs(baseline, current)
+    assert ratios["split_markdown_by_headers"] == {
+        "throughput": 1.0,
+        "peak_memory": 1.0,
+    }
@@ -0,0 +1,121 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from opensearchpy.exceptions import TransportError
+
+from aidkits.storage.bulk import BulkIndexer
+
+
+def actions(count, size=10):
+    return (
+        {"_index": "docs", "_id": str(i), "_source": {"text": "x" * size}}
+        for i in range(count)
+    )
+
+
+def ids(body):
+    lines = [json.loads(line) for line in body.decode("utf-8").splitlines()]
+    return [line["index"]["_id"] for line in lines if "index" in line]
+
+
+def respond(statuses=None):
+    statuses = statuses or {}
+
+    def bulk(body):
+        items = []
+        for doc_id in ids(body):
+            status = statuses.get(doc_id, [201])
+            code = status.pop(0) if len(status) > 1 else status[0]
+            item = {"_id": doc_id, "status": code}
+            if code >= 300:
+                item["error"] = {"type": "error"}
+            items.append({"index": item})
+        return {
+            "errors": any(i["index"]["status"] >= 300 for i in items),
+            "items": items,
+        }
+
+    return bulk
+
+
+@pytest.fixture
+def client():
+    client = MagicMock()
+    client.bulk.side_effect = respond()
+    return client
+
+
+def test_batches_by_target_bytes(client):
+    indexer = BulkIndexer(client, max_workers=2, target_bytes=200)
+
+    report = indexer.index(actions(10))
+
+    assert report.succeeded == 10
+    assert client.bulk.call_count > 1
+    for call in client.bulk.call_args_list:
+        assert len(call.kwargs["body"]) <= 200
+
+
+def test_retries_rejected_items(client):
+    client.bulk.side_effect = respond({"1": [429, 429, 201]})
+    indexer = BulkIndexer(client, initial_backoff=0)
+
+    report = indexer.index(actions(3))
+
+    assert report.ok
+    assert report.succeeded == 3
+    assert report.retries == 2
+    assert ids(client.bulk.call_args.kwargs["body"]) == ["1"]
+
+
+def test_retries_rejected_requests(client):
+    bulk = respond()
+    errors = [TransportError(429, "too_many_requests")]
+
+    def flaky(body):
+        if errors:
+            raise errors.pop()
+        return bulk(body)
+
+    client.bulk.side_effect = flaky
+    report = BulkIndexer(client, initial_backoff=0).index(actions(2))
+
+    assert report.succeeded == 2
+    assert report.requests == 2
+
+
+def test_reports_failed_documents(client):
+    client.bulk.side_effect = respond({"2": [400]})
+
+    report = BulkIndexer(client, initial_backoff=0).index(actions(3))
+
+    assert not report.ok
+    assert report.succeeded == 2
+    assert [(f.id, f.status) for f in report.failed] == [("2", 400)]
+
+
+def test_gives_up_after_max_retries(client):
+    client.bulk.side_effect = respond({"0": [429]})
+
+    report = BulkIndexer(client, max_retries=2, initial_backoff=0).index(actions(1))
+
+    assert [(f.id, f.status) for f in report.failed] == [("0", 429)]
+    assert report.requests == 3
+
+
+def test_splits_too_large_requests(client):
+    bulk = respond()
+
+    def limited(body):
+        if len(ids(body)) > 2:
+            raise TransportError(413, "request too large")
+        return bulk(body)
+
+    client.bulk.side_effect = limited
+    indexer = BulkIndexer(client, max_workers=1)
+
+    report = indexer.index(actions(8))
+
+    assert report.succeeded == 8
+    assert indexer.target_bytes < 5 * 1024 * 1024
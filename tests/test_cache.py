@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+from aidkits.cache import (
+    AnswerCache,
+    CacheEntry,
+    InMemoryCacheStore,
+    SqliteCacheStore,
+    evidence_key,
+    normalize_question,
+)
+from aidkits.models import CodeChunk
+
+
+def make_chunk(content, chunk_num=1):
+    return CodeChunk(
+        title="a.md",
+        content=content,
+        length=len(content),
+        chunk_num=chunk_num,
+        chunk_amount=2,
+    )
+
+
+def entry(answer, created_at=1000.0):
+    return CacheEntry(question="q", answer=answer, created_at=created_at)
+
+
+class KeywordEncoder:
+    """Embeds questions by the presence of a few keywords."""
+
+    words = ["install", "upgrade", "logging"]
+
+    def encode(self, sentences, **kwargs):
+        return np.array(
+            [float(word in sentences.lower()) for word in self.words] + [0.1],
+            dtype=np.float32,
+        )
+
+
+def test_normalize_question():
+    assert normalize_question("  How do I  INSTALL it?? ") == "how do i install it"
+
+
+def test_evidence_key_follows_document_ids_and_content():
+    first, second = make_chunk("A"), make_chunk("B", chunk_num=2)
+
+    assert evidence_key("docs", [first, second]) == evidence_key(
+        "docs", [second, first]
+    )
+    assert evidence_key("docs", [first]) != evidence_key(
+        "docs", [make_chunk("A changed")]
+    )
+    assert evidence_key("docs", [first]) != evidence_key("other", [first])
+
+
+def test_evidence_key_tells_same_named_files_apart():
+    first = make_chunk("A").model_copy(update={"path": "a/a.md"})
+    second = make_chunk("A").model_copy(update={"path": "b/a.md"})
+
+    assert evidence_key("docs", [first]) != evidence_key("docs", [second])
+    assert evidence_key("docs", [first, second]) == evidence_key(
+        "docs", [second, first]
+    )
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "memory":
+            return InMemoryCacheStore(**kwargs)
+        return SqliteCacheStore(tmp_path / "cache.db", **kwargs)
+
+    return make
+
+
+def test_store_evicts_least_recently_used(make_store, monkeypatch):
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr("aidkits.cache.time.time", lambda: next(clock))
+    store = make_store(max_entries=2)
+
+    store.put("e1", "a", entry("A"))
+    store.put("e2", "b", entry("B"))
+    assert [e.answer for _, e in store.get("e1")] == ["A"]
+    store.put("e3", "c", entry("C"))
+
+    assert store.get("e2") == []
+    assert [key for key, _ in store.get("e1")] == ["a"]
+    assert len(store) == 2
+
+
+def test_store_expires_entries(make_store, monkeypatch):
+    monkeypatch.setattr("aidkits.cache.time.time", lambda: 1100.0)
+    store = make_store(ttl=60)
+
+    store.put("e", "old", entry("old", created_at=1000.0))
+    store.put("e", "new", entry("new", created_at=1090.0))
+
+    assert [key for key, _ in store.get("e")] == ["new"]
+    store.clear()
+    assert store.get("e") == []
+
+
+def test_answer_cache_matches_normalized_questions():
+    cache = AnswerCache()
+    cache.remember("How to install?", "evidence", "pip install")
+
+    assert cache.lookup("how to   install", "evidence") == "pip install"
+    assert cache.lookup("how to install", "other evidence") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_answer_cache_matches_similar_questions():
+    cache = AnswerCache(encoder=KeywordEncoder(), similarity_threshold=0.9)
+    cache.remember("How to install?", "evidence", "pip install")
+
+    assert cache.lookup("Installation steps: install", "evidence") == "pip install"
+    assert cache.lookup("How to configure logging?", "evidence") is None
@@ -0,0 +1,118 @@
+from aidkits.context import TRIM_MARKER, estimate_tokens, pack_context
+from aidkits.models import CodeChunk
+
+
+def words(text):
+    return len(text.split())
+
+
+def chunk(title, chunk_num, content, chunk_amount=5, tokens=None, path=None):
+    return CodeChunk(
+        title=title,
+        path=path,
+        content=content,
+        length=len(content),
+        chunk_num=chunk_num,
+        chunk_amount=chunk_amount,
+        tokens=tokens,
+    )
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcde") == 2
+
+
+def test_pack_groups_files_and_writes_titles_once():
+    chunks = [
+        chunk("a.md", 3, "third"),
+        chunk("b.md", 1, "other"),
+        chunk("a.md", 2, "second"),
+        chunk("a.md", 3, "third"),
+    ]
+
+    packed = pack_context(chunks, max_tokens=1000, token_counter=words)
+
+    assert (
+        packed.text
+        == "a.md\n\nChunk 2/5\n\nsecond\n\nChunk 3/5\n\nthird\n\nb.md\n\nChunk 1/5\n\nother"
+    )
+    assert packed.text.count("a.md") == 1
+    assert [c.content for c in packed.chunks] == ["third", "other", "second"]
+    assert packed.tokens == words(packed.text)
+
+
+def test_pack_respects_budget_in_rank_order():
+    chunks = [
+        chunk("a.md", 1, "one two three"),
+        chunk("a.md", 2, "x " * 100),
+        chunk("b.md", 1, "small"),
+    ]
+
+    packed = pack_context(
+        chunks, max_tokens=14, token_counter=words, min_trimmed_tokens=8
+    )
+
+    assert [c.content for c in packed.chunks] == ["one two three", "small"]
+    assert packed.dropped == 1
+    assert packed.tokens <= 14
+
+
+def test_pack_trims_oversized_chunks():
+    long = " ".join(f"w{i}" for i in range(100))
+
+    packed = pack_context(
+        [chunk("a.md", 1, long)],
+        max_tokens=30,
+        token_counter=words,
+        min_trimmed_tokens=5,
+    )
+
+    assert packed.trimmed == 1
+    assert packed.text.endswith(TRIM_MARKER)
+    assert packed.tokens <= 30
+    capped = pack_context(
+        [chunk("a.md", 1, long)],
+        max_tokens=1000,
+        token_counter=words,
+        max_chunk_tokens=10,
+    )
+    assert capped.trimmed == 1 and capped.tokens < 20
+
+
+def test_pack_groups_same_named_files_by_path():
+    chunks = [
+        chunk("README.md", 1, "first", path="a/README.md"),
+        chunk("README.md", 1, "first", path="b/README.md"),
+        chunk("README.md", 2, "second", path="a/README.md"),
+    ]
+
+    packed = pack_context(chunks, max_tokens=1000, token_counter=words)
+
+    assert packed.text == (
+        "a/README.md\n\nChunk 1/5\n\nfirst\n\nChunk 2/5\n\nsecond\n\nb/README.md\n\nChunk 1/5\n\nfirst"
+    )
+    assert len(packed.chunks) == 3
+
+
+def test_pack_uses_precomputed_tokens_with_the_default_counter():
+    # 400 characters estimate to 100 tokens; the precomputed count lets the chunk fit whole
+    packed = pack_context([chunk("a.md", 1, "x" * 400, tokens=3)], max_tokens=50)
+
+    assert packed.trimmed == 0
+
+
+def test_pack_counts_contents_with_a_custom_counter():
+    counted = []
+
+    def counter(text):
+        counted.append(text)
+        return words(text)
+
+    pack_context(
+        [chunk("a.md", 1, "counted again", tokens=30)],
+        max_tokens=100,
+        token_counter=counter,
+    )
+
+    assert "counted again" in counted
@@ -0,0 +1,217 @@
+import asyncio
+from typing import Any, Iterator, List, Optional
+from unittest.mock import MagicMock
+
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from aidkits.documentation_tool import DocumentationTool, TokensCounter
+from aidkits.models import CodeChunk
+
+
+class EchoChatModel(BaseChatModel):
+    """Answers with a fixed text and reports the prompt length in words as usage."""
+
+    answer: str = "Use the install command"
+
+    @property
+    def _llm_type(self) -> str:
+        return "echo"
+
+    def _usage(self, messages: List[BaseMessage]) -> dict:
+        prompt_tokens = sum(len(message.content.split()) for message in messages)
+        completion_tokens = len(self.answer.split())
+        return {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = AIMessage(content=self.answer, usage_metadata=self._usage(messages))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        words = self.answer.split(" ")
+        for i, word in enumerate(words):
+            text = word if i == 0 else " " + word
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text))
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(content="", usage_metadata=self._usage(messages))
+        )
+
+
+@pytest.fixture
+def retriever():
+    retriever = MagicMock()
+    retriever.search.return_value = [
+        CodeChunk(
+            title="install.md",
+            content="pip install aidkits",
+            length=19,
+            chunk_num=1,
+            chunk_amount=1,
+        ),
+    ]
+    return retriever
+
+
+def make_tool(retriever, tokens_counter=None):
+    return DocumentationTool(
+        EchoChatModel(), retriever, "docs", tokens_counter=tokens_counter
+    )
+
+
+def test_invoke_fills_prompt_and_counts_tokens(retriever):
+    counter = TokensCounter()
+    llm = EchoChatModel()
+    tool = DocumentationTool(llm, retriever, "docs", top_k=3, tokens_counter=counter)
+
+    assert tool.invoke({"question": "How to install?"}) == "Use the install command"
+    retriever.search.assert_called_once_with(
+        question="How to install?",
+        collection_name="docs",
+        top_k=3,
+        neighbors=0,
+    )
+    assert counter.completion_tokens == 4
+    assert counter.prompt_tokens > 0
+    assert counter.total_tokens == counter.prompt_tokens + counter.completion_tokens
+
+
+def test_stream_yields_tokens_and_counts_usage_at_the_end(retriever):
+    counter = TokensCounter()
+    tool = make_tool(retriever, counter)
+
+    stream = tool.stream({"question": "How to install?"})
+    first = next(stream)
+    assert first == "Use"
+    assert counter.total_tokens == 0
+
+    assert first + "".join(stream) == "Use the install command"
+    invoked = TokensCounter()
+    make_tool(retriever, invoked).invoke({"question": "How to install?"})
+    assert (counter.prompt_tokens, counter.completion_tokens, counter.total_tokens) == (
+        invoked.prompt_tokens,
+        invoked.completion_tokens,
+        invoked.total_tokens,
+    )
+
+
+def test_astream_yields_the_same_answer(retriever):
+    counter = TokensCounter()
+    tool = make_tool(retriever, counter)
+
+    async def collect():
+        return [chunk async for chunk in tool.astream({"question": "How to install?"})]
+
+    chunks = asyncio.run(collect())
+
+    assert "".join(chunks) == "Use the install command"
+    assert len(chunks) > 1
+    assert counter.completion_tokens == 4
+
+
+class FailingChatModel(EchoChatModel):
+    """Fails for prompts that mention the word ``fail``."""
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if "fail" in messages[-1].content:
+            raise RuntimeError("model failed")
+        return super()._generate(messages, stop, run_manager, **kwargs)
+
+
+@pytest.fixture
+def batch_retriever():
+    chunk = CodeChunk(
+        title="install.md",
+        content="pip install aidkits",
+        length=19,
+        chunk_num=1,
+        chunk_amount=1,
+    )
+    retriever = MagicMock()
+    retriever.search_batch.side_effect = lambda questions, **kwargs: [
+        ValueError("search failed") if "broken" in question else [chunk]
+        for question in questions
+    ]
+    return retriever
+
+
+def test_batch_retrieves_once_and_keeps_errors_in_order(batch_retriever):
+    counter = TokensCounter()
+    tool = DocumentationTool(
+        FailingChatModel(), batch_retriever, "docs", tokens_counter=counter
+    )
+    questions = ["How to install?", "broken question", "please fail", "And upgrade?"]
+
+    results = tool.batch(
+        [{"question": question} for question in questions], max_concurrency=2
+    )
+
+    batch_retriever.search_batch.assert_called_once()
+    assert batch_retriever.search_batch.call_args.kwargs["questions"] == questions
+    assert results[0] == results[3] == "Use the install command"
+    assert isinstance(results[1], ValueError)
+    assert isinstance(results[2], RuntimeError)
+    assert counter.completion_tokens == 8
+
+
+def test_abatch_and_ainvoke(batch_retriever, retriever):
+    tool = DocumentationTool(FailingChatModel(), batch_retriever, "docs")
+
+    results = asyncio.run(
+        tool.abatch([{"question": "please fail"}, {"question": "How to install?"}])
+    )
+    answer = asyncio.run(make_tool(retriever).ainvoke({"question": "How to install?"}))
+
+    assert isinstance(results[0], RuntimeError)
+    assert results[1] == "Use the install command"
+    assert answer == "Use the install command"
+
+
+def test_answer_cache_skips_llm_until_evidence_changes(retriever):
+    from aidkits.cache import AnswerCache
+
+    counter = TokensCounter()
+    tool = DocumentationTool(
+        EchoChatModel(),
+        retriever,
+        "docs",
+        tokens_counter=counter,
+        answer_cache=AnswerCache(),
+    )
+
+    assert tool.invoke({"question": "How to install?"}) == "Use the install command"
+    calls = counter.completion_tokens
+    assert (
+        "".join(tool.stream({"question": "how to install"}))
+        == "Use the install command"
+    )
+    assert counter.completion_tokens == calls
+
+    retriever.search.return_value = [
+        CodeChunk(
+            title="install.md",
+            content="uv add aidkits",
+            length=14,
+            chunk_num=1,
+            chunk_amount=1,
+        ),
+    ]
+    tool.invoke({"question": "How to install?"})
+    assert counter.completion_tokens == 2 * calls
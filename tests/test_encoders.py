@@ -0,0 +1,203 @@
+import json
+from functools import partial
+
+import numpy as np
+import pytest
+
+from aidkits.encoders.benchmark import benchmark_encoders
+from aidkits.encoders.bucketing import LengthBucketedEncoder, length_batches
+from aidkits.encoders.pool_encoder import MultiProcessEncoder
+
+VOCAB = {"[PAD]": 0, "[UNK]": 1, "hello": 2, "world": 3, "query:": 4}
+
+
+class HashEncoder:
+    """Picklable stand-in that maps every sentence to a vector derived from its length."""
+
+    def __init__(self, dimension: int = 4):
+        self.dimension = dimension
+
+    def encode(
+        self,
+        sentences,
+        batch_size=32,
+        prompt_name=None,
+        show_progress_bar=None,
+        **kwargs,
+    ):
+        texts = [sentences] if isinstance(sentences, str) else sentences
+        vectors = np.array(
+            [[len(text) + i for i in range(self.dimension)] for text in texts],
+            dtype=np.float32,
+        )
+        return vectors[0] if isinstance(sentences, str) else vectors
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+
+@pytest.fixture
+def onnx_dir(tmp_path):
+    onnx = pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    tokenizers = pytest.importorskip("tokenizers")
+    from onnx import TensorProto, helper, numpy_helper
+
+    table = np.eye(len(VOCAB), 3, dtype=np.float32) + 0.1
+    graph = helper.make_graph(
+        [helper.make_node("Gather", ["table", "input_ids"], ["last_hidden_state"])],
+        "embedding",
+        [
+            helper.make_tensor_value_info(
+                "input_ids", TensorProto.INT64, ["batch", "sequence"]
+            ),
+            helper.make_tensor_value_info(
+                "attention_mask", TensorProto.INT64, ["batch", "sequence"]
+            ),
+        ],
+        [
+            helper.make_tensor_value_info(
+                "last_hidden_state", TensorProto.FLOAT, ["batch", "sequence", 3]
+            )
+        ],
+        [numpy_helper.from_array(table, "table")],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 17)])
+    model.ir_version = 8
+    onnx.save(model, str(tmp_path / "model.onnx"))
+
+    tokenizer = tokenizers.Tokenizer(
+        tokenizers.models.WordLevel(VOCAB, unk_token="[UNK]")
+    )
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.Whitespace()
+    tokenizer.save(str(tmp_path / "tokenizer.json"))
+
+    config = {
+        "pooling": "mean",
+        "normalize": True,
+        "prompts": {"search_query": "query: "},
+    }
+    (tmp_path / "aidkits_onnx.json").write_text(json.dumps(config), encoding="utf-8")
+    return tmp_path
+
+
+def test_onnx_encoder_pools_and_normalizes(onnx_dir):
+    from aidkits.encoders.onnx_encoder import OnnxEncoder
+
+    encoder = OnnxEncoder.from_pretrained(onnx_dir)
+    embeddings = encoder.encode(["hello", "hello world"], batch_size=1)
+
+    assert embeddings.shape == (2, 3)
+    np.testing.assert_allclose(np.linalg.norm(embeddings, axis=1), 1.0, rtol=1e-5)
+    assert encoder.get_sentence_embedding_dimension() == 3
+
+    # Padding of the shorter sentence must not change its embedding
+    padded = encoder.encode(["hello", "hello world"], batch_size=2)
+    np.testing.assert_allclose(padded, embeddings, rtol=1e-5)
+
+
+def test_onnx_encoder_applies_prompts(onnx_dir):
+    from aidkits.encoders.onnx_encoder import OnnxEncoder
+
+    encoder = OnnxEncoder.from_pretrained(onnx_dir)
+    plain = encoder.encode("hello")
+    query = encoder.encode("hello", prompt_name="search_query")
+
+    assert plain.shape == (3,)
+    assert not np.allclose(plain, query)
+    np.testing.assert_allclose(query, encoder.encode("query: hello"), rtol=1e-5)
+
+
+def test_onnx_encoder_rejects_unknown_pooling(onnx_dir):
+    from aidkits.encoders.onnx_encoder import OnnxEncoder
+
+    with pytest.raises(ValueError):
+        OnnxEncoder(onnx_dir / "model.onnx", onnx_dir / "tokenizer.json", pooling="sum")
+
+
+def test_multi_process_encoder_keeps_input_order():
+    sentences = ["a" * length for length in range(1, 12)]
+
+    with MultiProcessEncoder(
+        partial(HashEncoder, 4), processes=2, chunk_size=3
+    ) as encoder:
+        embeddings = encoder.encode(sentences)
+        single = encoder.encode("abc")
+        empty = encoder.encode([])
+        dimension = encoder.get_sentence_embedding_dimension()
+
+    np.testing.assert_array_equal(embeddings, HashEncoder(4).encode(sentences))
+    np.testing.assert_array_equal(single, HashEncoder(4).encode("abc"))
+    assert empty.shape == (0, 4)
+    assert dimension == 4
+
+
+def test_benchmark_reports_drift_against_reference():
+    texts = ["one", "three", "seventeen"]
+
+    class Negated(HashEncoder):
+        def encode(self, sentences, **kwargs):
+            return -super().encode(sentences, **kwargs)
+
+    results = benchmark_encoders(
+        HashEncoder(), {"same": HashEncoder(), "negated": Negated()}, texts, warmup=0
+    )
+
+    assert [result.name for result in results] == ["reference", "same", "negated"]
+    assert all(result.texts == 3 for result in results)
+    assert results[1].mean_cosine == pytest.approx(1.0)
+    assert results[2].min_cosine == pytest.approx(-1.0)
+
+
+def test_onnx_encoder_counts_tokens(onnx_dir):
+    from aidkits.encoders.onnx_encoder import OnnxEncoder
+
+    encoder = OnnxEncoder.from_pretrained(onnx_dir)
+
+    assert encoder.count_tokens(["hello", "hello world world"]) == [1, 3]
+
+
+def test_length_batches_respect_token_budget():
+    lengths = [2, 50, 3, 40, 2, 2]
+
+    batches = length_batches(lengths, max_tokens=60)
+
+    assert sorted(i for batch in batches for i in batch) == list(range(len(lengths)))
+    assert batches[0] == [1]
+    for batch in batches:
+        assert len(batch) == 1 or len(batch) * max(lengths[i] for i in batch) <= 60
+    assert length_batches(lengths, max_tokens=1000, max_batch_size=4) == [
+        [1, 3, 2, 0],
+        [4, 5],
+    ]
+    with pytest.raises(ValueError):
+        length_batches(lengths, max_tokens=0)
+
+
+def test_length_bucketed_encoder_restores_order_and_reports_waste():
+    inner = HashEncoder(2)
+    calls = []
+    encode = inner.encode
+
+    def recording_encode(sentences, **kwargs):
+        calls.append(list(sentences))
+        return encode(sentences, **kwargs)
+
+    inner.encode = recording_encode
+    texts = ["x" * 400, "a", "b", "y" * 360, "c", "d"]
+    encoder = LengthBucketedEncoder(
+        inner, max_tokens=150, counter=lambda batch: [len(t) // 4 + 1 for t in batch]
+    )
+
+    embeddings = encoder.encode(texts, batch_size=3)
+
+    np.testing.assert_array_equal(embeddings, HashEncoder(2).encode(texts))
+    assert calls == [["x" * 400], ["y" * 360], ["a", "b", "c", "d"]]
+    report = encoder.report
+    assert report.texts == 6 and report.tokens == 101 + 1 + 1 + 91 + 1 + 1
+    assert report.padded_tokens_before == 3 * 101 + 3 * 91
+    assert report.padded_tokens_after == 101 + 91 + 4
+    assert report.waste_after < report.waste_before
+
+    np.testing.assert_array_equal(encoder.encode("a"), HashEncoder(2).encode("a"))
+    assert encoder.report.texts == 6
@@ -0,0 +1,37 @@
+import pytest
+
+from aidkits.storage.filters import filter_clauses, matches
+
+FILTERS = {
+    "title": ["a.md", "b.md"],
+    "chunk_num": {"gte": 2, "lte": 4},
+    "library": "docs",
+}
+
+
+def test_filter_clauses():
+    assert filter_clauses(FILTERS) == [
+        {"terms": {"title": ["a.md", "b.md"]}},
+        {"range": {"chunk_num": {"gte": 2, "lte": 4}}},
+        {"term": {"library": "docs"}},
+    ]
+    assert filter_clauses(None) == []
+
+
+@pytest.mark.parametrize(
+    "payload,expected",
+    [
+        ({"title": "a.md", "chunk_num": 3, "library": "docs"}, True),
+        ({"title": "c.md", "chunk_num": 3, "library": "docs"}, False),
+        ({"title": "b.md", "chunk_num": 5, "library": "docs"}, False),
+        ({"title": "b.md", "library": "docs"}, False),
+        ({"title": "b.md", "chunk_num": 2, "library": "other"}, False),
+    ],
+)
+def test_matches(payload, expected):
+    assert matches(FILTERS, payload) is expected
+
+
+def test_unknown_range_operator():
+    with pytest.raises(ValueError):
+        filter_clauses({"chunk_num": {"between": 2}})
@@ -0,0 +1,67 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# Cumulative import time allowed per entry point. The slowest ones take about
+# 300 ms under -X importtime, so slow CI machines stay well within it
+IMPORT_BUDGET_MS = 1000
+
+HEAVY = (
+    "sentence_transformers",
+    "torch",
+    "opensearchpy",
+    "langchain_core",
+    "git",
+    "numpy",
+)
+
+# Entry point -> the heavy dependencies it may load at import time
+ENTRY_POINTS = {
+    "aidkits": (),
+    "aidkits.parse": (),
+    "aidkits.json_splitter": (),
+    "aidkits.main": (),
+    "aidkits.cli": (),
+    "aidkits.pipeline": (),
+    "aidkits.watch": (),
+    "aidkits.storage.opensearch_retriever": ("numpy",),
+    "aidkits.storage.numpy_retriever": ("numpy",),
+    "aidkits.documentation_tool": ("numpy",),
+}
+
+
+def import_profile(module):
+    """Import a module in a fresh interpreter; return its cumulative import time and the heavy modules loaded."""
+    code = (
+        f"import sys, {module}\n"
+        f"print(','.join(name for name in {HEAVY!r} if name in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=Path(__file__).resolve().parents[1],
+    )
+    cumulative = 0
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            cumulative = int(parts[1])
+    loaded = set(filter(None, result.stdout.strip().split(",")))
+    return cumulative / 1000, loaded
+
+
+@pytest.mark.parametrize("module", sorted(ENTRY_POINTS))
+def test_entry_point_imports_stay_light(module):
+    milliseconds, loaded = import_profile(module)
+
+    assert loaded <= set(ENTRY_POINTS[module]), (
+        f"{module} imports {sorted(loaded - set(ENTRY_POINTS[module]))}"
+    )
+    assert milliseconds < IMPORT_BUDGET_MS, (
+        f"{module} takes {milliseconds:.0f} ms to import"
+    )
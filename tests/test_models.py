@@ -168,3 +168,36 @@ def test_librarysource_from_json():
         assert library_source.chunks[0].content == "Sample content 1"
     finally:
         os.remove(path)
+
+
+def test_lazy_code_chunk_reads_and_serializes_its_location(tmp_path):
+    from aidkits.models import ChunkLocation, LazyCodeChunk
+    from aidkits.storage.ids import chunk_document
+
+    path = tmp_path / "doc.md"
+    path.write_bytes(b"skip\n# Title\nbody\n")
+    location = ChunkLocation(
+        path=str(path),
+        offset=5,
+        size=12,
+        start_line=2,
+        end_line=3,
+        header_path=["Title"],
+    )
+    chunk = LazyCodeChunk(
+        title="doc.md", length=12, chunk_num=2, chunk_amount=2, location=location
+    )
+    eager = CodeChunk(
+        title="doc.md", content="# Title\nbody", length=12, chunk_num=2, chunk_amount=2
+    )
+
+    assert chunk.content == "# Title\nbody"
+    assert chunk.markdown == eager.markdown
+    assert chunk.load() == eager
+    assert chunk_document("lib", chunk) == chunk_document("lib", eager)
+
+    library = LibrarySource(title="lib", chunks=[chunk, eager])
+    restored = LibrarySource.model_validate_json(library.model_dump_json())
+    assert [type(item) for item in restored.chunks] == [LazyCodeChunk, CodeChunk]
+    assert restored.model_dump()["chunks"][0]["content"] is None
+    assert restored.chunks[0].location == location
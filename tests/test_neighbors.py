@@ -0,0 +1,66 @@
+from aidkits.storage.neighbors import expand_neighbors, neighbor_windows, window_filters
+
+
+def chunk(title, chunk_num, chunk_amount=10):
+    return {"title": title, "chunk_num": chunk_num, "chunk_amount": chunk_amount}
+
+
+def test_neighbor_windows_clip_to_file_bounds():
+    assert neighbor_windows([chunk("a.md", 1, 3), chunk("b.md", 3, 3)], 1) == [
+        (("title", "a.md"), 1, 2),
+        (("title", "b.md"), 2, 3),
+    ]
+
+
+def test_neighbor_windows_merge_overlapping_hits_in_rank_order():
+    hits = [
+        chunk("a.md", 5),
+        chunk("b.md", 2),
+        chunk("a.md", 7),
+        chunk("a.md", 1),
+        chunk("a.md", 3),
+    ]
+
+    # a.md 3 bridges the windows around 1 and 5, which all merge into the best-ranked window
+    assert neighbor_windows(hits, 1) == [
+        (("title", "a.md"), 1, 8),
+        (("title", "b.md"), 1, 3),
+    ]
+
+
+def test_neighbor_windows_key_on_the_path_of_same_named_files():
+    hits = [
+        dict(chunk("README.md", 2), path="a/README.md"),
+        dict(chunk("README.md", 3), path="b/README.md"),
+    ]
+
+    windows = neighbor_windows(hits, 1)
+
+    assert windows == [(("path", "a/README.md"), 1, 3), (("path", "b/README.md"), 2, 4)]
+    assert window_filters(windows[1]) == {
+        "path": "b/README.md",
+        "chunk_num": {"gte": 2, "lte": 4},
+    }
+
+
+def test_expand_neighbors_fetches_once_and_keeps_unexpandable_hits():
+    fetched = []
+    stored = {("a.md", n): dict(chunk("a.md", n), content=str(n)) for n in range(1, 11)}
+
+    def fetch(windows):
+        fetched.append(windows)
+        return [
+            payload
+            for (title, chunk_num), payload in stored.items()
+            if any(
+                ("title", title) == key and first <= chunk_num <= last
+                for key, first, last in windows
+            )
+        ]
+
+    hits = [stored[("a.md", 4)], {"text": "free-form"}, stored[("a.md", 5)]]
+    expanded = expand_neighbors(hits, 1, fetch)
+
+    assert fetched == [[(("title", "a.md"), 3, 6)]]
+    assert [payload.get("chunk_num") for payload in expanded] == [3, 4, 5, 6, None]
+    assert expanded[1] is hits[0]
@@ -0,0 +1,244 @@
+import re
+import zlib
+
+import numpy as np
+import pytest
+
+from aidkits.models import CodeChunk, LibrarySource
+from aidkits.storage.numpy_retriever import NumpyRetriever
+
+
+class BagOfWordsEncoder:
+    """Deterministic encoder: every word switches on one hashed dimension."""
+
+    def __init__(self, dimension=64):
+        self.dimension = dimension
+        self.encoded = 0
+
+    def _vector(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            vector[zlib.crc32(word.encode()) % self.dimension] += 1.0
+        return vector
+
+    def encode(self, sentences, **kwargs):
+        if isinstance(sentences, str):
+            return self._vector(sentences)
+        self.encoded += len(sentences)
+        return np.stack([self._vector(sentence) for sentence in sentences])
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+
+def make_library(*contents):
+    return LibrarySource(
+        title="lib",
+        chunks=[
+            CodeChunk(
+                title="a.md",
+                content=content,
+                length=len(content),
+                chunk_num=i + 1,
+                chunk_amount=len(contents),
+            )
+            for i, content in enumerate(contents)
+        ],
+    )
+
+
+@pytest.fixture
+def retriever(tmp_path):
+    return NumpyRetriever(tmp_path, BagOfWordsEncoder())
+
+
+def test_search_returns_best_matches_first(retriever):
+    retriever.upload_library(
+        make_library("install the package", "configure logging", "deploy to kubernetes")
+    )
+
+    results = retriever.search("how to configure logging", "lib", top_k=2)
+    scored = retriever.search_scored("how to configure logging", "lib", top_k=2)
+
+    assert results[0].content == "configure logging"
+    assert len(results) == 2
+    assert scored[0]["score"] > scored[1]["score"]
+    assert 1.0 < scored[0]["score"] <= 2.0
+    assert scored[0]["vector"] == []
+
+
+def test_collections_persist_on_disk(tmp_path):
+    NumpyRetriever(tmp_path, BagOfWordsEncoder()).upload_library(
+        make_library("alpha", "beta")
+    )
+
+    results = NumpyRetriever(tmp_path, BagOfWordsEncoder()).search(
+        "beta", "lib", top_k=1
+    )
+
+    assert results[0].content == "beta"
+
+
+def test_reupload_skips_unchanged_and_deletes_stale(retriever):
+    retriever.upload_library(make_library("alpha", "beta", "gamma"))
+    encoder = retriever._encoder
+    encoder.encoded = 0
+
+    report = retriever.upload_library(
+        make_library("alpha", "delta", "gamma"), delete_stale=True
+    )
+
+    assert encoder.encoded == 1
+    assert (report.succeeded, report.skipped, report.deleted) == (1, 2, 1)
+    contents = [
+        hit.content
+        for hit in retriever.search("alpha beta gamma delta", "lib", top_k=10)
+    ]
+    assert sorted(contents) == ["alpha", "delta", "gamma"]
+
+
+def test_reupload_keeps_other_documents_by_default(retriever):
+    retriever.upload_collection("docs", [{"text": "alpha"}], "text")
+
+    report = retriever.upload_collection("docs", [{"text": "beta"}], "text")
+
+    assert report.deleted == 0
+    contents = [
+        hit["payload"]["text"]
+        for hit in retriever.search_scored("alpha beta", "docs", top_k=10)
+    ]
+    assert sorted(contents) == ["alpha", "beta"]
+
+
+def test_search_projects_fields(retriever):
+    retriever.upload_library(make_library("alpha"))
+
+    hit = retriever.search_scored(
+        "alpha", "lib", fields=["title"], include_vector=True
+    )[0]
+
+    assert set(hit["payload"]) == {"title", "vector"}
+    assert len(hit["vector"]) == 64
+
+
+def test_create_and_delete_collection(retriever, tmp_path):
+    assert retriever.create_collection("docs")
+    assert not retriever.create_collection("docs")
+    assert retriever.search("anything", "docs") == []
+    assert retriever.delete_collection("docs")
+    assert not (tmp_path / "docs").exists()
+    with pytest.raises(KeyError):
+        retriever.search("anything", "docs")
+
+
+def test_ann_search_matches_exact_search(tmp_path):
+    pytest.importorskip("hnswlib")
+    data = [{"text": f"document number {i} about topic {i % 7}"} for i in range(50)]
+    exact = NumpyRetriever(tmp_path / "exact", BagOfWordsEncoder())
+    ann = NumpyRetriever(tmp_path / "ann", BagOfWordsEncoder(), ann_threshold=10)
+    for retriever in (exact, ann):
+        retriever.upload_collection("docs", data, "text", show_progress_bar=False)
+
+    expected = exact.search_scored("topic 3", "docs", top_k=5)
+    found = ann.search_scored("topic 3", "docs", top_k=5)
+
+    assert [hit["score"] for hit in found] == pytest.approx(
+        [hit["score"] for hit in expected], abs=1e-5
+    )
+
+
+def test_search_collections_merges_global_top_k(retriever):
+    retriever.upload_collection(
+        "docs-a", [{"text": "configure logging"}, {"text": "install"}], "text"
+    )
+    retriever.upload_collection(
+        "docs-b", [{"text": "configure logging levels"}, {"text": "deploy"}], "text"
+    )
+    retriever.upload_collection("other", [{"text": "configure logging"}], "text")
+
+    hits = retriever.search_collections("configure logging", "docs-*", top_k=3)
+
+    assert [hit["collection"] for hit in hits[:2]] == ["docs-a", "docs-b"]
+    assert len(hits) == 3
+    assert [hit["score"] for hit in hits] == sorted(
+        (hit["score"] for hit in hits), reverse=True
+    )
+    assert {
+        hit["collection"]
+        for hit in retriever.search_collections("logging", ["docs-b", "other"])
+    } == {
+        "docs-b",
+        "other",
+    }
+
+
+def test_filters_restrict_candidates_before_top_k(retriever):
+    retriever.upload_collection(
+        "docs",
+        [{"text": "configure logging", "title": "a.md", "chunk_num": 1}]
+        + [
+            {"text": f"unrelated text {i}", "title": "b.md", "chunk_num": i}
+            for i in range(1, 6)
+        ],
+        "text",
+    )
+
+    hits = retriever.search_scored(
+        "configure logging",
+        "docs",
+        top_k=2,
+        filters={"title": "b.md", "chunk_num": {"gte": 4}},
+    )
+
+    assert sorted(hit["payload"]["chunk_num"] for hit in hits) == [4, 5]
+    assert all(hit["payload"]["title"] == "b.md" for hit in hits)
+    assert (
+        retriever.search_scored(
+            "configure logging", "docs", filters={"title": "missing.md"}
+        )
+        == []
+    )
+
+
+def test_search_expands_neighbors(retriever):
+    retriever.upload_library(
+        make_library(
+            "install the package",
+            "configure logging",
+            "deploy to kubernetes",
+            "monitor",
+        )
+    )
+
+    results = retriever.search("configure logging", "lib", top_k=1, neighbors=1)
+
+    assert [result.chunk_num for result in results] == [1, 2, 3]
+
+
+def test_search_expands_neighbors_within_the_same_file(retriever):
+    contents = ["install the package", "configure logging", "deploy to kubernetes"]
+    retriever.upload_library(
+        LibrarySource(
+            title="lib",
+            chunks=[
+                CodeChunk(
+                    title="README.md",
+                    path=f"{directory}/README.md",
+                    content=f"{directory} {content}",
+                    length=len(content),
+                    chunk_num=i + 1,
+                    chunk_amount=len(contents),
+                )
+                for directory in ("a", "b")
+                for i, content in enumerate(contents)
+            ],
+        )
+    )
+
+    results = retriever.search("b configure logging", "lib", top_k=1, neighbors=1)
+
+    assert [(result.path, result.chunk_num) for result in results] == [
+        ("b/README.md", 1),
+        ("b/README.md", 2),
+        ("b/README.md", 3),
+    ]
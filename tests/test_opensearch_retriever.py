@@ -0,0 +1,685 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+from opensearchpy.exceptions import ConnectionTimeout, TransportError
+
+from aidkits.benchmarks.fake_opensearch import FakeOpenSearch
+from aidkits.models import CodeChunk, LibrarySource
+from aidkits.storage.opensearch_retriever import OpenSearchRetriever
+from aidkits.storage.quantization import VectorOptions
+
+
+class FakeEncoder:
+    def __init__(self, dimension: int = 4):
+        self.dimension = dimension
+        self.calls = []
+
+    def encode(self, sentences, **kwargs):
+        if isinstance(sentences, str):
+            return np.ones(self.dimension, dtype=np.float32)
+        self.calls.append(list(sentences))
+        return np.ones((len(sentences), self.dimension), dtype=np.float32)
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+
+def bulk_lines(body):
+    return [json.loads(line) for line in body.decode("utf-8").splitlines()]
+
+
+def bulk_ok(body):
+    actions = [line for line in bulk_lines(body) if set(line) <= {"index", "delete"}]
+    return {
+        "errors": False,
+        "items": [
+            {op: {"_id": meta["_id"], "status": 201}}
+            for action in actions
+            for op, meta in action.items()
+        ],
+    }
+
+
+def index_ids(client, ids):
+    client.indices.exists.return_value = True
+    client.search.return_value = {
+        "_scroll_id": "scroll",
+        "_shards": {"successful": 1, "total": 1},
+        "hits": {"hits": [{"_id": doc_id} for doc_id in ids]},
+    }
+    client.scroll.return_value = {"_scroll_id": "scroll", "hits": {"hits": []}}
+
+
+@pytest.fixture
+def client():
+    client = MagicMock()
+    client.bulk.side_effect = lambda body: bulk_ok(body)
+    index_ids(client, [])
+    return client
+
+
+def bulk_actions(client, op_type):
+    return [
+        line[op_type]["_id"]
+        for call in client.bulk.call_args_list
+        for line in bulk_lines(call.kwargs["body"])
+        if op_type in line
+    ]
+
+
+def make_library(*contents):
+    return LibrarySource(
+        title="lib",
+        chunks=[
+            CodeChunk(
+                title="a.md",
+                content=content,
+                length=len(content),
+                chunk_num=i + 1,
+                chunk_amount=len(contents),
+            )
+            for i, content in enumerate(contents)
+        ],
+    )
+
+
+def indexed_documents(client):
+    documents = []
+    for call in client.bulk.call_args_list:
+        documents.extend(
+            line for line in bulk_lines(call.kwargs["body"]) if "index" not in line
+        )
+    return documents
+
+
+def test_upload_collection_streams_in_windows(client):
+    encoder = FakeEncoder()
+    retriever = OpenSearchRetriever(client, encoder)
+
+    data = ({"text": f"doc {i}"} for i in range(5))
+    retriever.upload_collection(
+        "docs", data, "text", window_size=2, show_progress_bar=False
+    )
+
+    assert [len(call) for call in encoder.calls] == [2, 2, 1]
+    documents = indexed_documents(client)
+    assert [doc["text"] for doc in documents] == [f"doc {i}" for i in range(5)]
+    assert all(len(doc["vector"]) == 4 for doc in documents)
+
+
+def test_upload_returns_bulk_report(client):
+    retriever = OpenSearchRetriever(client, FakeEncoder())
+
+    report = retriever.upload_collection("docs", [{"text": "a"}, {"text": "b"}], "text")
+
+    assert report.ok
+    assert report.succeeded == 2
+
+
+def test_upload_library_accepts_iterable_of_chunks(client):
+    encoder = FakeEncoder()
+    retriever = OpenSearchRetriever(client, encoder)
+    chunks = (
+        CodeChunk(
+            title="a.md", content=str(i), length=1, chunk_num=i + 1, chunk_amount=3
+        )
+        for i in range(3)
+    )
+
+    retriever.upload_library(chunks, collection_name="lib", window_size=2)
+
+    assert encoder.calls[0][0] == "a.md\nChunk 1/3\n\n0"
+    assert len(indexed_documents(client)) == 3
+
+
+def test_upload_library_requires_collection_for_iterables(client):
+    retriever = OpenSearchRetriever(client, FakeEncoder())
+    with pytest.raises(ValueError):
+        retriever.upload_library(iter([]))
+
+
+def test_retriever_imports_without_sentence_transformers():
+    # Blocking the module makes any import of it raise, installed or not
+    code = (
+        "import sys\n"
+        "sys.modules['sentence_transformers'] = None\n"
+        "from aidkits.storage.opensearch_retriever import OpenSearchRetriever"
+    )
+    subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        cwd=Path(__file__).resolve().parents[1],
+    )
+
+
+def test_upload_library_uses_deterministic_ids(client):
+    first, second = MagicMock(), MagicMock()
+    for mock in (first, second):
+        mock.bulk.side_effect = lambda body: bulk_ok(body)
+        index_ids(mock, [])
+
+    OpenSearchRetriever(first, FakeEncoder()).upload_library(make_library("A", "B"))
+    OpenSearchRetriever(second, FakeEncoder()).upload_library(make_library("A", "B"))
+
+    assert bulk_actions(first, "index") == bulk_actions(second, "index")
+    assert len(set(bulk_actions(first, "index"))) == 2
+
+
+def test_reupload_skips_unchanged_chunks(client):
+    OpenSearchRetriever(client, FakeEncoder()).upload_library(make_library("A", "B"))
+    index_ids(client, bulk_actions(client, "index"))
+    client.bulk.reset_mock()
+    encoder = FakeEncoder()
+
+    report = OpenSearchRetriever(client, encoder).upload_library(make_library("A", "B"))
+
+    assert encoder.calls == []
+    assert client.bulk.call_count == 0
+    assert report.skipped == 2
+
+
+def test_reupload_indexes_changes_and_deletes_stale_chunks(client):
+    OpenSearchRetriever(client, FakeEncoder()).upload_library(
+        make_library("A", "B", "C")
+    )
+    old_ids = bulk_actions(client, "index")
+    index_ids(client, old_ids)
+    client.bulk.reset_mock()
+    encoder = FakeEncoder()
+
+    report = OpenSearchRetriever(client, encoder).upload_library(
+        make_library("A", "B", "C")
+    )
+    assert report.skipped == 3
+
+    client.bulk.reset_mock()
+    report = OpenSearchRetriever(client, encoder).upload_library(
+        make_library("A", "changed", "C"),
+        delete_stale=True,
+    )
+
+    # chunk_amount is unchanged, so only the edited chunk is re-encoded
+    assert encoder.calls == [["a.md\nChunk 2/3\n\nchanged"]]
+    assert bulk_actions(client, "delete") == [old_ids[1]]
+    assert report.skipped == 2
+    assert report.deleted == 1
+
+
+def test_upload_indexes_duplicate_chunks_once(client):
+    encoder = FakeEncoder()
+    library = make_library("A", "B")
+
+    report = OpenSearchRetriever(client, encoder).upload_library(
+        library.chunks * 2, collection_name="lib"
+    )
+
+    assert (
+        len(bulk_actions(client, "index"))
+        == len(set(bulk_actions(client, "index")))
+        == 2
+    )
+    assert sum(len(call) for call in encoder.calls) == 2
+    assert (report.succeeded, report.skipped) == (2, 0)
+
+
+def test_upload_keeps_indexed_documents_by_default(client):
+    index_ids(client, ["earlier-batch"])
+
+    report = OpenSearchRetriever(client, FakeEncoder()).upload_collection(
+        "docs", [{"text": "a"}], "text"
+    )
+
+    assert bulk_actions(client, "delete") == []
+    assert (report.succeeded, report.deleted) == (1, 0)
+
+
+def test_failed_upload_keeps_stale_documents(client):
+    OpenSearchRetriever(client, FakeEncoder()).upload_library(make_library("A", "B"))
+    old_ids = bulk_actions(client, "index")
+    index_ids(client, old_ids)
+    client.bulk.reset_mock()
+    client.bulk.side_effect = lambda body: {
+        "errors": True,
+        "items": [
+            {
+                "index": {
+                    "_id": line["index"]["_id"],
+                    "status": 400,
+                    "error": {"type": "mapper_parsing_exception"},
+                }
+            }
+            for line in bulk_lines(body)
+            if "index" in line
+        ],
+    }
+
+    report = OpenSearchRetriever(client, FakeEncoder()).upload_library(
+        make_library("A", "changed"),
+        delete_stale=True,
+    )
+
+    assert not report.ok
+    # The old copy of the failed chunk is still the only one indexed
+    assert bulk_actions(client, "delete") == []
+    assert report.deleted == 0
+
+
+def test_upload_library_defaults_to_library_title(client):
+    client.indices.exists.return_value = False
+    client.indices.create.return_value = {"acknowledged": True}
+    retriever = OpenSearchRetriever(client, FakeEncoder())
+    library = LibrarySource(
+        title="lib",
+        chunks=[
+            CodeChunk(title="a.md", content="A", length=1, chunk_num=1, chunk_amount=1)
+        ],
+    )
+
+    retriever.upload_library(library)
+
+    assert client.indices.create.call_args.kwargs["index"] == "lib"
+
+
+@pytest.fixture
+def rebuild_client(client):
+    client.indices.exists_alias.return_value = False
+    client.indices.exists.return_value = False
+    client.indices.get_settings.side_effect = lambda index: {
+        index: {"settings": {"index": {"number_of_replicas": "1"}}}
+    }
+    return client
+
+
+def test_rebuild_loads_new_index_and_swaps_alias(rebuild_client):
+    client = rebuild_client
+    client.indices.exists_alias.return_value = True
+    client.indices.get_alias.return_value = {"docs-old": {"aliases": {"docs": {}}}}
+
+    report = OpenSearchRetriever(client, FakeEncoder()).rebuild_library(
+        make_library("A", "B"), alias="docs"
+    )
+
+    assert report.succeeded == 2
+    index = client.indices.create.call_args.kwargs["index"]
+    assert index.startswith("docs-")
+    loading, restored = [
+        call.kwargs["body"]["index"]
+        for call in client.indices.put_settings.call_args_list
+    ]
+    assert loading == {"refresh_interval": "-1", "number_of_replicas": 0}
+    assert restored == {"refresh_interval": None, "number_of_replicas": 1}
+    client.indices.forcemerge.assert_called_once_with(index=index, max_num_segments=1)
+    assert client.indices.update_aliases.call_args.kwargs["body"]["actions"] == [
+        {"remove": {"index": "docs-old", "alias": "docs"}},
+        {"add": {"index": index, "alias": "docs"}},
+    ]
+    client.indices.delete.assert_called_once_with(index="docs-old", ignore=[404])
+
+
+def test_upload_after_rebuild_skips_every_chunk():
+    client = FakeOpenSearch()
+    retriever = OpenSearchRetriever(client, FakeEncoder())
+    library = make_library("A", "B", "C")
+    retriever.rebuild_library(library, alias="lib")
+
+    report = retriever.upload_library(library)
+
+    assert (report.succeeded, report.skipped) == (0, 3)
+    assert len(list(client.iter_documents("lib"))) == 3
+
+
+def test_rebuild_keeps_alias_when_documents_fail(rebuild_client):
+    client = rebuild_client
+    client.bulk.side_effect = lambda body: {
+        "errors": True,
+        "items": [
+            {"index": {"_id": "x", "status": 400, "error": "mapper_parsing_exception"}}
+        ],
+    }
+
+    report = OpenSearchRetriever(client, FakeEncoder()).rebuild_library(
+        make_library("A"), alias="docs"
+    )
+
+    assert not report.ok
+    client.indices.update_aliases.assert_not_called()
+    client.indices.delete.assert_called_once_with(
+        index=client.indices.create.call_args.kwargs["index"]
+    )
+
+
+def test_rebuild_refuses_concrete_index_names(rebuild_client):
+    rebuild_client.indices.exists.return_value = True
+
+    with pytest.raises(ValueError):
+        OpenSearchRetriever(rebuild_client, FakeEncoder()).rebuild_library(
+            make_library("A"), alias="docs"
+        )
+
+
+def test_vector_options_apply_to_mapping_uploads_and_queries(client):
+    client.indices.exists.return_value = False
+    client.indices.create.return_value = {"acknowledged": True}
+    client.search.return_value = {"hits": {"hits": []}}
+    options = VectorOptions(dimension=2, data_type="byte")
+    retriever = OpenSearchRetriever(client, FakeEncoder(), vector_options=options)
+
+    retriever.upload_collection("docs", [{"text": "a"}], "text")
+    retriever.search("question", "docs")
+
+    body = client.indices.create.call_args.kwargs["body"]
+    assert body["settings"]["index.knn"] is True
+    assert body["mappings"]["properties"]["vector"] == options.mapping(4)
+    assert indexed_documents(client)[0]["vector"] == [90, 90]
+    # The HNSW graph is searched instead of scoring every stored vector
+    query = client.search.call_args.kwargs["body"]["query"]
+    assert query == {"knn": {"vector": {"vector": [90, 90], "k": 5}}}
+
+
+@pytest.mark.parametrize(
+    "engine,expected",
+    [("faiss", "knn"), ("lucene", "knn"), ("nmslib", "script_score")],
+)
+def test_filtered_search_uses_the_graph_where_the_engine_can_filter(
+    client, engine, expected
+):
+    client.search.return_value = {"hits": {"hits": []}}
+    retriever = OpenSearchRetriever(
+        client, FakeEncoder(), vector_options=VectorOptions(engine=engine)
+    )
+
+    retriever.search("question", "docs", top_k=3, filters={"title": "a.md"})
+
+    query = client.search.call_args.kwargs["body"]["query"]
+    assert set(query) == {expected}
+    if expected == "knn":
+        assert query["knn"]["vector"]["filter"] == {
+            "bool": {"filter": [{"term": {"title": "a.md"}}]}
+        }
+
+
+def search_response(*sources):
+    return {
+        "hits": {
+            "hits": [
+                {"_id": str(i), "_index": "docs", "_score": 1.5, "_source": source}
+                for i, source in enumerate(sources)
+            ]
+        }
+    }
+
+
+CHUNK = {
+    "title": "a.md",
+    "content": "A",
+    "length": 1,
+    "chunk_num": 1,
+    "chunk_amount": 1,
+}
+
+
+def test_search_excludes_vector_by_default(client):
+    client.search.return_value = search_response(CHUNK)
+    retriever = OpenSearchRetriever(client, FakeEncoder())
+
+    results = retriever.search("question", "docs")
+    scored = retriever.search_scored("question", "docs")
+
+    assert results == [CodeChunk(**CHUNK)]
+    assert scored[0]["vector"] == []
+    for call in client.search.call_args_list:
+        assert call.kwargs["body"]["_source"] == {"excludes": ["vector"]}
+        assert "hits.hits._source" in call.kwargs["filter_path"]
+
+
+@pytest.mark.parametrize(
+    "fields,include_vector,expected",
+    [
+        (["title", "content"], False, ["title", "content"]),
+        (["title"], True, ["title", "vector"]),
+        (None, True, True),
+    ],
+)
+def test_search_projects_fields(client, fields, include_vector, expected):
+    client.search.return_value = search_response({"title": "a.md"})
+
+    results = OpenSearchRetriever(client, FakeEncoder()).search_scored(
+        "question",
+        "docs",
+        fields=fields,
+        include_vector=include_vector,
+    )
+
+    assert client.search.call_args.kwargs["body"]["_source"] == expected
+    assert results[0]["payload"] == {"title": "a.md"}
+
+
+def test_search_trusted_skips_validation(client):
+    client.search.return_value = search_response(dict(CHUNK, length="not validated"))
+    retriever = OpenSearchRetriever(client, FakeEncoder())
+
+    with pytest.raises(ValueError):
+        retriever.search("question", "docs")
+    results = retriever.search("question", "docs", trusted=True)
+
+    assert results[0].length == "not validated"
+    assert results[0].markdown == "a.md\nChunk 1/1\n\nA"
+
+
+def test_search_handles_empty_filtered_response(client):
+    client.search.return_value = {}
+    assert OpenSearchRetriever(client, FakeEncoder()).search("question", "docs") == []
+
+
+def test_search_collections_sends_one_multi_index_request(client):
+    client.search.return_value = {
+        "hits": {
+            "hits": [
+                {"_id": "1", "_index": "lib-a", "_score": 1.9, "_source": CHUNK},
+                {
+                    "_id": "2",
+                    "_index": "docs-20260101",
+                    "_score": 1.7,
+                    "_source": CHUNK,
+                },
+            ]
+        }
+    }
+    client.indices.get_alias.return_value = {"docs-20260101": {"aliases": {"docs": {}}}}
+
+    hits = OpenSearchRetriever(client, FakeEncoder()).search_collections(
+        "question", ["lib-a", "docs"], top_k=2
+    )
+
+    assert client.search.call_count == 1
+    assert client.search.call_args.kwargs["index"] == "lib-a,docs"
+    assert client.search.call_args.kwargs["ignore_unavailable"] is True
+    assert [(hit["id"], hit["collection"]) for hit in hits] == [
+        ("1", "lib-a"),
+        ("2", "docs"),
+    ]
+
+
+def test_filters_become_script_score_pre_filters(client):
+    client.search.return_value = search_response(CHUNK)
+    retriever = OpenSearchRetriever(client, FakeEncoder())
+
+    retriever.search(
+        "question", "docs", filters={"title": ["a.md"], "chunk_num": {"gte": 2}}
+    )
+    filtered = client.search.call_args.kwargs["body"]["query"]["script_score"]["query"]
+    retriever.search("question", "docs")
+    unfiltered = client.search.call_args.kwargs["body"]["query"]["script_score"][
+        "query"
+    ]
+
+    assert filtered == {
+        "bool": {
+            "filter": [
+                {"terms": {"title": ["a.md"]}},
+                {"range": {"chunk_num": {"gte": 2}}},
+            ]
+        }
+    }
+    assert unfiltered == {"match_all": {}}
+
+
+def test_shared_collection_routes_uploads_by_library(client):
+    retriever = OpenSearchRetriever(
+        client, FakeEncoder(), shared_collection="libraries"
+    )
+
+    retriever.upload_library(make_library("A"))
+
+    scan_call = client.search.call_args_list[0].kwargs
+    assert scan_call["index"] == "libraries"
+    assert scan_call["routing"] == "lib"
+    assert scan_call["body"]["query"] == {"term": {"library": "lib"}}
+    action, document = bulk_lines(client.bulk.call_args.kwargs["body"])
+    assert action["index"]["_index"] == "libraries"
+    assert action["index"]["routing"] == "lib"
+    assert document["library"] == "lib"
+
+
+def test_shared_collection_searches_one_library(client):
+    client.search.return_value = search_response(dict(CHUNK, library="lib"))
+    retriever = OpenSearchRetriever(
+        client, FakeEncoder(), shared_collection="libraries"
+    )
+
+    retriever.search("question", "lib", filters={"title": "a.md"})
+
+    call = client.search.call_args.kwargs
+    assert call["index"] == "libraries"
+    assert call["routing"] == "lib"
+    assert call["body"]["query"]["script_score"]["query"] == {
+        "bool": {"filter": [{"term": {"title": "a.md"}}, {"term": {"library": "lib"}}]}
+    }
+
+
+def test_shared_collection_searches_several_libraries(client):
+    client.search.return_value = search_response(
+        dict(CHUNK, library="lib-a"), dict(CHUNK, library="lib-b")
+    )
+    retriever = OpenSearchRetriever(
+        client, FakeEncoder(), shared_collection="libraries"
+    )
+
+    hits = retriever.search_collections(
+        "question", ["lib-a", "lib-b"], fields=["title"]
+    )
+
+    call = client.search.call_args.kwargs
+    assert call["routing"] == "lib-a,lib-b"
+    assert call["body"]["_source"] == ["title", "library"]
+    assert [hit["collection"] for hit in hits] == ["lib-a", "lib-b"]
+
+    retriever.search_collections("question", "lib-*")
+    assert "routing" not in client.search.call_args.kwargs
+
+
+def test_shared_collection_deletes_one_library(client):
+    client.delete_by_query.return_value = {"deleted": 3}
+    retriever = OpenSearchRetriever(
+        client, FakeEncoder(), shared_collection="libraries"
+    )
+
+    assert retriever.delete_collection("lib")
+
+    client.indices.delete.assert_not_called()
+    call = client.delete_by_query.call_args.kwargs
+    assert (call["index"], call["routing"]) == ("libraries", "lib")
+    assert call["body"] == {"query": {"term": {"library": "lib"}}}
+    with pytest.raises(ValueError):
+        retriever.rebuild_library(make_library("A"))
+
+
+def test_search_expands_neighbors_with_one_lookup(client):
+    hit = dict(CHUNK, content="B", chunk_num=2, chunk_amount=3)
+    client.search.side_effect = [
+        search_response(hit),
+        search_response(
+            dict(CHUNK, content="C", chunk_num=3, chunk_amount=3),
+            dict(CHUNK, content="A", chunk_num=1, chunk_amount=3),
+        ),
+    ]
+
+    results = OpenSearchRetriever(client, FakeEncoder()).search(
+        "question", "docs", neighbors=1, fields=["content"]
+    )
+
+    assert [result.content for result in results] == ["A", "B", "C"]
+    assert client.search.call_count == 2
+    body = client.search.call_args.kwargs["body"]
+    assert body["size"] == 3
+    assert body["query"]["bool"]["should"] == [
+        {
+            "bool": {
+                "filter": [
+                    {"term": {"title": "a.md"}},
+                    {"range": {"chunk_num": {"gte": 1, "lte": 3}}},
+                ]
+            }
+        }
+    ]
+    assert set(body["_source"]) == {
+        "content",
+        "path",
+        "title",
+        "chunk_num",
+        "chunk_amount",
+    }
+
+
+def test_search_batch_sends_one_msearch_and_keeps_errors(client):
+    encoder = FakeEncoder()
+    client.msearch.return_value = {
+        "responses": [
+            search_response(CHUNK),
+            {"error": {"type": "query_shard_exception"}, "status": 400},
+        ]
+    }
+    retriever = OpenSearchRetriever(client, encoder)
+
+    results = retriever.search_batch(
+        ["first", "second"], "docs", top_k=3, return_exceptions=True
+    )
+
+    assert results[0] == [CodeChunk(**CHUNK)]
+    assert isinstance(results[1], Exception)
+    assert encoder.calls == [["first", "second"]]
+    body = client.msearch.call_args.kwargs["body"]
+    assert body[0] == body[2] == {"index": "docs"}
+    assert body[1]["size"] == 3
+    with pytest.raises(Exception):
+        retriever.search_batch(["first", "second"], "docs")
+
+
+def test_search_batch_falls_back_to_single_searches_when_msearch_fails(client):
+    client.msearch.side_effect = ConnectionTimeout("TIMEOUT", "read timed out", None)
+    client.search.side_effect = [
+        search_response(CHUNK),
+        TransportError(429, "circuit_breaking_exception", {}),
+    ]
+    retriever = OpenSearchRetriever(
+        client, FakeEncoder(), shared_collection="libraries"
+    )
+
+    results = retriever.search_batch(
+        ["first", "second"], "docs", return_exceptions=True
+    )
+
+    assert results[0] == [CodeChunk(**CHUNK)]
+    assert isinstance(results[1], TransportError)
+    assert [call.kwargs["routing"] for call in client.search.call_args_list] == [
+        "docs",
+        "docs",
+    ]
+    assert all(
+        call.kwargs["index"] == "libraries" for call in client.search.call_args_list
+    )
@@ -176,3 +176,56 @@ def test_collect_markdown_files_no_markdown_files():
 #         # Validate the content of the second file
 #         assert len(sources[1].chunks) == 1
 #         assert "File 2 content." in sources[1].chunks[0].content
+
+
+def test_lazy_crawl_matches_eager_crawl(tmp_path):
+    guide = "Intro é\r\n# Install\r\npip install\r\n## Linux\r\napt `# not a header`\r\n# Usage\r\nrun"
+    (tmp_path / "guide.md").write_bytes(guide.encode("utf-8"))
+    (tmp_path / "plain.md").write_text("No headers\n", encoding="utf-8")
+
+    eager = sorted(
+        MarkdownCrawler(str(tmp_path)).collect_markdown_files(str(tmp_path)),
+        key=lambda s: s.title,
+    )
+    lazy = sorted(
+        MarkdownCrawler(str(tmp_path), lazy=True).collect_markdown_files(str(tmp_path)),
+        key=lambda s: s.title,
+    )
+
+    assert [[chunk.load() for chunk in source.chunks] for source in lazy] == [
+        source.chunks for source in eager
+    ]
+    locations = [chunk.location for chunk in lazy[0].chunks]
+    assert [(location.start_line, location.end_line) for location in locations] == [
+        (1, 1),
+        (2, 3),
+        (4, 5),
+        (6, 7),
+    ]
+    assert [location.header_path for location in locations] == [
+        [],
+        ["Install"],
+        ["Install", "Linux"],
+        ["Usage"],
+    ]
+    data = (tmp_path / "guide.md").read_bytes()
+    assert (
+        data[locations[1].offset : locations[1].offset + locations[1].size]
+        == b"# Install\r\npip install"
+    )
+    assert lazy[0].chunks[0].length == len("Intro é")
+
+
+def test_lazy_chunks_hold_no_content(tmp_path):
+    (tmp_path / "a.md").write_text("# A\nsame\n# B\nother\n", encoding="utf-8")
+    (tmp_path / "b.md").write_text("# A\nsame\n", encoding="utf-8")
+
+    sources = MarkdownCrawler(str(tmp_path), lazy=True).collect_markdown_files(
+        str(tmp_path)
+    )
+    chunks = [chunk for source in sources for chunk in source.chunks]
+
+    assert all(chunk.__dict__["content"] is None for chunk in chunks)
+    assert len({chunk.location.digest for chunk in chunks}) == 2
+    (tmp_path / "b.md").write_text("# A\nSAME\n", encoding="utf-8")
+    assert {chunk.content for chunk in chunks if chunk.title == "b.md"} == {"# A\nSAME"}
@@ -0,0 +1,80 @@
+from aidkits.benchmarks.fake_opensearch import FakeOpenSearch
+from aidkits.benchmarks.retrieval import HashingEncoder
+from aidkits.cli import main
+from aidkits.models import CodeChunk
+from aidkits.parse import MarkdownCrawler
+from aidkits.pipeline import ingest
+from aidkits.storage.batching import read_jsonl
+from aidkits.storage.opensearch_retriever import OpenSearchRetriever
+
+
+def write_docs(directory):
+    (directory / "guide").mkdir(parents=True)
+    (directory / "intro.md").write_text(
+        "# Intro\nWelcome\n## Install\npip install aidkits\n", encoding="utf-8"
+    )
+    (directory / "guide" / "search.md").write_text(
+        "# Search\nUse search()\n", encoding="utf-8"
+    )
+
+
+def test_iter_markdown_files_yields_one_library_per_file(tmp_path):
+    write_docs(tmp_path)
+    crawler = MarkdownCrawler(str(tmp_path))
+
+    libraries = sorted(
+        crawler.iter_markdown_files(str(tmp_path)), key=lambda library: library.title
+    )
+
+    assert [(library.title, len(library.chunks)) for library in libraries] == [
+        ("intro.md", 2),
+        ("search.md", 1),
+    ]
+    assert libraries == sorted(
+        crawler.collect_markdown_files(str(tmp_path)), key=lambda library: library.title
+    )
+
+
+def test_ingest_streams_a_directory_into_a_collection(tmp_path):
+    write_docs(tmp_path / "docs")
+    client = FakeOpenSearch()
+    retriever = OpenSearchRetriever(client, HashingEncoder(32))
+
+    report = ingest(
+        str(tmp_path / "docs"),
+        retriever,
+        "docs",
+        window_size=2,
+        queue_size=1,
+        chunks_path=tmp_path / "chunks.jsonl",
+    )
+
+    assert (report.files, report.chunks, report.bulk.succeeded) == (2, 3, 3)
+    assert sorted(source["title"] for _, source in client.iter_documents("docs")) == [
+        "intro.md",
+        "intro.md",
+        "search.md",
+    ]
+    chunks = list(read_jsonl(tmp_path / "chunks.jsonl", model=CodeChunk))
+    assert sorted(chunk.content for chunk in chunks) == [
+        "# Intro\nWelcome",
+        "# Search\nUse search()",
+        "## Install\npip install aidkits",
+    ]
+
+    # A second run skips unchanged chunks and deletes the ones of removed files
+    (tmp_path / "docs" / "guide" / "search.md").unlink()
+    report = ingest(str(tmp_path / "docs"), retriever, "docs")
+    assert (report.bulk.succeeded, report.bulk.skipped, report.bulk.deleted) == (
+        0,
+        2,
+        1,
+    )
+
+
+def test_ingest_command_requires_a_cluster_and_a_model(tmp_path, capsys):
+    try:
+        main(["ingest", str(tmp_path), "--collection", "docs"])
+    except SystemExit as e:
+        assert e.code == 2
+    assert "--host" in capsys.readouterr().err
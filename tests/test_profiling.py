@@ -0,0 +1,91 @@
+import json
+import pstats
+
+from aidkits.benchmarks.corpus import CorpusSpec, generate_corpus
+from aidkits.benchmarks.fake_opensearch import FakeOpenSearch
+from aidkits.benchmarks.retrieval import HashingEncoder
+from aidkits.cli import main
+from aidkits.profiling import StageProfiler, format_profile, profile_ingestion
+
+
+def test_profile_ingestion_measures_every_stage(tmp_path):
+    stats = generate_corpus(tmp_path / "corpus", CorpusSpec(files=6, file_size=1500))
+    client = FakeOpenSearch()
+
+    report = profile_ingestion(
+        str(tmp_path / "corpus"),
+        HashingEncoder(32),
+        client,
+        collection_name="docs",
+        profiler=StageProfiler(top=3, profile_dir=tmp_path / "dumps"),
+    )
+
+    assert [stage.name for stage in report.stages] == [
+        "fetch",
+        "crawl",
+        "encode",
+        "index",
+    ]
+    assert report.files == stats.files
+    assert report.chunks == sum(1 for _ in client.iter_documents("docs"))
+    crawl, encode, index = report.stages[1:]
+    assert (crawl.items, crawl.unit) == (stats.files, "files")
+    assert encode.items == index.items == report.chunks
+    for stage in report.stages:
+        assert stage.seconds >= 0
+        assert stage.peak_traced is not None
+        assert len(stage.top_allocations) <= 3
+        assert pstats.Stats(stage.profile_path).total_calls > 0
+    assert {"crawl.file", "ingest.encode", "ingest.bulk"} <= set(report.spans)
+    assert "crawl" in format_profile(report)
+
+
+def test_profile_ingestion_uploads_all_libraries_at_once(tmp_path, monkeypatch):
+    from aidkits.storage.opensearch_retriever import OpenSearchRetriever
+
+    generate_corpus(tmp_path / "corpus", CorpusSpec(files=4, file_size=800))
+    uploads = []
+    upload_library = OpenSearchRetriever.upload_library
+
+    def record_upload(self, library, *args, **kwargs):
+        uploads.append(kwargs["collection_name"])
+        return upload_library(self, library, *args, **kwargs)
+
+    monkeypatch.setattr(OpenSearchRetriever, "upload_library", record_upload)
+
+    report = profile_ingestion(
+        str(tmp_path / "corpus"),
+        HashingEncoder(32),
+        FakeOpenSearch(),
+        "docs",
+        profiler=StageProfiler(False),
+    )
+
+    assert uploads == ["docs"]
+    assert report.files == 4
+
+
+def test_profile_command_writes_a_report(tmp_path, capsys):
+    generate_corpus(tmp_path / "corpus", CorpusSpec(files=3, file_size=800))
+    output = tmp_path / "profile.json"
+
+    assert (
+        main(
+            [
+                "profile",
+                str(tmp_path / "corpus"),
+                "--no-memory",
+                "--output",
+                str(output),
+            ]
+        )
+        == 0
+    )
+
+    report = json.loads(output.read_text(encoding="utf-8"))
+    assert report["files"] == 3
+    assert all(
+        stage["peak_traced"] is None and stage["profile_path"] is None
+        for stage in report["stages"]
+    )
+    assert "3 files" in capsys.readouterr().out
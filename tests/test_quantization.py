@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from aidkits.storage.quantization import (
+    VectorOptions,
+    calibrate_byte_scale,
+    vector_size_report,
+)
+
+
+class RandomEncoder:
+    def __init__(self, dimension=32, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.dimension = dimension
+        self.cache = {}
+
+    def encode(self, sentences, **kwargs):
+        for sentence in sentences:
+            if sentence not in self.cache:
+                self.cache[sentence] = self.rng.normal(size=self.dimension).astype(
+                    np.float32
+                )
+        return np.stack([self.cache[sentence] for sentence in sentences])
+
+
+def test_prepare_truncates_and_normalizes():
+    options = VectorOptions(dimension=2)
+    vectors = options.prepare(np.array([[3.0, 4.0, 12.0]]))
+    np.testing.assert_allclose(vectors, [[0.6, 0.8]])
+
+
+def test_prepare_quantizes_to_bytes():
+    options = VectorOptions(data_type="byte")
+    vectors = options.prepare(np.array([1.0, -1.0, 0.0]))
+    assert vectors.dtype == np.int8
+    assert vectors.tolist() == [90, -90, 0]
+
+
+@pytest.mark.parametrize(
+    "options,expected",
+    [
+        (
+            VectorOptions(data_type="float16"),
+            {"encoder": {"name": "sq", "parameters": {"type": "fp16"}}},
+        ),
+        (VectorOptions(data_type="byte", engine="lucene"), None),
+    ],
+)
+def test_mapping(options, expected):
+    mapping = options.mapping(384)
+    assert mapping["dimension"] == 384
+    assert mapping["method"].get("parameters") == expected
+    assert mapping.get("data_type") == ("byte" if options.data_type == "byte" else None)
+
+
+def test_float16_requires_faiss():
+    with pytest.raises(ValueError):
+        VectorOptions(data_type="float16", engine="lucene")
+
+
+def test_calibrate_byte_scale_uses_int8_range():
+    embeddings = np.random.default_rng(0).normal(size=(100, 64))
+    scale = calibrate_byte_scale(embeddings, percentile=100)
+    quantized = VectorOptions(data_type="byte", byte_scale=scale).prepare(embeddings)
+    assert np.abs(quantized).max() == 127
+
+
+def test_vector_size_report():
+    encoder = RandomEncoder()
+    documents = [f"doc {i}" for i in range(200)]
+    queries = [f"query {i}" for i in range(20)]
+
+    full, half, truncated = vector_size_report(
+        encoder,
+        documents,
+        queries,
+        [
+            VectorOptions(),
+            VectorOptions(data_type="float16"),
+            VectorOptions(dimension=8, data_type="byte"),
+        ],
+        top_k=5,
+    )
+
+    assert full.recall_at_k == 1.0
+    assert half.recall_at_k > 0.9
+    assert half.compression_ratio == 2.0
+    assert truncated.bytes_per_vector == 8
+    assert truncated.compression_ratio == 16.0
+    assert truncated.recall_at_k < half.recall_at_k
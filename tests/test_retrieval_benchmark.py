@@ -0,0 +1,235 @@
+import json
+
+import numpy as np
+
+from aidkits.benchmarks.fake_opensearch import FakeOpenSearch
+from aidkits.benchmarks.retrieval import (
+    HashingEncoder,
+    LabeledQuery,
+    STRATEGIES,
+    benchmark_retrieval,
+    chunk_key,
+    exact_top_k,
+    load_queries,
+    synthetic_corpus,
+)
+from aidkits.models import CodeChunk, LibrarySource
+from aidkits.storage.opensearch_retriever import OpenSearchRetriever
+
+
+def make_retriever(client=None):
+    client = client or FakeOpenSearch()
+    return client, OpenSearchRetriever(client, HashingEncoder(64))
+
+
+def test_hashing_encoder_is_deterministic_and_normalized():
+    encoder = HashingEncoder(32)
+    vectors = encoder.encode(["index a document", "index a document", ""])
+
+    assert vectors.shape == (3, 32)
+    assert np.array_equal(vectors[0], vectors[1])
+    assert np.isclose(np.linalg.norm(vectors[0]), 1.0)
+    assert not vectors[2].any()
+    assert np.array_equal(encoder.encode("index a document"), vectors[0])
+
+
+def test_synthetic_corpus_is_seeded_and_labeled():
+    chunks, queries = synthetic_corpus(20, 5, seed=3, chunks_per_file=4)
+    again, _ = synthetic_corpus(20, 5, seed=3, chunks_per_file=4)
+
+    assert [chunk.content for chunk in chunks] == [chunk.content for chunk in again]
+    assert {chunk.title for chunk in chunks} == {
+        f"docs/file{number}.md" for number in range(5)
+    }
+    keys = {chunk_key(chunk) for chunk in chunks}
+    assert all(set(query.relevant) <= keys for query in queries)
+
+
+def test_fake_client_round_trip_through_the_retriever():
+    client, retriever = make_retriever()
+    chunks, _ = synthetic_corpus(24, 0, chunks_per_file=6)
+    retriever.create_collection("docs")
+    retriever.upload_library(
+        LibrarySource(title="docs", chunks=chunks), collection_name="docs"
+    )
+
+    results = retriever.search(chunks[7].content, "docs", top_k=3)
+    assert chunk_key(results[0]) == chunk_key(chunks[7])
+    assert len(results) == 3
+
+    filtered = retriever.search(
+        chunks[7].content, "docs", top_k=10, filters={"title": ["docs/file0.md"]}
+    )
+    assert {chunk.title for chunk in filtered} == {"docs/file0.md"}
+
+    batch = retriever.search_batch(
+        [chunks[0].content, chunks[20].content], "docs", top_k=1
+    )
+    assert [chunk_key(result[0]) for result in batch] == [
+        chunk_key(chunks[0]),
+        chunk_key(chunks[20]),
+    ]
+
+    # Re-uploading the same chunks finds them indexed and sends nothing
+    requests = client.requests
+    report = retriever.upload_library(
+        LibrarySource(title="docs", chunks=chunks), collection_name="docs"
+    )
+    assert not report.failed
+    assert sum(1 for _ in client.iter_documents("docs")) == 24
+    assert client.requests - requests <= 1
+
+    assert retriever.delete_collection("docs")
+    assert not client.indices.exists("docs")
+
+
+def test_fake_client_source_filters():
+    client = FakeOpenSearch()
+    client.indices.create(index="docs")
+    client.bulk(
+        body="\n".join(
+            [
+                json.dumps({"index": {"_index": "docs", "_id": "a"}}),
+                json.dumps({"title": "a.md", "chunk_num": 1, "vector": [1.0, 0.0]}),
+                json.dumps({"index": {"_index": "docs", "_id": "b"}}),
+                json.dumps({"title": "b.md", "chunk_num": 2, "vector": [0.0, 1.0]}),
+            ]
+        )
+        + "\n"
+    )
+
+    excluded = client.search(
+        index="docs",
+        body={"query": {"match_all": {}}, "_source": {"excludes": ["vector"]}},
+    )
+    assert [hit["_source"] for hit in excluded["hits"]["hits"]] == [
+        {"title": "a.md", "chunk_num": 1},
+        {"title": "b.md", "chunk_num": 2},
+    ]
+    ranged = client.search(
+        index="docs",
+        body={"query": {"range": {"chunk_num": {"gte": 2}}}, "_source": ["title"]},
+    )
+    assert [hit["_source"] for hit in ranged["hits"]["hits"]] == [{"title": "b.md"}]
+
+
+def test_fake_client_writes_through_aliases_and_rejects_missing_indices():
+    client = FakeOpenSearch()
+    client.indices.create(index="docs-1")
+    client.indices.update_aliases(
+        body={"actions": [{"add": {"index": "docs-1", "alias": "docs"}}]}
+    )
+
+    assert client.indices.exists("docs")
+    response = client.bulk(
+        body="\n".join(
+            [
+                json.dumps({"index": {"_index": "docs", "_id": "a"}}),
+                json.dumps({"title": "a.md"}),
+                json.dumps({"index": {"_index": "missing", "_id": "b"}}),
+                json.dumps({"title": "b.md"}),
+            ]
+        )
+        + "\n"
+    )
+
+    assert response["errors"]
+    assert [item["index"]["status"] for item in response["items"]] == [201, 404]
+    assert [doc_id for doc_id, _ in client.iter_documents("docs")] == ["a"]
+    assert not client.indices.exists("missing")
+
+
+def test_exact_top_k_ranks_the_identical_chunk_first():
+    encoder = HashingEncoder(64)
+    chunks = [
+        CodeChunk(
+            title="a.md",
+            content=content,
+            length=len(content),
+            chunk_num=number,
+            chunk_amount=3,
+        )
+        for number, content in enumerate(
+            ["install the cluster", "retry a timeout", "stream the answer"], 1
+        )
+    ]
+
+    truth = exact_top_k(encoder, chunks, [chunks[1].markdown, chunks[2].markdown], 2)
+
+    assert [keys[0] for keys in truth] == ["a.md#2", "a.md#3"]
+    assert all(len(keys) == 2 for keys in truth)
+
+
+def test_benchmark_retrieval_reports_every_combination():
+    chunks, queries = synthetic_corpus(60, 12, seed=1)
+    client, retriever = make_retriever()
+
+    results = benchmark_retrieval(
+        retriever,
+        HashingEncoder(64),
+        chunks,
+        queries,
+        sizes=[30, 60],
+        top_ks=[1, 5],
+        concurrency=2,
+        batch_size=4,
+    )
+
+    assert [
+        (result.documents, result.top_k, result.strategy) for result in results
+    ] == [
+        (size, top_k, strategy)
+        for size in (30, 60)
+        for top_k in (1, 5)
+        for strategy in STRATEGIES
+    ]
+    for result in results:
+        assert result.recall_at_k >= 0.9
+        assert result.p50_ms <= result.p95_ms <= result.p99_ms
+        assert result.qps > 0
+    assert not client.indices_by_name
+
+
+def test_benchmark_refreshes_the_index_before_measuring():
+    chunks, queries = synthetic_corpus(20, 4, seed=2)
+    client, retriever = make_retriever()
+    events = []
+    refresh, search = client.indices.refresh, client.search
+
+    def record_refresh(**kwargs):
+        events.append("refresh")
+        return refresh(**kwargs)
+
+    def record_search(*args, **kwargs):
+        # helpers.scan of the upload scrolls; only measured queries count
+        if "scroll" not in kwargs:
+            events.append("search")
+        return search(*args, **kwargs)
+
+    client.indices.refresh, client.search = record_refresh, record_search
+
+    benchmark_retrieval(
+        retriever,
+        HashingEncoder(64),
+        chunks,
+        queries,
+        sizes=[20],
+        top_ks=[1],
+        strategies=["search"],
+        concurrency=1,
+    )
+
+    assert events[0] == "refresh"
+    assert events.count("search") > 0
+
+
+def test_load_queries(tmp_path):
+    path = tmp_path / "labels.jsonl"
+    path.write_text(
+        json.dumps({"question": "how to retry", "relevant": ["a.md#1"]}) + "\n\n",
+        encoding="utf-8",
+    )
+
+    assert load_queries(path) == [
+        LabeledQuery(question="how to retry", relevant=["a.md#1"])
+    ]
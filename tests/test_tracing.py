@@ -0,0 +1,158 @@
+import logging
+from contextvars import ContextVar
+from unittest.mock import MagicMock
+
+import pytest
+
+from aidkits import tracing
+
+
+@pytest.fixture
+def histograms():
+    sink = tracing.add_sink(tracing.HistogramSink())
+    yield sink
+    tracing.remove_sink(sink)
+
+
+def test_span_is_noop_without_sinks():
+    assert not tracing.enabled()
+    with tracing.span("stage", size=1) as span:
+        span.set(result=2)
+    assert tracing.span("other") is span
+
+
+def test_histogram_sink_summarizes_stages(histograms):
+    for _ in range(3):
+        with tracing.span("stage.ok"):
+            pass
+    with pytest.raises(RuntimeError):
+        with tracing.span("stage.failed"):
+            raise RuntimeError("boom")
+
+    summary = histograms.summary()
+
+    assert summary["stage.ok"]["count"] == 3
+    assert summary["stage.ok"]["errors"] == 0
+    assert summary["stage.failed"]["errors"] == 1
+    assert summary["stage.ok"]["p50_ms"] <= summary["stage.ok"]["p99_ms"]
+    histograms.clear()
+    assert histograms.summary() == {}
+
+
+def test_logging_sink_reports_attributes(caplog):
+    sink = tracing.add_sink(tracing.LoggingSink(level=logging.INFO))
+    try:
+        with caplog.at_level(logging.INFO, logger="aidkits.tracing"):
+            with tracing.span("retriever.query", collection="docs") as span:
+                span.set(hits=3)
+    finally:
+        tracing.remove_sink(sink)
+
+    assert "retriever.query took" in caplog.text
+    assert "'hits': 3" in caplog.text
+
+
+def test_failing_sink_does_not_break_the_stage(histograms):
+    class Broken(tracing.Sink):
+        def on_end(self, span):
+            raise ValueError("sink failed")
+
+    broken = tracing.add_sink(Broken())
+    try:
+        with tracing.span("stage"):
+            pass
+    finally:
+        tracing.remove_sink(broken)
+
+    assert histograms.summary()["stage"]["count"] == 1
+
+
+@pytest.fixture
+def opentelemetry():
+    # opentelemetry is optional; the sink only needs a tracer
+    sink = tracing.OpenTelemetrySink.__new__(tracing.OpenTelemetrySink)
+    sink._trace, sink._tracer = MagicMock(), MagicMock()
+    sink._active = ContextVar("aidkits_span_test", default=None)
+    return sink
+
+
+def test_opentelemetry_spans_are_not_made_current(opentelemetry):
+    sink = opentelemetry
+
+    def stream():
+        with tracing.span("tool.llm", stream=True):
+            yield "token"
+
+    tracing.add_sink(sink)
+    try:
+        tokens = stream()
+        next(tokens)
+        sink._tracer.start_span.assert_called_once_with(
+            "tool.llm", context=None, attributes={"stream": True}
+        )
+        sink._tracer.start_as_current_span.assert_not_called()
+        list(tokens)
+    finally:
+        tracing.remove_sink(sink)
+
+    sink._tracer.start_span.return_value.end.assert_called_once_with()
+
+
+def test_opentelemetry_spans_are_parented_on_the_enclosing_stage(opentelemetry):
+    sink = opentelemetry
+    outer, inner, after = MagicMock(), MagicMock(), MagicMock()
+    sink._tracer.start_span.side_effect = [outer, inner, after]
+
+    tracing.add_sink(sink)
+    try:
+        with tracing.span("tool.run"):
+            with tracing.span("retriever.query"):
+                pass
+        with tracing.span("tool.run"):
+            pass
+    finally:
+        tracing.remove_sink(sink)
+
+    sink._trace.set_span_in_context.assert_called_once_with(outer)
+    assert [
+        call.kwargs["context"] for call in sink._tracer.start_span.call_args_list
+    ] == [
+        None,
+        sink._trace.set_span_in_context.return_value,
+        None,
+    ]
+    for otel_span in (outer, inner, after):
+        otel_span.end.assert_called_once_with()
+
+
+def test_retriever_stages_are_traced(histograms, tmp_path):
+    from aidkits.benchmarks.retrieval import HashingEncoder
+    from aidkits.models import CodeChunk, LibrarySource
+    from aidkits.storage.numpy_retriever import NumpyRetriever
+
+    contents = ["install the package", "configure logging"]
+    retriever = NumpyRetriever(tmp_path, HashingEncoder(32))
+    retriever.upload_library(
+        LibrarySource(
+            title="lib",
+            chunks=[
+                CodeChunk(
+                    title="a.md",
+                    content=content,
+                    length=len(content),
+                    chunk_num=i + 1,
+                    chunk_amount=len(contents),
+                )
+                for i, content in enumerate(contents)
+            ],
+        )
+    )
+    retriever.search("configure logging", "lib")
+
+    assert {
+        "ingest.encode",
+        "ingest.write",
+        "retriever.encode",
+        "retriever.query",
+        "retriever.parse",
+    } <= set(histograms.summary())
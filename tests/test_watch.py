@@ -0,0 +1,205 @@
+import os
+import threading
+import time
+
+import pytest
+
+from aidkits.benchmarks.fake_opensearch import FakeOpenSearch
+from aidkits.benchmarks.retrieval import HashingEncoder
+from aidkits.models import CodeChunk
+from aidkits.storage.numpy_retriever import NumpyRetriever
+from aidkits.storage.opensearch_retriever import OpenSearchRetriever
+from aidkits.watch import DirectoryWatch, PollingWatcher
+
+
+def chunks(title, *contents):
+    return [
+        CodeChunk(
+            title=title,
+            content=content,
+            length=len(content),
+            chunk_num=i + 1,
+            chunk_amount=len(contents),
+            path=title,
+        )
+        for i, content in enumerate(contents)
+    ]
+
+
+def touch(path, text):
+    path.write_text(text, encoding="utf-8")
+    # Make the edit visible to the mtime comparison on coarse clocks
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture(params=["opensearch", "numpy"])
+def retriever(request, tmp_path):
+    if request.param == "numpy":
+        return NumpyRetriever(str(tmp_path / "store"), HashingEncoder(32))
+    return OpenSearchRetriever(FakeOpenSearch(), HashingEncoder(32))
+
+
+def titles(retriever):
+    return sorted(
+        chunk.title for chunk in retriever.search("install search", "docs", top_k=100)
+    )
+
+
+def test_sync_file_only_touches_the_chunks_of_that_file(retriever):
+    retriever.upload_library(
+        chunks("a.md", "install", "configure") + chunks("b.md", "search"),
+        collection_name="docs",
+    )
+
+    report = retriever.sync_file("a.md", chunks("a.md", "install", "upgrade"), "docs")
+    assert (report.succeeded, report.skipped, report.deleted) == (1, 1, 1)
+    assert titles(retriever) == ["a.md", "a.md", "b.md"]
+
+    report = retriever.sync_file("b.md", [], "docs")
+    assert report.deleted == 1
+    assert titles(retriever) == ["a.md", "a.md"]
+
+
+def test_sync_keeps_files_with_the_same_name_apart(retriever, tmp_path):
+    docs = tmp_path / "docs"
+    for directory in ("a", "b"):
+        (docs / directory).mkdir(parents=True)
+        (docs / directory / "README.md").write_text(
+            "# Install\npip install\n", encoding="utf-8"
+        )
+    retriever.create_collection("docs")
+    watch = DirectoryWatch(str(docs), retriever, "docs")
+    watch.sync({str(docs / "a" / "README.md"), str(docs / "b" / "README.md")})
+
+    touch(docs / "a" / "README.md", "# Install\npip install --upgrade\n")
+    report = watch.sync({str(docs / "a" / "README.md")})
+
+    assert (report.bulk.succeeded, report.bulk.deleted) == (1, 1)
+    hits = retriever.search("install", "docs", top_k=10)
+    assert sorted((hit.path, hit.content) for hit in hits) == [
+        ("a/README.md", "# Install\npip install --upgrade"),
+        ("b/README.md", "# Install\npip install"),
+    ]
+
+    (docs / "b" / "README.md").unlink()
+    report = watch.sync({str(docs / "b" / "README.md")})
+
+    assert report.bulk.deleted == 1
+    assert [hit.path for hit in retriever.search("install", "docs", top_k=10)] == [
+        "a/README.md"
+    ]
+
+
+class NearRealTimeOpenSearch(FakeOpenSearch):
+    """Scans only see the documents of the last refresh, like a cluster between refresh intervals."""
+
+    def __init__(self):
+        super().__init__()
+        self.refreshed = {}
+        self.indices.refresh = self.refresh
+
+    def refresh(self, index=None, **kwargs):
+        for name in self.resolve(index or "*"):
+            self.refreshed[name] = dict(self.indices_by_name[name].documents)
+        return {"_shards": {"failed": 0}}
+
+    def search(self, *args, scroll=None, **kwargs):
+        if scroll is None:
+            return super().search(*args, **kwargs)
+        live = {name: target.documents for name, target in self.indices_by_name.items()}
+        try:
+            for name, target in self.indices_by_name.items():
+                target.documents = self.refreshed.get(name, {})
+            return super().search(*args, scroll=scroll, **kwargs)
+        finally:
+            for name, target in self.indices_by_name.items():
+                target.documents = live[name]
+
+
+def test_two_quick_edits_leave_no_stale_chunks(tmp_path):
+    client = NearRealTimeOpenSearch()
+    retriever = OpenSearchRetriever(client, HashingEncoder(32))
+    retriever.create_collection("docs")
+    retriever.upload_library(chunks("a.md", "install"), collection_name="docs")
+    retriever.refresh_collection("docs")
+
+    retriever.sync_file("a.md", chunks("a.md", "upgrade"), "docs")
+    report = retriever.sync_file("a.md", chunks("a.md", "configure"), "docs")
+
+    assert report.deleted == 1
+    assert [source["content"] for _, source in client.iter_documents("docs")] == [
+        "configure"
+    ]
+
+
+def test_polling_watcher_reports_created_modified_and_deleted_files(tmp_path):
+    (tmp_path / "a.md").write_text("# A", encoding="utf-8")
+    (tmp_path / "notes.txt").write_text("ignored", encoding="utf-8")
+    watcher = PollingWatcher(str(tmp_path))
+
+    assert watcher.wait(0) == set()
+    touch(tmp_path / "a.md", "# A\nedited")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "b.md").write_text("# B", encoding="utf-8")
+    assert watcher.wait(0) == {str(tmp_path / "a.md"), str(tmp_path / "sub" / "b.md")}
+
+    (tmp_path / "a.md").unlink()
+    touch(tmp_path / "notes.txt", "still ignored")
+    assert watcher.wait(0) == {str(tmp_path / "a.md")}
+
+
+def test_directory_watch_debounces_and_syncs_changed_files(tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "a.md").write_text(
+        "# Install\npip install\n## Upgrade\npip install -U\n", encoding="utf-8"
+    )
+    (docs / "b.md").write_text("# Search\nsearch()\n", encoding="utf-8")
+    retriever = OpenSearchRetriever(FakeOpenSearch(), HashingEncoder(32))
+    reports = []
+    synced = threading.Event()
+
+    def on_sync(report):
+        reports.append(report)
+        synced.set()
+
+    watch = DirectoryWatch(
+        str(docs),
+        retriever,
+        "docs",
+        debounce=0.3,
+        interval=0.02,
+        polling=True,
+        on_sync=on_sync,
+    )
+    retriever.create_collection("docs")
+    thread = threading.Thread(target=watch.run)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 5
+        while (
+            titles(retriever) != ["a.md", "a.md", "b.md"]
+            and time.monotonic() < deadline
+        ):
+            time.sleep(0.02)
+        assert titles(retriever) == ["a.md", "a.md", "b.md"]
+
+        # A burst of edits is synchronized once
+        touch(
+            docs / "a.md", "# Install\npip install\n## Upgrade\npip install --upgrade\n"
+        )
+        (docs / "b.md").unlink()
+        assert synced.wait(5)
+    finally:
+        watch.stop()
+        thread.join()
+
+    assert len(reports) == 1
+    assert (reports[0].updated, reports[0].removed) == (1, 1)
+    assert (
+        reports[0].bulk.succeeded,
+        reports[0].bulk.skipped,
+        reports[0].bulk.deleted,
+    ) == (1, 1, 2)
+    assert titles(retriever) == ["a.md", "a.md"]